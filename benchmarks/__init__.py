@@ -0,0 +1 @@
+# Benchmarks for magika_demo
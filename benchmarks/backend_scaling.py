@@ -0,0 +1,61 @@
+"""
+Detection throughput of the inference backends from 1 to N cores.
+
+Batches of ``--batch`` windows built from the sample payloads are identified for
+``--duration`` seconds by the inline backend, then by the thread and process
+backends with each ``--workers`` count (default: powers of two up to the cores
+available). Throughput is reported in files/s and as a speed-up over inline; the
+detection cache and the signature precheck are not involved.
+
+Usage: ``python -m benchmarks.backend_scaling [--workers 1,2,4,8] [--batch 64] [--min-chunk 8]``
+"""
+import argparse
+import time
+
+from benchmarks.common import sample_payloads, setup_django
+
+
+def measure(identify, windows, duration: float) -> float:
+    identify(windows)
+    files = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        identify(windows)
+        files += len(windows)
+    return files / (time.perf_counter() - start)
+
+
+def main():
+    setup_django()
+    from example.api import extract_and_identify, result_from_cache, window_size
+    from example.executors import ProcessBackend, ThreadBackend, default_workers
+    from example.windows import ByteWindows
+
+    cores = default_workers()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default=",".join(str(2**power) for power in range(cores.bit_length())))
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--min-chunk", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    payloads = sample_payloads()
+    windows = [ByteWindows.from_bytes(payloads[index % len(payloads)], window_size) for index in range(args.batch)]
+    print(f"{cores} cores, batches of {args.batch} files")
+    print(f"{'backend':>8} {'workers':>7} {'files/s':>10} {'speed-up':>8}")
+    inline = measure(extract_and_identify, windows, args.duration)
+    print(f"{'inline':>8} {1:>7} {inline:>10.1f} {1:>8.2f}")
+    for workers in [int(count) for count in args.workers.split(",")]:
+        for name, backend in (
+            ("thread", ThreadBackend(extract_and_identify, workers, args.min_chunk)),
+            ("process", ProcessBackend(result_from_cache, workers, args.min_chunk)),
+        ):
+            try:
+                throughput = measure(backend.identify, windows, args.duration)
+            finally:
+                backend.shutdown()
+            print(f"{name:>8} {workers:>7} {throughput:>10.1f} {throughput / inline:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
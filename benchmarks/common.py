@@ -0,0 +1,69 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks are run from the repository root, e.g. ``python -m benchmarks.microbatch``.
+"""
+import os
+import statistics
+from pathlib import Path
+
+
+def setup_django():
+    """Configure Django so that ``example.api`` can be imported outside ``manage.py``."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "example.settings")
+    import django
+
+    django.setup()
+
+
+def sample_payloads() -> list[bytes]:
+    """A small mix of text and binary payloads that all go through the model."""
+    return [
+        b"<!DOCTYPE html><html><head><title>Bench</title></head><body>" + b"<p>row</p>" * 200 + b"</body></html>",
+        b'{"items": [' + b",".join(b'{"id": %d, "name": "item"}' % i for i in range(200)) + b"]}",
+        b"#!/usr/bin/env python\nimport os\n\n" + b"def f(x):\n    return x * 2\n\n" * 100,
+        b"name,age,city\n" + b"John,30,New York\n" * 300,
+        b"%PDF-1.7\n" + bytes(range(256)) * 16 + b"\n%%EOF\n",
+        b"\x7fELF\x02\x01\x01\x00" + bytes(range(256)) * 16,
+    ]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Return the ``pct`` percentile of ``values`` (0-100)."""
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[max(0, min(98, round(pct) - 1))]
+
+
+def format_latency(values: list[float]) -> str:
+    """Format a list of latencies in seconds as p50/p95/p99 milliseconds."""
+    return " ".join(f"p{pct}={percentile(values, pct) * 1000:.2f}ms" for pct in (50, 95, 99))
+
+
+def rss_mib(pid: int | str = "self") -> float:
+    """Resident set size of ``pid`` in MiB, read from ``/proc`` (Linux only)."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def process_tree_rss_mib(pid: int) -> float:
+    """Summed RSS of ``pid`` and all of its descendants in MiB."""
+    children: dict[int, list[int]] = {}
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+    total, pending = 0.0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            total += rss_mib(current)
+        except OSError:
+            continue
+        pending.extend(children.get(current, []))
+    return total
@@ -0,0 +1,354 @@
+"""
+Load test of ``POST /api/upload`` in-process and against a local Granian server.
+
+A deterministic corpus of mixed file types and sizes is generated (or reused from
+``--corpus``) and pre-encoded as multipart bodies. Each body is sent at every
+``--concurrency`` level, first through Django's test client inside this process
+and then over HTTP to a Granian server started on a free local port. For every
+target and level the harness reports p50/p95/p99 latency, requests per second,
+errors and RSS. All results are written to a JSON file named after the git commit,
+and ``--compare`` prints the change against an earlier results file.
+
+Usage: ``python -m benchmarks.loadtest [--files 120] [--concurrency 1,8,32] [--requests 400]
+[--targets inprocess,granian] [--output results.json] [--compare previous.json]``
+"""
+import argparse
+import datetime
+import http.client
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from benchmarks.common import percentile, process_tree_rss_mib, rss_mib, setup_django
+
+SIZES = (512, 8 * 1024, 128 * 1024, 2 * 1024 * 1024)
+
+WORDS = b"the quick brown fox jumps over a lazy dog while magika reads only both ends of every file".split()
+
+BOUNDARY = "magika-loadtest-boundary"
+
+
+def repeat_to(size: int, header: bytes, row, footer: bytes = b"") -> bytes:
+    parts, length, index = [header], len(header) + len(footer), 0
+    while length < size:
+        part = row(index)
+        parts.append(part)
+        length += len(part)
+        index += 1
+    parts.append(footer)
+    return b"".join(parts)
+
+
+def png(rng: random.Random, size: int) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    width = 256
+    height = max(1, size // (width * 3))
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b"")
+
+
+def zip_archive(rng: random.Random, size: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        index = 0
+        while buffer.tell() < size:
+            archive.writestr(f"member{index}.txt", b" ".join(rng.choices(WORDS, k=200)))
+            index += 1
+    return buffer.getvalue()
+
+
+KINDS = {
+    "html": lambda rng, size: repeat_to(
+        size,
+        b"<!DOCTYPE html><html><head><title>Load</title></head><body>\n",
+        lambda i: b"<p>row %d</p>\n" % i,
+        b"</body></html>\n",
+    ),
+    "json": lambda rng, size: repeat_to(
+        size,
+        b'{"items": [',
+        lambda i: b'{"id": %d, "name": "item%d", "value": %d},' % (i, i, rng.randint(0, 9999)),
+        b'{"id": -1}]}',
+    ),
+    "python": lambda rng, size: repeat_to(
+        size, b"#!/usr/bin/env python\nimport os\n\n", lambda i: b"def f%d(x):\n    return x * %d\n\n\n" % (i, i)
+    ),
+    "csv": lambda rng, size: repeat_to(
+        size, b"name,age,city\n", lambda i: b"%s,%d,%s\n" % (rng.choice(WORDS), rng.randint(1, 99), rng.choice(WORDS))
+    ),
+    "text": lambda rng, size: repeat_to(size, b"", lambda i: b" ".join(rng.choices(WORDS, k=12)) + b".\n"),
+    "pdf": lambda rng, size: repeat_to(
+        size,
+        b"%PDF-1.7\n",
+        lambda i: b"%d 0 obj\n<< /Length 64 >>\nstream\n" % i + rng.randbytes(64) + b"\nendstream\nendobj\n",
+        b"trailer\n<< /Root 1 0 R >>\n%%EOF\n",
+    ),
+    "png": png,
+    "zip": zip_archive,
+    "elf": lambda rng, size: b"\x7fELF\x02\x01\x01\x00" + bytes(8) + b"\x02\x00\x3e\x00" + rng.randbytes(max(0, size - 20)),
+    "random": lambda rng, size: rng.randbytes(size),
+}
+
+
+def generate_corpus(directory: Path, count: int, seed: int) -> None:
+    """Write ``count`` files cycling through every kind, with sizes drawn from ``SIZES``."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    for index, kind in zip(range(count), itertools.cycle(KINDS)):
+        (directory / f"{index:05d}.{kind}").write_bytes(KINDS[kind](rng, rng.choice(SIZES)))
+
+
+def encode_upload(name: str, content: bytes) -> bytes:
+    return (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode()
+        + content
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+
+
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def inprocess_sender():
+    from django.test import Client
+
+    local = threading.local()
+
+    def send(body: bytes) -> int:
+        if not hasattr(local, "client"):
+            local.client = Client(HTTP_HOST="localhost")
+        return local.client.post("/api/upload", data=body, content_type=CONTENT_TYPE).status_code
+
+    return send
+
+
+def http_sender(port: int):
+    local = threading.local()
+
+    def send(body: bytes) -> int:
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        try:
+            connection.request("POST", "/api/upload", body=body, headers={"Content-Type": CONTENT_TYPE})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            local.connection = None
+            return 0
+
+    return send
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def granian_server(interface: str, workers: int, timeout: float = 120):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "granian", "--interface", interface, f"example.{interface}:application"]
+        + ["--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--no-log"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"granian exited with status {process.returncode}")
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                connection.request("GET", "/api/ready")
+                if connection.getresponse().status == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("granian did not become ready")
+            time.sleep(0.2)
+        yield process, port
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def run_level(send, bodies: list[bytes], concurrency: int, requests: int) -> dict:
+    def timed(body):
+        start = time.perf_counter()
+        status = send(body)
+        return time.perf_counter() - start, status
+
+    work = list(itertools.islice(itertools.cycle(bodies), requests))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, work))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for latency, _ in samples]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for _, status in samples if status != 200),
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            **{f"p{pct}": round(percentile(latencies, pct) * 1000, 3) for pct in (50, 95, 99)},
+            "max": round(max(latencies) * 1000, 3),
+        },
+    }
+
+
+def run_target(name: str, send, rss, bodies: list[bytes], args) -> list[dict]:
+    run_level(send, bodies, 1, args.warmup)
+    results = []
+    for concurrency in args.concurrency:
+        result = {"target": name, **run_level(send, bodies, concurrency, args.requests), "rss_mib": round(rss(), 1)}
+        latency = result["latency_ms"]
+        print(
+            f"{name:<10} c={concurrency:<4} {result['rps']:8.1f} req/s  p50={latency['p50']:.2f}ms "
+            f"p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms  errors={result['errors']}  rss={result['rss_mib']}MiB"
+        )
+        results.append(result)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        git = ["git", "-C", str(Path(__file__).resolve().parent.parent)]
+        commit = subprocess.run([*git, "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout
+        dirty = subprocess.run([*git, "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit.strip() + ("-dirty" if dirty.strip() else "")
+
+
+def compare(previous: dict, current: dict) -> None:
+    print(f"\nchange against {previous['commit']}:")
+    earlier = {(result["target"], result["concurrency"]): result for result in previous["results"]}
+    for result in current["results"]:
+        before = earlier.get((result["target"], result["concurrency"]))
+        if before is None:
+            continue
+
+        def change(new, old):
+            return f"{(new / old - 1) * 100:+6.1f}%" if old else "   n/a"
+
+        print(
+            f"{result['target']:<10} c={result['concurrency']:<4} "
+            f"rps {change(result['rps'], before['rps'])}  "
+            f"p50 {change(result['latency_ms']['p50'], before['latency_ms']['p50'])}  "
+            f"p99 {change(result['latency_ms']['p99'], before['latency_ms']['p99'])}  "
+            f"rss {change(result['rss_mib'], before['rss_mib'])}"
+        )
+
+
+# Environment settings recorded with the results, so that runs are only compared like for like.
+ENV_SETTINGS = {
+    "CHUNK_SIZE",
+    "DETECTION_CACHE_BACKEND",
+    "DETECTION_CACHE_SIZE",
+    "INFERENCE_QUEUE_SIZE",
+    "INFERENCE_SOCKET",
+    "INFERENCE_THREADS",
+    "MAGIKA_WARMUP",
+    "METRICS_ENABLED",
+    "MICROBATCH_MAX_SIZE",
+    "MICROBATCH_MAX_WAIT_MS",
+    "ORT_EXECUTION_MODE",
+    "ORT_GRAPH_OPTIMIZATION",
+    "ORT_INTER_OP_THREADS",
+    "ORT_INTRA_OP_THREADS",
+    "UPLOAD_DETECTION",
+    "UPLOAD_HANDLER",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", type=Path, help="Corpus directory; generated if missing or empty.")
+    parser.add_argument("--files", type=int, default=120, help="Number of files to generate.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=lambda value: [int(item) for item in value.split(",")], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=400, help="Requests per concurrency level.")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--targets", default="inprocess,granian")
+    parser.add_argument("--interface", choices=["asgi", "wsgi"], default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="Granian worker processes.")
+    parser.add_argument("--cache", action="store_true", help="Keep the detection cache enabled.")
+    parser.add_argument("--output", type=Path, help="Results file (default: loadtest-<commit>.json).")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    # The corpus is sent over and over, so with the cache on every pass after the
+    # first would only measure cache hits.
+    if not args.cache:
+        os.environ["DETECTION_CACHE_SIZE"] = "0"
+
+    with tempfile.TemporaryDirectory() as scratch:
+        corpus = args.corpus or Path(scratch)
+        if not corpus.is_dir() or not any(corpus.iterdir()):
+            generate_corpus(corpus, args.files, args.seed)
+        files = sorted(path for path in corpus.iterdir() if path.is_file())
+        contents = [path.read_bytes() for path in files]
+        bodies = [encode_upload(path.name, content) for path, content in zip(files, contents)]
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "corpus": {
+            "files": len(files),
+            "bytes": sum(len(content) for content in contents),
+            "kinds": dict(Counter(path.suffix.lstrip(".") for path in files)),
+        },
+        "results": [],
+    }
+    targets = args.targets.split(",")
+    if "inprocess" in targets:
+        setup_django()
+        report["results"] += run_target("inprocess", inprocess_sender(), rss_mib, bodies, args)
+    if "granian" in targets:
+        with granian_server(args.interface, args.workers) as (process, port):
+            rss = lambda: process_tree_rss_mib(process.pid)  # noqa: E731
+            report["results"] += run_target("granian", http_sender(port), rss, bodies, args)
+
+    report["settings"] = {key: os.environ[key] for key in sorted(ENV_SETTINGS) if key in os.environ}
+
+    output = args.output or Path(f"loadtest-{report['commit']}.json")
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {output}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Cost of the per-stage metrics on the detection path.
+
+Reports the cost of one ``stage()`` timer in isolation and the end-to-end latency
+of ``POST /api/upload`` (Django test client, cache disabled) with metrics on and
+off.
+
+Usage: ``python -m benchmarks.metrics_overhead [--requests 2000] [--timers 200000]``
+"""
+import argparse
+import io
+import itertools
+import time
+
+from benchmarks.common import format_latency, sample_payloads, setup_django
+
+
+def time_timers(count: int) -> float:
+    from example.metrics import stage
+
+    start = time.perf_counter()
+    for _ in range(count):
+        with stage("read"):
+            pass
+    return (time.perf_counter() - start) / count
+
+
+def time_uploads(client, payloads, count: int) -> list[float]:
+    latencies = []
+    for payload in itertools.islice(itertools.cycle(payloads), count):
+        upload = io.BytesIO(payload)
+        upload.name = "payload.bin"
+        start = time.perf_counter()
+        client.post("/api/upload", {"file": upload})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timers", type=int, default=200000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+
+    from example import api, metrics
+
+    api.cache = None
+    client = Client(HTTP_HOST="localhost")
+    payloads = sample_payloads()
+    time_uploads(client, payloads, 50)
+
+    for enabled in (False, True):
+        metrics.metrics_enabled = enabled
+        print(f"stage() timer, metrics {'on ' if enabled else 'off'}: {time_timers(args.timers) * 1e9:7.1f} ns")
+
+    # interleave the two modes so that drift affects both equally
+    results = {False: [], True: []}
+    for _ in range(10):
+        for enabled in (False, True):
+            metrics.metrics_enabled = enabled
+            results[enabled] += time_uploads(client, payloads, args.requests // 10)
+    for enabled, latencies in results.items():
+        mean = sum(latencies) / len(latencies)
+        print(f"upload, metrics {'on ' if enabled else 'off'}: mean={mean * 1000:.3f}ms {format_latency(latencies)}")
+    overhead = sum(results[True]) / sum(results[False]) - 1
+    print(f"overhead: {overhead * 100:+.2f}%")
+
+
+if __name__ == "__main__":
+    main()
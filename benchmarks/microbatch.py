@@ -0,0 +1,64 @@
+"""
+Latency/throughput of the per-call detection path versus the micro-batcher.
+
+Usage: ``python -m benchmarks.microbatch [--threads 32] [--calls 2000] [--max-wait-ms 2] [--max-batch 32]``
+"""
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import format_latency, sample_payloads, setup_django
+
+
+def run(threads: int, calls: int) -> tuple[float, list[float]]:
+    from example.api import check_file_type_magika
+
+    payloads = itertools.cycle(sample_payloads())
+    work = [next(payloads) for _ in range(calls)]
+
+    def timed(payload):
+        start = time.perf_counter()
+        check_file_type_magika(payload)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(timed, work))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    setup_django()
+    from example import api
+    from example.batching import MicroBatcher
+
+    # the payloads repeat, so with the detection cache every call after the first
+    # few would be a cache hit and neither mode would run the model
+    api.cache = None
+
+    # warm up the ONNX session before measuring
+    run(1, 10)
+
+    modes = [
+        ("per-call", None),
+        (
+            f"micro-batch (wait={args.max_wait_ms}ms, max={args.max_batch})",
+            MicroBatcher(api.identify_features, args.max_wait_ms / 1000, args.max_batch),
+        ),
+    ]
+    for name, batcher in modes:
+        api.batcher = batcher
+        elapsed, latencies = run(args.threads, args.calls)
+        print(f"{name:<40} {args.calls / elapsed:8.1f} calls/s  {format_latency(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Detection time versus file size for head+tail window reads.
+
+Sparse files from 1 KB to several GB are created in a temporary directory and
+identified through ``read_windows`` the same way ``upload()`` does for both
+in-memory and temp-file uploads. A full read of the file is timed alongside for
+sizes up to ``--max-full-read`` to show what reading the whole upload costs.
+
+Usage: ``python -m benchmarks.ranged_reads [--sizes 1K,1M,100M,1G,4G] [--repeat 20]``
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import setup_django
+
+UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+    if value[-1] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+
+def make_sparse_file(directory: str, size: int) -> str:
+    head = b"<!DOCTYPE html><html><head><title>Bench</title></head><body>" + b"<p>row</p>" * 50
+    tail = b"<p>row</p>" * 50 + b"</body></html>\n"
+    path = os.path.join(directory, f"sample_{size}.bin")
+    with open(path, "wb") as stream:
+        stream.write(head[:size])
+        if size > len(head) + len(tail):
+            stream.truncate(size - len(tail))
+            stream.seek(size - len(tail))
+            stream.write(tail)
+        else:
+            stream.truncate(size)
+    return path
+
+
+def time_call(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1K,64K,1M,100M,1G,4G")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-full-read", default="64M")
+    parser.add_argument("--max-in-memory", default="64M")
+    args = parser.parse_args()
+
+    setup_django()
+    from example.api import identify_seekable, window_size
+    from example.windows import read_windows
+
+    max_full_read = parse_size(args.max_full_read)
+    max_in_memory = parse_size(args.max_in_memory)
+    print(f"{'size':>12} {'temp file':>12} {'in memory':>12} {'full read io':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in map(parse_size, args.sizes.split(",")):
+            path = make_sparse_file(directory, size)
+            with open(path, "rb") as stream:
+                on_disk = time_call(lambda: identify_seekable(read_windows(stream, window_size, size)), args.repeat)
+                in_memory = full_read = None
+                if size <= max_in_memory:
+                    stream.seek(0)
+                    buffer = io.BytesIO(stream.read())
+                    in_memory = time_call(lambda: identify_seekable(read_windows(buffer, window_size, size)), args.repeat)
+                if size <= max_full_read:
+
+                    def read_all():
+                        stream.seek(0)
+                        while stream.read(1024 * 1024):
+                            pass
+
+                    full_read = time_call(read_all, max(1, args.repeat // 4))
+            os.unlink(path)
+
+            def fmt(value):
+                return f"{value * 1000:10.2f}ms" if value is not None else f"{'-':>12}"
+
+            print(f"{size:>12} {fmt(on_disk)} {fmt(in_memory)} {fmt(full_read)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Serialization cost and payload size of the batch upload response formats.
+
+Compares the former formatted-sentence response rendered with the standard
+library encoder against the typed schema (validated like Ninja does) rendered
+with the standard encoder and with orjson, and against compact label IDs.
+
+Usage: ``python -m benchmarks.serialization [--batch 256] [--rounds 200]``
+"""
+import argparse
+import itertools
+import json
+import time
+
+from benchmarks.common import sample_payloads, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=256, help="Detections per response.")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from pydantic import TypeAdapter
+
+    from example.api import identify_seekables, model_version, window_size
+    from example.renderers import ORJSONRenderer
+    from example.schemas import NamedDetection, detection, label_id
+    from example.windows import ByteWindows
+
+    payloads = list(itertools.islice(itertools.cycle(sample_payloads()), args.batch))
+    results = identify_seekables([ByteWindows.from_bytes(payload, window_size) for payload in payloads])
+    sizes = [len(payload) for payload in payloads]
+    names = [f"file{index}.bin" for index in range(args.batch)]
+
+    typed = TypeAdapter(list[NamedDetection])
+    compact = TypeAdapter(list[int])
+    renderer = ORJSONRenderer()
+
+    def legacy():
+        return json.dumps(
+            [
+                {
+                    "Name": name,
+                    "Detected File Type": f"File Type is {result.output.label} with Mime Type {result.output.mime_type}",
+                    "Size": size,
+                }
+                for name, result, size in zip(names, results, sizes)
+            ]
+        )
+
+    def detections():
+        items = []
+        for name, result, size in zip(names, results, sizes):
+            item = detection(result, size, model_version)
+            item["name"] = name
+            items.append(item)
+        return typed.dump_python(typed.validate_python(items))
+
+    modes = [
+        ("formatted string + json", legacy),
+        ("typed schema + json", lambda: json.dumps(detections())),
+        ("compact ids + json", lambda: json.dumps(compact.validate_python([label_id(result) for result in results]))),
+        ("typed schema + orjson", lambda: renderer.render(None, detections(), response_status=200)),
+        (
+            "compact ids + orjson",
+            lambda: renderer.render(
+                None, compact.validate_python([label_id(result) for result in results]), response_status=200
+            ),
+        ),
+    ]
+
+    print(f"{args.batch} detections per response, {args.rounds} rounds")
+    for name, render in modes:
+        body = render()
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            render()
+        per_response = (time.perf_counter() - start) / args.rounds
+        per_item = per_response / args.batch
+        print(f"{name:<26} {per_response * 1e6:9.1f} us/response  {per_item * 1e6:6.2f} us/item  {len(body):8d} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Throughput per core for onnxruntime session settings.
+
+For every combination of intra-op threads, inter-op threads, graph optimization
+level and execution mode, ``--processes`` processes (one per simulated Granian
+worker) each run batches of ``--batch`` feature rows through a ``TunedMagika``
+session for ``--duration`` seconds. Throughput is reported in samples/s in total
+and per core of the host, which is what pod sizing needs.
+
+Usage: ``python -m benchmarks.session_tuning [--intra 1,2,0] [--inter 1] [--optimization basic,all]
+[--modes sequential,parallel] [--processes 1,4] [--batch 1,32]``
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+
+
+def worker(config, duration, start, results):
+    import numpy as np
+
+    from example.model import TunedMagika, model_dir, session_options
+
+    intra, inter, optimization, mode, batch = config
+    magika = TunedMagika(session_options(intra, inter, optimization, mode), model_dir=model_dir)
+    session = magika._onnx_session
+    features = np.random.default_rng(0).integers(0, 257, size=(batch, 2048), dtype=np.int32)
+    session.run(["target_label"], {"bytes": features})
+    start.wait()
+    samples = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        session.run(["target_label"], {"bytes": features})
+        samples += batch
+    results.put(samples)
+
+
+def measure(config, processes, duration) -> float:
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Event(), context.Queue()
+    workers = [context.Process(target=worker, args=(config, duration, start, results)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    time.sleep(3)
+    start.set()
+    samples = sum(results.get() for _ in workers)
+    for process in workers:
+        process.join()
+    return samples / duration
+
+
+def csv(value, cast=str):
+    return [cast(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intra", default="1,2,0", help="intra-op threads (0 = onnxruntime default)")
+    parser.add_argument("--inter", default="1")
+    parser.add_argument("--optimization", default="basic,all")
+    parser.add_argument("--modes", default="sequential,parallel")
+    parser.add_argument("--processes", default="1,4")
+    parser.add_argument("--batch", default="1,32")
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f"{cores} cores")
+    print(f"{'procs':>5} {'intra':>5} {'inter':>5} {'optimization':>12} {'mode':>10} {'batch':>5} {'samples/s':>10} {'per core':>10}")
+    for processes, intra, inter, optimization, mode, batch in itertools.product(
+        csv(args.processes, int),
+        csv(args.intra, int),
+        csv(args.inter, int),
+        csv(args.optimization),
+        csv(args.modes),
+        csv(args.batch, int),
+    ):
+        throughput = measure((intra, inter, optimization, mode, batch), processes, args.duration)
+        print(
+            f"{processes:>5} {intra:>5} {inter:>5} {optimization:>12} {mode:>10} {batch:>5} "
+            f"{throughput:>10.1f} {throughput / cores:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+RSS per worker and requests per second: one ONNX session per worker versus a
+shared inference server.
+
+Each layout starts ``--workers`` processes that identify sample payloads for
+``--duration`` seconds. In the "per-worker" layout every process builds its own
+``Magika()``; in the "shared" layout an ``InferenceServer`` process owns the model
+and the workers use ``RemoteMagika``. RSS is read from ``/proc`` (Linux only).
+
+Usage: ``python -m benchmarks.shared_model [--workers 4] [--duration 10]``
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.common import rss_mib, sample_payloads
+
+
+def worker(socket_path, start, duration, results):
+    if socket_path:
+        from example.inference_server import RemoteMagika
+
+        magika = RemoteMagika(socket_path)
+    else:
+        from magika import Magika
+
+        magika = Magika()
+    payloads = itertools.cycle(sample_payloads())
+    magika.identify_bytes(next(payloads))
+    start.wait()
+    calls = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        magika.identify_bytes(next(payloads))
+        calls += 1
+    results.put(calls)
+    # keep the process alive until the parent has sampled its RSS
+    time.sleep(2)
+
+
+def server(socket_path, ready):
+    from magika import Magika
+
+    from example.inference_server import InferenceServer
+
+    instance = InferenceServer(socket_path, Magika())
+    ready.set()
+    instance.serve_forever()
+
+
+def run_layout(name, workers, duration, socket_path=None):
+    context = multiprocessing.get_context("spawn")
+    server_process = None
+    if socket_path:
+        ready = context.Event()
+        server_process = context.Process(target=server, args=(socket_path, ready), daemon=True)
+        server_process.start()
+        ready.wait()
+    start, results = context.Event(), context.Queue()
+    processes = [context.Process(target=worker, args=(socket_path, start, duration, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    time.sleep(5)
+    start.set()
+    calls = sum(results.get() for _ in processes)
+    worker_rss = [rss_mib(process.pid) for process in processes]
+    server_rss = rss_mib(server_process.pid) if server_process else 0.0
+    for process in processes:
+        process.join()
+    if server_process:
+        server_process.terminate()
+    total = sum(worker_rss) + server_rss
+    print(
+        f"{name:<12} rss/worker={sum(worker_rss) / workers:7.1f}MiB server={server_rss:7.1f}MiB "
+        f"total={total:7.1f}MiB  {calls / duration:8.1f} req/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    run_layout("per-worker", args.workers, args.duration)
+    with tempfile.TemporaryDirectory() as directory:
+        run_layout("shared", args.workers, args.duration, os.path.join(directory, "magika.sock"))
+
+
+if __name__ == "__main__":
+    main()
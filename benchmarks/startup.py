@@ -0,0 +1,62 @@
+"""
+Startup cost: ``manage.py check`` wall time and first-request latency with and
+without warm-up.
+
+Every measurement runs in a fresh interpreter so that nothing is cached between
+runs. The first-request probe imports the WSGI application (which warms the model
+up according to ``MAGIKA_WARMUP``) and then times one ``POST /api/upload``.
+
+Usage: ``python -m benchmarks.startup [--runs 5]``
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+FIRST_REQUEST = """
+import io, time
+start = time.perf_counter()
+from example.wsgi import application
+boot = time.perf_counter() - start
+from django.test import Client
+upload = io.BytesIO(b"<!DOCTYPE html><html><body>" + b"<p>row</p>" * 500 + b"</body></html>")
+upload.name = "page.html"
+start = time.perf_counter()
+response = Client(HTTP_HOST="localhost").post("/api/upload", {"file": upload})
+assert response.status_code == 200, response.content
+print(boot, time.perf_counter() - start)
+"""
+
+
+def run(args: list[str], env: dict[str, str]) -> str:
+    return subprocess.run(args, env={**os.environ, **env}, capture_output=True, text=True, check=True).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        run([sys.executable, "manage.py", "check"], {})
+        timings.append(time.perf_counter() - start)
+    print(f"{'manage.py check':<28} median={statistics.median(timings) * 1000:8.1f}ms")
+
+    for warmup in ("sync", "off"):
+        boots, firsts = [], []
+        for _ in range(args.runs):
+            boot, first = map(float, run([sys.executable, "-c", FIRST_REQUEST], {"MAGIKA_WARMUP": warmup}).split())
+            boots.append(boot)
+            firsts.append(first)
+        print(
+            f"{'MAGIKA_WARMUP=' + warmup:<28} boot={statistics.median(boots) * 1000:8.1f}ms "
+            f"first request={statistics.median(firsts) * 1000:8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
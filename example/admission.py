@@ -0,0 +1,132 @@
+"""
+Admission control for the detection endpoints.
+
+``RateLimiter`` gives every client a token bucket, kept in a Django cache so that
+all workers sharing the cache (e.g. Redis) draw from the same bucket. The bucket is
+stored as a single number, its theoretical arrival time (GCRA): a request moves it
+``1 / rate`` seconds forward with one atomic ``incr`` and is admitted if it stays
+within ``burst / rate`` seconds of now, so a check costs one or two cache calls and
+needs no lock. ``InFlightLimiter`` caps the requests running at once in a worker.
+
+Clients are identified by an API key listed in ``ADMISSION_CLIENT_RATES`` or
+otherwise by address. Unlisted keys are ignored, so that a client cannot get a
+fresh bucket by sending a new key with each request. For the same reason the
+address is the peer's ``REMOTE_ADDR``, and ``X-Forwarded-For`` is only read when
+``num_proxies`` trusted proxies append to it.
+"""
+
+import hashlib
+import threading
+import time
+from collections.abc import Callable
+
+MICROSECONDS = 1_000_000
+
+
+def key_client(key: str) -> str:
+    # API keys are not kept in the cache or in memory dumps of the limits in clear
+    return "key:" + hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def parse_client_rates(value: str) -> dict[str, tuple[float, float]]:
+    """Parse ``"key:SECRET=50:100,ip:10.0.0.5=1:5"`` into ``{client: (rate, burst)}``."""
+    limits = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        client, _, limit = entry.strip().rpartition("=")
+        rate, _, burst = limit.partition(":")
+        if client.startswith("key:"):
+            client = key_client(client[len("key:") :])
+        limits[client] = (float(rate), float(burst or rate))
+    return limits
+
+
+def client_address(request, num_proxies: int = 0) -> str:
+    """The client's address, as seen by the last of ``num_proxies`` trusted proxies."""
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if num_proxies > 0 and forwarded:
+        # each trusted proxy appends the address it received the request from; the
+        # entries before them are written by the client and cannot be trusted
+        addresses = [address.strip() for address in forwarded.split(",")]
+        return addresses[-min(num_proxies, len(addresses))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def client_id(request, key_header: str, limits: dict[str, tuple[float, float]], num_proxies: int = 0) -> str:
+    key = request.headers.get(key_header)
+    if key:
+        client = key_client(key)
+        if client in limits:
+            return client
+    return f"ip:{client_address(request, num_proxies)}"
+
+
+class RateLimiter:
+    """Token buckets of ``rate`` requests per second and ``burst`` requests, per client."""
+
+    def __init__(
+        self,
+        cache,
+        rate: float,
+        burst: float,
+        limits: dict[str, tuple[float, float]] | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.cache = cache
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.limits = limits or {}
+        self.clock = clock
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 or any(rate > 0 for rate, _ in self.limits.values())
+
+    def acquire(self, client: str) -> float:
+        """Take a token from ``client``'s bucket; return 0, or the seconds until one is available."""
+        rate, burst = self.limits.get(client, (self.rate, self.burst))
+        if rate <= 0:
+            return 0.0
+        interval = int(MICROSECONDS / rate)
+        tolerance = int(max(burst, 1) * MICROSECONDS / rate)
+        # an active client's key expires at most once per timeout, refilling its bucket early
+        timeout = max(60, 2 * tolerance // MICROSECONDS)
+        now = int(self.clock() * MICROSECONDS)
+        key = f"admission:{client}"
+        if self.cache.add(key, now + interval, timeout):
+            return 0.0
+        try:
+            arrival = self.cache.incr(key, interval)
+        except ValueError:
+            # expired since ``add``
+            self.cache.set(key, now + interval, timeout)
+            return 0.0
+        if arrival - interval < now:
+            # the bucket is full again: start over from now
+            self.cache.set(key, now + interval, timeout)
+            return 0.0
+        if arrival - now <= tolerance:
+            return 0.0
+        self.cache.decr(key, interval)
+        return (arrival - now - tolerance) / MICROSECONDS
+
+
+class InFlightLimiter:
+    """At most ``limit`` requests at once in this process; 0 means no limit."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.limit and self.count >= self.limit:
+                return False
+            self.count += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.count -= 1
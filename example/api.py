@@ -1,31 +1,1013 @@
+import asyncio
+import inspect
+import itertools
+import math
 import os
+import shutil
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import ExitStack
+from functools import wraps
+from pathlib import Path
 
-from magika import Magika
-from ninja import File, NinjaAPI
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import TooManyFilesSent
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.multipartparser import MultiPartParserError
+from magika import ContentTypeLabel, MagikaResult, OverwriteReason
+from magika.types import Seekable
+from ninja import File, NinjaAPI, Query
+from ninja.decorators import decorate_view
+from ninja.errors import HttpError
 from ninja.files import UploadedFile
-from typing_extensions import Any
+from typing_extensions import Any, Literal
 
-m = Magika()
+from . import jobs
+from .admission import InFlightLimiter, RateLimiter, client_id, parse_client_rates
+from .archives import ArchiveInspector
+from .batching import MicroBatcher
+from .cache import DetectionCache, window_digest
+from .executors import (
+    BoundedExecutor,
+    ExecutorSaturated,
+    InlineBackend,
+    ProcessBackend,
+    ThreadBackend,
+    default_workers,
+)
+from .metrics import (
+    Gauge,
+    record_bytes_read,
+    record_detections,
+    record_lookups,
+    record_rejection,
+    registry,
+    stage,
+)
+from .model import get_magika, is_loaded, is_ready, is_warm, model_config, model_version, timings, warmup_mode
+from .models import DetectionJob
+from .remote import RangeReader, RemoteError
+from .renderers import ORJSONRenderer
+from .schemas import (
+    LABEL_IDS,
+    LABELS,
+    ArchiveDetection,
+    CompactDetection,
+    Detection,
+    DetectionError,
+    JobStatus,
+    LabelTable,
+    LookupBatch,
+    NamedDetection,
+    PathBatch,
+    PathJob,
+    StoredDetection,
+    UrlBatch,
+    detection,
+    label_id,
+)
+from .signatures import SIGNATURES, SignatureTable
+from .store import DetectionStore
+from .streaming import multipart_files, multipart_windows, streaming_response
+from .tiers import FileSource, TieredDetector
+from .uploadhandlers import WindowedUploadedFile, install_window_capture
+from .windows import ByteWindows, MappedWindows, StreamTooLarge, read_stream_windows, read_windows
+
+api = NinjaAPI(renderer=ORJSONRenderer())
+
+
+StreamFormat = Literal["ndjson", "sse"]
+
+
+def __getattr__(name):
+    # ``m`` used to be built at import time; keep it importable, loaded on demand.
+    if name == "m":
+        return get_magika()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-api = NinjaAPI()
 
 chunk_size = int(os.getenv("CHUNK_SIZE", 100))
 
+max_batch_size = int(os.getenv("MAX_BATCH_SIZE", 256))
+
+# Files per inference in streamed responses. Results are sent after each batch, so
+# smaller batches answer sooner and larger ones make better use of the model.
+stream_batch_size = int(os.getenv("STREAM_BATCH_SIZE", 32))
+
+# Largest body accepted by /api/upload/raw. Only two windows are kept in memory,
+# but the rest of the body still has to be read (and discarded) to reach its end.
+raw_upload_max_size = int(os.getenv("RAW_UPLOAD_MAX_SIZE", 1024**3))
+
+# "windows" reads only the head and tail bytes Magika's features are built from;
+# "chunk" keeps the original behaviour of classifying the first CHUNK_SIZE bytes;
+# "tiered" tries prefixes of TIERED_SIZES bytes first and reads the windows only
+# when no prefix gave a score of at least TIERED_MIN_SCORE.
+upload_detection = os.getenv("UPLOAD_DETECTION", "windows")
+
+window_size = model_config().block_size
+
+# SIGNATURE_PRECHECK=true labels files that start with the magic number of a
+# well-known format (PNG, JPEG, PDF, gzip, ELF...) without running the model.
+signature_precheck = os.getenv("SIGNATURE_PRECHECK", "false").lower() in ("1", "true", "yes")
+
+tiered_sizes = [int(size) for size in os.getenv("TIERED_SIZES", f"{chunk_size},1024").split(",") if size.strip()]
+tiered_min_score = float(os.getenv("TIERED_MIN_SCORE", 0.9))
+
+# "default" leaves Django's upload handlers alone, "windows" captures the head and
+# tail windows while the body streams in, and "detect-only" additionally discards
+# the payload instead of spooling it to memory or disk.
+upload_handler = os.getenv("UPLOAD_HANDLER", "default")
+
+# Micro-batching of concurrent check_file_type_magika calls is disabled unless a
+# positive MICROBATCH_MAX_WAIT_MS is configured.
+microbatch_max_wait_ms = float(os.getenv("MICROBATCH_MAX_WAIT_MS", 0))
+microbatch_max_size = int(os.getenv("MICROBATCH_MAX_SIZE", 32))
+
+# Detection results are cached by a hash of the head and tail windows. Set
+# DETECTION_CACHE_SIZE=0 to disable the cache, and DETECTION_CACHE_BACKEND to the
+# alias of a Django cache to share results between workers.
+detection_cache_size = int(os.getenv("DETECTION_CACHE_SIZE", 10000))
+detection_cache_ttl = float(os.getenv("DETECTION_CACHE_TTL", 3600))
+detection_cache_backend = os.getenv("DETECTION_CACHE_BACKEND", "")
+
+# ?recursive=true expands zip, tar and gzip uploads into a tree of member detections,
+# nesting at most ARCHIVE_MAX_DEPTH archives and stopping after ARCHIVE_MAX_MEMBERS
+# members or ARCHIVE_MAX_BYTES decompressed bytes per upload.
+archive_max_depth = int(os.getenv("ARCHIVE_MAX_DEPTH", 5))
+archive_max_members = int(os.getenv("ARCHIVE_MAX_MEMBERS", 10000))
+archive_max_bytes = int(os.getenv("ARCHIVE_MAX_BYTES", 256 * 1024**2))
+
+# Jobs submitted to /api/jobs are run by ``manage.py jobworker``. Uploaded files are
+# kept in JOB_SPOOL_DIR until their job ends; path jobs may only name files and
+# directories below JOB_PATH_ROOTS (comma separated, none by default).
+job_spool_dir = os.getenv("JOB_SPOOL_DIR", "/tmp/magika_jobs")
+job_path_roots = [os.path.realpath(root) for root in os.getenv("JOB_PATH_ROOTS", "").split(",") if root.strip()]
+job_max_active = int(os.getenv("JOB_MAX_ACTIVE", 1000))
+job_max_files = int(os.getenv("JOB_MAX_FILES", 100000))
+job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+# Async endpoints run detection in a bounded thread pool; requests beyond
+# INFERENCE_THREADS running plus INFERENCE_QUEUE_SIZE queued calls get a 503.
+inference_threads = int(os.getenv("INFERENCE_THREADS", 4))
+inference_queue_size = int(os.getenv("INFERENCE_QUEUE_SIZE", 64))
+retry_after_seconds = int(os.getenv("RETRY_AFTER_SECONDS", 1))
+
+inference_executor = BoundedExecutor(inference_threads, inference_queue_size)
+
+# Where the feature extraction and inference of the files a request needs the model
+# for run: "inline" on the request thread, or split into chunks of at least
+# INFERENCE_BACKEND_MIN_CHUNK files across INFERENCE_BACKEND_WORKERS (default: one
+# per core) "thread"s, which overlap only in the model, or "process"es, which each
+# load a model with INFERENCE_BACKEND_ORT_THREADS onnxruntime threads.
+inference_backend_name = os.getenv("INFERENCE_BACKEND", "inline")
+inference_backend_workers = int(os.getenv("INFERENCE_BACKEND_WORKERS", 0)) or default_workers()
+inference_backend_min_chunk = int(os.getenv("INFERENCE_BACKEND_MIN_CHUNK", 8))
+inference_backend_ort_threads = int(os.getenv("INFERENCE_BACKEND_ORT_THREADS", 1))
+
+# /api/urls fetches only from these hosts (comma separated, "*" for any host); the
+# default empty list keeps the server from being used to reach internal services.
+remote_allowed_hosts = {host.strip() for host in os.getenv("REMOTE_ALLOWED_HOSTS", "").split(",") if host.strip()}
+# Servers that ignore Range headers are read to the end, up to this many bytes.
+remote_max_stream_size = int(os.getenv("REMOTE_MAX_STREAM_SIZE", 64 * 1024**2))
+remote_fetch_threads = int(os.getenv("REMOTE_FETCH_THREADS", 16))
+remote_timeout = float(os.getenv("REMOTE_TIMEOUT", 10))
+
+# /api/paths maps files on a volume shared with the caller, below these directories
+# only (comma separated); the default empty list disables the endpoint.
+local_path_roots = [os.path.realpath(root) for root in os.getenv("LOCAL_PATH_ROOTS", "").split(",") if root.strip()]
+
+# Admission control of the detection endpoints, checked before the body is read.
+# Each client may make ADMISSION_RATE requests per second in bursts of up to
+# ADMISSION_BURST (0 disables rate limiting); ADMISSION_CLIENT_RATES sets other
+# limits for some clients, as "key:SECRET=rate:burst" for the API key sent in the
+# ADMISSION_KEY_HEADER header or "ip:ADDRESS=rate:burst". The buckets are kept in
+# the "admission" cache. Each worker also handles at most ADMISSION_MAX_IN_FLIGHT
+# detection requests at once (0 for no limit). Rejected requests get a 429.
+# Clients are told apart by REMOTE_ADDR; behind ADMISSION_NUM_PROXIES trusted
+# reverse proxies, by the address the outermost one adds to X-Forwarded-For.
+admission_rate = float(os.getenv("ADMISSION_RATE", 0))
+admission_burst = float(os.getenv("ADMISSION_BURST", 10))
+admission_client_rates = parse_client_rates(os.getenv("ADMISSION_CLIENT_RATES", ""))
+admission_key_header = os.getenv("ADMISSION_KEY_HEADER", "X-API-Key")
+admission_max_in_flight = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 0))
+admission_num_proxies = int(os.getenv("ADMISSION_NUM_PROXIES", 0))
+
+range_reader = RangeReader(window_size, remote_max_stream_size, remote_fetch_threads, remote_timeout, remote_allowed_hosts)
+
+cache = (
+    DetectionCache(
+        model_version,
+        detection_cache_size,
+        detection_cache_ttl,
+        caches[detection_cache_backend] if detection_cache_backend else None,
+    )
+    if detection_cache_size > 0
+    else None
+)
+
+# DETECTION_STORE=true records every new detection in the database (run
+# ``manage.py migrate`` first); records are written in batches by a background thread.
+detection_store_enabled = os.getenv("DETECTION_STORE", "false").lower() in ("1", "true", "yes")
+detection_store_batch_size = int(os.getenv("DETECTION_STORE_BATCH_SIZE", 500))
+detection_store_flush_interval = float(os.getenv("DETECTION_STORE_FLUSH_INTERVAL", 1))
+
+store = (
+    DetectionStore(model_version, detection_store_batch_size, detection_store_flush_interval)
+    if detection_store_enabled
+    else None
+)
+
+for metric, description, stat, kind in [
+    ("magika_cache_hits_total", "Detection cache hits in this worker.", "hits", "counter"),
+    ("magika_cache_shared_hits_total", "Detection cache hits in the shared backend.", "shared_hits", "counter"),
+    ("magika_cache_misses_total", "Detection cache misses.", "misses", "counter"),
+    ("magika_cache_entries", "Entries in this worker's detection cache.", "entries", "gauge"),
+]:
+    registry.register(
+        Gauge(metric, description, lambda stat=stat: cache.stats()[stat] if cache is not None else None, kind)
+    )
+
+for metric, description, stat, kind in [
+    ("magika_store_written_total", "Detection records written to the database.", "written", "counter"),
+    ("magika_store_dropped_total", "Detection records that could not be written.", "dropped", "counter"),
+    ("magika_store_pending", "Detection records waiting to be written.", "pending", "gauge"),
+]:
+    registry.register(
+        Gauge(metric, description, lambda stat=stat: store.stats()[stat] if store is not None else None, kind)
+    )
+
+rate_limiter = RateLimiter(caches["admission"], admission_rate, admission_burst, admission_client_rates)
+in_flight = InFlightLimiter(admission_max_in_flight)
+
+registry.register(
+    Gauge("magika_in_flight_requests", "Detection requests being handled by this worker.", lambda: in_flight.count)
+)
+
+registry.register(Gauge("magika_model_load_seconds", "Time taken to load the model.", lambda: timings.get("load_seconds")))
+registry.register(
+    Gauge("magika_model_warmup_seconds", "Time taken by the warm-up inference.", lambda: timings.get("warmup_seconds"))
+)
+registry.register(
+    Gauge("magika_model_ready", "Whether the model is loaded and, unless MAGIKA_WARMUP=off, warmed up.", lambda: int(is_ready()))
+)
+
+
+signature_table = SignatureTable(SIGNATURES, model_config().min_file_size_for_dl)
+
+
+def signature_result(seekable: Seekable) -> MagikaResult | None:
+    """The result for a file recognized by its magic number, if SIGNATURE_PRECHECK is on."""
+    if not signature_precheck or not isinstance(seekable, ByteWindows):
+        return None
+    label = signature_table.match(seekable.head, seekable.size)
+    if label is None:
+        return None
+    return get_magika()._get_result_from_labels_and_score(
+        path=Path("-"), dl_label=ContentTypeLabel.UNDEFINED, output_label=label, score=1.0
+    )
+
+
+def identify_features(all_features: list) -> list[MagikaResult]:
+    """Run one batched inference over already-extracted Magika features."""
+    with stage("inference"):
+        results = get_magika()._get_results_from_features(
+            [(Path(str(index)), features) for index, features in enumerate(all_features)]
+        )
+    return [results[str(index)] for index in range(len(all_features))]
+
+
+batcher = (
+    MicroBatcher(identify_features, microbatch_max_wait_ms / 1000, microbatch_max_size)
+    if microbatch_max_wait_ms > 0
+    else None
+)
+
+
+def result_to_cache(result: MagikaResult) -> tuple[str, str, float, str]:
+    return str(result.dl.label), str(result.output.label), result.score, str(result.prediction.overwrite_reason)
+
+
+def result_from_cache(value: tuple) -> MagikaResult:
+    # cached values are followed by the input size, for lookups by hash
+    dl_label, output_label, score, overwrite_reason = value[:4]
+    return get_magika()._get_result_from_labels_and_score(
+        path=Path("-"),
+        dl_label=ContentTypeLabel(dl_label),
+        output_label=ContentTypeLabel(output_label),
+        score=score,
+        overwrite_reason=OverwriteReason(overwrite_reason),
+    )
+
+
+def content_hash(seekable: Seekable) -> str | None:
+    if (cache is None and store is None) or not isinstance(seekable, ByteWindows):
+        return None
+    return window_digest(seekable)
+
 
-def check_file_type_magika(chunked_file: bytes) -> str:
-    check_file_type = m.identify_bytes(content=chunked_file)
-    if check_file_type is not None:
-        return f"File Type is {check_file_type.output.ct_label} with Mime Type {check_file_type.output.mime_type}"
+def cache_key(digest: str | None) -> str | None:
+    if cache is None or digest is None:
+        return None
+    return cache.key(digest)
+
+
+def cached_result(key: str | None) -> MagikaResult | None:
+    if key is None:
+        return None
+    value = cache.get(key)
+    return result_from_cache(value) if value is not None else None
+
+
+def remember(digest: str | None, seekable: Seekable, result: MagikaResult) -> None:
+    """Cache and store a newly computed result."""
+    if digest is None:
+        return
+    if cache is not None:
+        cache.set(cache.key(digest), (*result_to_cache(result), seekable.size))
+    if store is not None:
+        store.add(digest, detection(result, seekable.size, model_version))
+
+
+def extract_and_identify(seekables: list[Seekable]) -> list[MagikaResult]:
+    """Extract features and run one batched inference for the inputs that need the model.
+
+    Inputs that Magika can answer without the model (empty or very small ones) are
+    resolved directly. Results keep the input order.
+    """
+    results: list[MagikaResult | None] = [None] * len(seekables)
+    pending_indexes, pending_features = [], []
+    with stage("features"):
+        for index, seekable in enumerate(seekables):
+            result, features = get_magika()._get_result_or_features_from_seekable(seekable)
+            if result is not None:
+                results[index] = result
+            else:
+                pending_indexes.append(index)
+                pending_features.append(features)
+    if pending_features:
+        for index, result in zip(pending_indexes, identify_features(pending_features)):
+            results[index] = result
+    return results
+
+
+def build_inference_backend() -> InlineBackend | ThreadBackend | ProcessBackend:
+    if inference_backend_name == "thread":
+        return ThreadBackend(extract_and_identify, inference_backend_workers, inference_backend_min_chunk)
+    if inference_backend_name == "process":
+        return ProcessBackend(
+            result_from_cache, inference_backend_workers, inference_backend_min_chunk, inference_backend_ort_threads
+        )
+    return InlineBackend(extract_and_identify)
+
+
+inference_backend = build_inference_backend()
+
+
+def identify_uncached(seekables: list[Seekable]) -> list[MagikaResult]:
+    """Identify inputs with the inference backend."""
+    if isinstance(inference_backend, ProcessBackend):
+        # features are extracted in the worker processes, so both count as inference here
+        with stage("inference"):
+            return inference_backend.identify(seekables)
+    return inference_backend.identify(seekables)
+
+
+def identify_seekable(seekable: Seekable) -> MagikaResult:
+    """Identify a single input, going through the cache and micro-batcher when enabled."""
+    digest = content_hash(seekable)
+    result = cached_result(cache_key(digest))
+    if result is None:
+        result = signature_result(seekable)
+        if result is None and not isinstance(inference_backend, InlineBackend):
+            result = identify_uncached([seekable])[0]
+        if result is None:
+            with stage("features"):
+                result, features = get_magika()._get_result_or_features_from_seekable(seekable)
+            if result is None:
+                result = batcher.submit(features) if batcher is not None else identify_features([features])[0]
+        remember(digest, seekable, result)
+    record_detections([str(result.output.label)])
+    return result
+
+
+def identify_seekables(seekables: list[Seekable]) -> list[MagikaResult]:
+    """Identify several inputs with batched Magika inferences.
+
+    Cached results and signature matches are answered first; the other inputs go
+    to the inference backend, which runs one ONNX session per chunk of the batch
+    (a single one inline). Results keep the input order.
+    """
+    results = lookup_seekables(seekables, remember)
+    record_detections(str(result.output.label) for result in results)
+    return results
+
+
+def probe_seekables(seekables: list[Seekable]) -> list[MagikaResult]:
+    """Like ``identify_seekables``, without the cache and store and without counting the detections."""
+    return lookup_seekables(seekables, None, cached=False)
+
+
+def lookup_seekables(
+    seekables: list[Seekable], on_result, cached: bool = True, precheck: bool = True
+) -> list[MagikaResult]:
+    results: list[MagikaResult | None] = [None] * len(seekables)
+    digests = [content_hash(seekable) if cached else None for seekable in seekables]
+    pending_indexes = []
+    for index, seekable in enumerate(seekables):
+        result = cached_result(cache_key(digests[index]))
+        if result is not None:
+            results[index] = result
+            continue
+        result = signature_result(seekable) if precheck else None
+        if result is not None:
+            results[index] = result
+            if on_result is not None:
+                on_result(digests[index], seekable, result)
+        else:
+            pending_indexes.append(index)
+
+    if pending_indexes:
+        for index, result in zip(pending_indexes, identify_uncached([seekables[index] for index in pending_indexes])):
+            results[index] = result
+            if on_result is not None:
+                on_result(digests[index], seekables[index], result)
+    return results
+
+
+tiered_detector = TieredDetector(
+    probe_seekables, lambda seekables: lookup_seekables(seekables, remember), tiered_sizes, tiered_min_score, window_size
+)
+
+
+def identify_tiered(sources: list[FileSource]) -> list[MagikaResult]:
+    results = tiered_detector.detect(sources)
+    record_bytes_read(sum(source.bytes_read for source in sources))
+    record_detections(str(result.output.label) for result in results)
+    return results
+
+
+def upload_sources(request, field_name: str, files: list[UploadedFile]) -> list[FileSource]:
+    """Sources for tiered detection, reading from the windows captured by the upload handler when there are any."""
+    captured = getattr(request, "upload_windows", None)
+    windows = captured.getlist(field_name) if captured is not None else []
+    if len(windows) != len(files):
+        windows = [None] * len(files)
+    return [FileSource(file.file, file.size, window_size, item) for file, item in zip(files, windows)]
+
+
+archive_inspector = ArchiveInspector(
+    identify_seekables,
+    lambda result, size: detection(result, size, model_version),
+    window_size,
+    archive_max_depth,
+    archive_max_members,
+    archive_max_bytes,
+    max_batch_size,
+)
+
+
+def check_file_type_magika(chunked_file: bytes) -> MagikaResult:
+    return identify_seekable(ByteWindows.from_bytes(chunked_file, window_size))
+
+
+def check_file_types_magika(files: list[UploadedFile], windows: list[ByteWindows] | None = None) -> list[MagikaResult]:
+    if windows is None:
+        windows = [read_windows(file.file, window_size, file.size) for file in files]
+    return identify_seekables(windows)
+
+
+def upload_windows(request, field_name: str, files: list[UploadedFile]) -> list[ByteWindows]:
+    """Windows captured by the streaming upload handler, or read from the stored uploads."""
+    captured = getattr(request, "upload_windows", None)
+    if captured is not None and len(captured.getlist(field_name)) == len(files):
+        windows = captured.getlist(field_name)
+    else:
+        with stage("read"):
+            windows = [read_windows(file.file, window_size, file.size) for file in files]
+    record_bytes_read(sum(window_bytes(w) for w in windows))
+    return windows
+
+
+def parse_upload(request) -> HttpResponse | None:
+    """Parse the multipart body of ``request``, or return the 413 response for too many files."""
+    install_window_capture(request, upload_handler, window_size)
+    # parse the multipart body here, before Ninja does, so that its cost is measured
+    try:
+        with stage("multipart"):
+            request.FILES
+    except TooManyFilesSent:
+        # Django stops parsing at DATA_UPLOAD_MAX_NUMBER_FILES (MAX_BATCH_SIZE)
+        detail = f"At most {settings.DATA_UPLOAD_MAX_NUMBER_FILES} files can be uploaded in one request"
+        return api.create_response(request, {"detail": detail}, status=413)
     return None
 
 
-@api.post("/upload")
-def upload(request, file: UploadedFile = File(...)) -> dict[str, Any]:
-    for chunk in file.chunks(chunk_size):
-        detect_filetype = check_file_type_magika(chunk)
-        if detect_filetype is not None:
-            return {"Detected File Type": str(detect_filetype), "Size": file.size}
-    return {"Detected File Type": "Unknown", "Size": 0}
+def stream_upload_handlers(view):
+    # async views stay coroutine functions, so that decorators applied around this one can tell
+    if inspect.iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # reading and parsing the body blocks, so it runs in a thread rather than on the event loop
+            rejected = await sync_to_async(parse_upload, thread_sensitive=False)(request)
+            if rejected is not None:
+                return rejected
+            return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        rejected = parse_upload(request)
+        if rejected is not None:
+            return rejected
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def admission_rejected(request, reason: str, detail: str, retry_after: float) -> HttpResponse:
+    record_rejection(reason)
+    response = api.create_response(request, {"detail": detail}, status=429)
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admit(request) -> HttpResponse | None:
+    """Take a token and an in-flight slot for ``request``, or return the 429 response."""
+    if rate_limiter.enabled:
+        wait = rate_limiter.acquire(client_id(request, admission_key_header, rate_limiter.limits, admission_num_proxies))
+        if wait:
+            return admission_rejected(request, "rate", "Rate limit exceeded, retry later", wait)
+    if not in_flight.acquire():
+        return admission_rejected(request, "in_flight", "Too many requests in progress, retry later", retry_after_seconds)
+    return None
+
+
+def release_when_sent(response):
+    if isinstance(response, StreamingHttpResponse):
+        # streamed results are produced while the response is sent; Django closes
+        # these with the response, like the file of a FileResponse
+        response._resource_closers.append(in_flight.release)
+    else:
+        in_flight.release()
+    return response
+
+
+def admission_control(view):
+    # applied outside stream_upload_handlers, so that rejected bodies are never parsed
+    if inspect.iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            rejected = admit(request)
+            if rejected is not None:
+                return rejected
+            try:
+                response = await view(request, *args, **kwargs)
+            except BaseException:
+                in_flight.release()
+                raise
+            return release_when_sent(response)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        rejected = admit(request)
+        if rejected is not None:
+            return rejected
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            in_flight.release()
+            raise
+        return release_when_sent(response)
+
+    return wrapper
+
+
+def detect_upload(request, file: UploadedFile, compact: bool = False, recursive: bool = False) -> dict[str, Any]:
+    if recursive and compact:
+        raise HttpError(400, "compact and recursive cannot be combined")
+    if recursive and isinstance(file, WindowedUploadedFile):
+        raise HttpError(400, "recursive detection needs the uploaded payload, which UPLOAD_HANDLER=detect-only discards")
+    if upload_detection == "windows":
+        result = identify_seekable(upload_windows(request, "file", [file])[0])
+    elif upload_detection == "tiered":
+        result = identify_tiered(upload_sources(request, "file", [file]))[0]
+    else:
+        with stage("read"):
+            chunk = next(file.chunks(chunk_size), b"")
+        record_bytes_read(len(chunk))
+        result = check_file_type_magika(chunk)
+    if compact:
+        return {"label_id": label_id(result)}
+    if recursive:
+        return archive_inspector.expand(detection(result, file.size, model_version), file.file, file.name or "")
+    return detection(result, file.size, model_version)
+
+
+def window_bytes(windows: ByteWindows) -> int:
+    return len(windows.head) + (len(windows.tail) if windows.tail is not windows.head else 0)
+
+
+def raw_body_windows(request) -> ByteWindows:
+    """Read the head and tail windows of a raw request body.
+
+    Under ASGI Django has already spooled the body to a seekable file, so only the
+    windows are read from it. A WSGI input stream is read once, front to back,
+    keeping only the windows; without a Content-Length (chunked transfer encoding)
+    this needs a server that marks the end of the input (``wsgi.input_terminated``).
+    """
+    length = request.META.get("CONTENT_LENGTH")
+    size = int(length) if length else None
+    if size is not None and size > raw_upload_max_size:
+        raise HttpError(413, f"The body must not be larger than {raw_upload_max_size} bytes")
+    body = getattr(request, "_stream", None)
+    if body is not None and body.seekable():
+        windows = read_windows(body, window_size, size)
+        if windows.size > raw_upload_max_size:
+            raise HttpError(413, f"The body must not be larger than {raw_upload_max_size} bytes")
+        record_bytes_read(window_bytes(windows))
+        return windows
+    if size is None and "HTTP_TRANSFER_ENCODING" in request.META:
+        if not request.META.get("wsgi.input_terminated"):
+            raise HttpError(411, "A Content-Length header is required by this server")
+        stream = request.META["wsgi.input"]
+    else:
+        # without Content-Length or Transfer-Encoding the body is empty
+        stream = request
+    try:
+        windows = read_stream_windows(stream, window_size, raw_upload_max_size)
+    except StreamTooLarge:
+        raise HttpError(413, f"The body must not be larger than {raw_upload_max_size} bytes")
+    record_bytes_read(windows.size)
+    return windows
+
+
+def check_path(path: str, roots: list[str]) -> str:
+    """The real path of ``path``, which must be one of ``roots`` or below one of them."""
+    real = os.path.realpath(path)
+    if not any(real == root or real.startswith(root + os.sep) for root in roots):
+        raise HttpError(403, f"{path} is not below an allowed root")
+    return real
+
+
+def check_batch_size(files: list) -> None:
+    if len(files) > max_batch_size:
+        raise HttpError(413, f"At most {max_batch_size} files can be uploaded in one batch")
+
+
+def detect_upload_batch(request, files: list[UploadedFile], compact: bool = False) -> list[dict[str, Any]] | list[int]:
+    if upload_detection == "tiered":
+        results = identify_tiered(upload_sources(request, "files", files))
+    else:
+        results = check_file_types_magika(files, upload_windows(request, "files", files))
+    if compact:
+        return [label_id(result) for result in results]
+    detections = []
+    for file, result in zip(files, results):
+        item = detection(result, file.size, model_version)
+        item["name"] = file.name
+        detections.append(item)
+    return detections
+
+
+@api.exception_handler(ExecutorSaturated)
+def executor_saturated(request, exc):
+    response = api.create_response(request, {"detail": "Inference capacity exhausted, retry later"}, status=503)
+    response["Retry-After"] = str(retry_after_seconds)
+    return response
+
+
+@api.exception_handler(jobs.QueueFull)
+def job_queue_full(request, exc):
+    response = api.create_response(request, {"detail": "Too many jobs are queued, retry later"}, status=503)
+    response["Retry-After"] = str(retry_after_seconds)
+    return response
+
+
+@api.post("/upload", response=Detection | ArchiveDetection | CompactDetection, exclude_unset=True)
+@decorate_view(admission_control)
+@decorate_view(stream_upload_handlers)
+def upload(request, file: UploadedFile = File(...), compact: bool = False, recursive: bool = False) -> dict[str, Any]:
+    return detect_upload(request, file, compact, recursive)
+
+
+@api.post("/upload/raw", response=Detection | CompactDetection)
+@decorate_view(admission_control)
+def upload_raw(request, compact: bool = False) -> dict[str, Any]:
+    with stage("read"):
+        windows = raw_body_windows(request)
+    result = identify_seekable(windows)
+    if compact:
+        return {"label_id": label_id(result)}
+    return detection(result, windows.size, model_version)
+
+
+@api.post("/upload/batch", response=list[NamedDetection] | list[int])
+@decorate_view(admission_control)
+@decorate_view(stream_upload_handlers)
+def upload_batch(request, files: list[UploadedFile] = File(...), compact: bool = False) -> list[dict[str, Any]] | list[int]:
+    check_batch_size(files)
+    return detect_upload_batch(request, files, compact)
+
+
+def stream_windows(files: Iterator[tuple[str, ByteWindows]], compact: bool) -> Iterator[dict[str, Any] | int]:
+    for batch in itertools.batched(files, stream_batch_size):
+        names, windows = zip(*batch)
+        record_bytes_read(sum(window_bytes(item) for item in windows))
+        results = identify_seekables(list(windows))
+        for name, item, result in zip(names, windows, results):
+            yield label_id(result) if compact else {**detection(result, item.size, model_version), "name": name}
+
+
+@api.post("/upload/stream")
+@decorate_view(admission_control)
+def upload_stream(request, compact: bool = False, stream: StreamFormat = "ndjson"):
+    """Detect any number of multipart ``files``, streaming each result as NDJSON or SSE.
+
+    The body is parsed while it is read and results are sent after every batch of
+    ``STREAM_BATCH_SIZE`` files, so memory does not grow with the number of files.
+    """
+    try:
+        files = multipart_windows(request, "files", window_size)
+    except MultiPartParserError as exc:
+        raise HttpError(400, str(exc))
+    return streaming_response(request, stream_windows(files, compact), stream)
+
+
+def detect_or_error(
+    names: list[str], items: list[ByteWindows | Exception], compact: bool
+) -> list[dict[str, Any]] | list[int | None]:
+    """Detect the windows among ``items``; errors stay in place as ``{"name", "error"}``, or ``None`` when compact."""
+    found = [index for index, item in enumerate(items) if not isinstance(item, Exception)]
+    results = dict(zip(found, identify_seekables([items[index] for index in found])))
+    if compact:
+        return [label_id(results[index]) if index in results else None for index in range(len(items))]
+    detections = []
+    for index, (name, item) in enumerate(zip(names, items)):
+        if isinstance(item, Exception):
+            detections.append({"name": name, "error": str(item)})
+            continue
+        detections.append({**detection(results[index], item.size, model_version), "name": name})
+    return detections
+
+
+def detect_url_batch(urls: list[str], compact: bool = False) -> list[dict[str, Any]] | list[int | None]:
+    with stage("read"):
+        fetched = range_reader.fetch_many(urls)
+    record_bytes_read(sum(item[1] for item in fetched if not isinstance(item, RemoteError)))
+    return detect_or_error(urls, [item if isinstance(item, RemoteError) else item[0] for item in fetched], compact)
+
+
+@api.post("/urls", response=list[NamedDetection | DetectionError] | list[int | None])
+@decorate_view(admission_control)
+def detect_urls(
+    request, batch: UrlBatch, compact: bool = False, stream: StreamFormat | None = None
+) -> list[dict[str, Any]] | list[int | None]:
+    """Detect remote objects from their head and tail windows, fetched with range requests."""
+    check_batch_size(batch.urls)
+    if stream is None:
+        return detect_url_batch(batch.urls, compact)
+    results = itertools.chain.from_iterable(
+        detect_url_batch(list(urls), compact) for urls in itertools.batched(batch.urls, stream_batch_size)
+    )
+    return streaming_response(request, results, stream)
+
+
+@api.post("/paths", response=list[NamedDetection | DetectionError] | list[int | None])
+@decorate_view(admission_control)
+def detect_paths(request, batch: PathBatch, compact: bool = False) -> list[dict[str, Any]] | list[int | None]:
+    """Detect files on a volume shared with the server, reading their windows through memory mappings."""
+    if not local_path_roots:
+        raise HttpError(403, "Path detection is disabled, set LOCAL_PATH_ROOTS")
+    check_batch_size(batch.paths)
+    paths = [check_path(path, local_path_roots) for path in batch.paths]
+    with ExitStack() as mappings:
+        items = []
+        for path in paths:
+            try:
+                items.append(mappings.enter_context(MappedWindows(path, window_size)))
+            except OSError as exc:
+                items.append(exc)
+        record_bytes_read(sum(window_bytes(item) for item in items if not isinstance(item, OSError)))
+        # the mappings are closed once detection is done, or has failed
+        return detect_or_error(batch.paths, items, compact)
+
+
+@api.post("/async/upload", response=Detection | ArchiveDetection | CompactDetection, exclude_unset=True)
+@decorate_view(admission_control)
+@decorate_view(stream_upload_handlers)
+async def upload_async(
+    request, file: UploadedFile = File(...), compact: bool = False, recursive: bool = False
+) -> dict[str, Any]:
+    return await inference_executor.run(detect_upload, request, file, compact, recursive)
+
+
+@api.post("/async/upload/batch", response=list[NamedDetection] | list[int])
+@decorate_view(admission_control)
+@decorate_view(stream_upload_handlers)
+async def upload_batch_async(
+    request, files: list[UploadedFile] = File(...), compact: bool = False
+) -> list[dict[str, Any]] | list[int]:
+    check_batch_size(files)
+    return await inference_executor.run(detect_upload_batch, request, files, compact)
+
+
+@api.get("/labels", response=LabelTable)
+def labels(request) -> dict[str, Any]:
+    return {"model_version": model_version, "labels": LABELS}
+
+
+@api.get("/cache/stats")
+def cache_stats(request) -> dict[str, Any]:
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@api.get("/tiers/stats")
+def tier_stats(request) -> dict[str, Any]:
+    """How often each tier of UPLOAD_DETECTION=tiered was confident enough to answer."""
+    if upload_detection != "tiered":
+        return {"enabled": False}
+    return {"enabled": True, **tiered_detector.stats()}
+
+
+@api.get("/signatures/stats")
+def signature_stats(request) -> dict[str, Any]:
+    """How many files SIGNATURE_PRECHECK labelled without the model, by label."""
+    if not signature_precheck:
+        return {"enabled": False}
+    return {"enabled": True, **signature_table.stats()}
+
+
+@api.get("/metrics")
+def metrics(request):
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def job_status(job) -> dict[str, Any]:
+    fields = ("id", "status", "priority", "total", "completed", "attempts", "error", "results")
+    return {
+        **{field: getattr(job, field) for field in fields},
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def check_job_capacity() -> None:
+    if jobs.active_count() >= job_max_active:
+        raise jobs.QueueFull()
+
+
+def check_job_path(path: str) -> str:
+    real = check_path(path, job_path_roots)
+    if not os.path.exists(real):
+        raise HttpError(400, f"{path} does not exist")
+    return real
+
+
+@api.post("/jobs", response={202: JobStatus})
+def submit_upload_job(request, priority: int = Query(0, ge=-100, le=100)) -> tuple[int, dict[str, Any]]:
+    """Queue the detection of the multipart ``files``; poll ``GET /api/jobs/{id}`` for the results.
+
+    The body is parsed here rather than by Django, whose file count limit is sized
+    for the batch endpoints: each file is written to the spool as its part arrives,
+    up to ``JOB_MAX_FILES`` files.
+    """
+    try:
+        files = multipart_files(request, "files")
+    except MultiPartParserError as exc:
+        raise HttpError(400, str(exc))
+    check_job_capacity()
+    job_id = uuid.uuid4()
+    directory = jobs.spool_dir(job_spool_dir, job_id)
+    directory.mkdir(parents=True)
+    items = []
+    try:
+        for index, (name, stream) in enumerate(files):
+            if index == job_max_files:
+                raise HttpError(413, f"At most {job_max_files} files can be submitted in one job")
+            path = directory / str(index)
+            with open(path, "wb") as spooled:
+                for chunk in stream:
+                    spooled.write(chunk)
+            items.append({"name": name, "path": str(path)})
+    except MultiPartParserError as exc:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise HttpError(400, str(exc))
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    if not items:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise HttpError(400, "No files were uploaded")
+    return 202, job_status(jobs.submit(items, priority, job_max_attempts, job_id))
+
+
+@api.post("/jobs/paths", response={202: JobStatus})
+def submit_path_job(request, job: PathJob, priority: int = Query(0, ge=-100, le=100)) -> tuple[int, dict[str, Any]]:
+    """Queue the detection of server-side files, or of every file below server-side directories."""
+    if not job_path_roots:
+        raise HttpError(403, "Path jobs are disabled, set JOB_PATH_ROOTS")
+    if len(job.paths) > job_max_files:
+        raise HttpError(413, f"At most {job_max_files} files can be submitted in one job")
+    items = [{"name": path, "path": check_job_path(path)} for path in job.paths]
+    check_job_capacity()
+    return 202, job_status(jobs.submit(items, priority, job_max_attempts))
+
+
+@api.get("/jobs/{job_id}", response=JobStatus)
+async def get_job(request, job_id: uuid.UUID, wait: float = Query(0, ge=0, le=30)) -> dict[str, Any]:
+    """Status of a job, with its results once it is done. ``wait`` long-polls until the job ends."""
+    job = await DetectionJob.objects.filter(pk=job_id).afirst()
+    if job is None:
+        raise HttpError(404, "No such job")
+    # an async view, so that under ASGI a long poll waits on the event loop instead of holding a thread
+    deadline = time.monotonic() + wait
+    while job.status in jobs.ACTIVE and time.monotonic() < deadline:
+        await asyncio.sleep(min(0.25, max(deadline - time.monotonic(), 0)))
+        await job.arefresh_from_db()
+    return job_status(job)
+
+
+def check_store() -> DetectionStore:
+    if store is None:
+        raise HttpError(404, "The detection store is disabled, set DETECTION_STORE=true")
+    return store
+
+
+@api.get("/detections", response=list[StoredDetection])
+def find_detections(request, label: str, limit: int = Query(100, ge=1, le=1000)) -> list[dict[str, Any]]:
+    """Most recently stored detections with ``label``."""
+    return check_store().find(label, limit)
+
+
+@api.get("/detections/{content_hash}", response=StoredDetection)
+def get_detection(request, content_hash: str) -> dict[str, Any]:
+    """Stored detection of the input whose windows hash to ``content_hash``."""
+    record = check_store().get(content_hash.lower())
+    if record is None:
+        raise HttpError(404, "No detection is stored for this hash")
+    return record
+
+
+def lookup_detection(content_hash: str) -> dict[str, Any] | None:
+    """The cached or stored detection of the input whose windows hash to ``content_hash``."""
+    content_hash = content_hash.lower()
+    if cache is not None:
+        value = cache.get(cache.key(content_hash))
+        # entries cached before sizes were kept can only be found in the store
+        if value is not None and len(value) > 4:
+            return {**detection(result_from_cache(value), value[4], model_version), "content_hash": content_hash}
+    if store is not None:
+        return store.get(content_hash)
+    return None
+
+
+def compact_detection(record: dict[str, Any]) -> int:
+    return LABEL_IDS[ContentTypeLabel(record["label"])]
+
+
+@api.api_operation(["GET", "HEAD"], "/lookup/{content_hash}", response=Detection | CompactDetection)
+def lookup(request, content_hash: str, compact: bool = False) -> dict[str, Any]:
+    """Detection of an input already seen, by the hash of its windows; ``404`` means it has to be uploaded.
+
+    ``HEAD`` answers the same status without the detection.
+    """
+    record = lookup_detection(content_hash)
+    record_lookups(record is not None, record is None)
+    if record is None:
+        raise HttpError(404, "No detection is known for this hash, upload the file")
+    return {"label_id": compact_detection(record)} if compact else record
+
+
+@api.post("/lookup", response=list[StoredDetection | None] | list[int | None])
+def lookup_batch(request, batch: LookupBatch, compact: bool = False) -> list[dict[str, Any] | None] | list[int | None]:
+    """Detections of inputs already seen, by the hashes of their windows, in order; ``null`` for the ones to upload."""
+    check_batch_size(batch.hashes)
+    records = [lookup_detection(content_hash) for content_hash in batch.hashes]
+    hits = sum(record is not None for record in records)
+    record_lookups(hits, len(records) - hits)
+    if compact:
+        return [compact_detection(record) if record is not None else None for record in records]
+    return records
+
+
+@api.get("/ready")
+def ready(request):
+    if warmup_mode == "off":
+        # nothing loads the model at boot, so the first readiness check does
+        get_magika()
+    status = {"ready": is_ready(), "loaded": is_loaded(), "warm": is_warm(), "model_version": model_version, **timings}
+    return api.create_response(request, status, status=200 if status["ready"] else 503)
 
 
 @api.get("/hello")
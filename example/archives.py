@@ -0,0 +1,271 @@
+"""
+Recursive detection of the members of zip, tar and gzip archives.
+
+Archives are never extracted. Each member is opened as a stream and only its head
+and tail windows are read: with a seek where the format allows it (stored zip
+members, plain tar) and by decompressing up to the tail otherwise. The windows of
+the members of one archive are identified in batches, and members that are
+archives themselves are expanded in turn.
+
+Zip bombs are bounded by three limits shared by the whole tree: the nesting depth,
+the number of members, and the number of bytes decompressed. When a limit is
+reached the archive being read is marked ``truncated`` with the name of the limit,
+and the members identified up to that point are still returned.
+"""
+
+import gzip
+import io
+import tarfile
+import zipfile
+import zlib
+from collections.abc import Callable, Iterator
+from contextlib import closing, nullcontext
+from typing import Any, BinaryIO
+
+from magika import MagikaResult
+
+from .windows import ByteWindows, read_stream_windows, read_windows
+
+ARCHIVE_LABELS = frozenset({"zip", "tar", "gzip"})
+
+# Raised by corrupt, truncated, encrypted or unsupported archives and members.
+ARCHIVE_ERRORS = (
+    zipfile.BadZipFile,
+    tarfile.TarError,
+    EOFError,
+    zlib.error,
+    NotImplementedError,
+    RuntimeError,
+    OSError,
+    ValueError,
+)
+
+
+class LimitExceeded(Exception):
+    """Raised when expanding an archive would go over one of the limits."""
+
+    def __init__(self, limit: str):
+        super().__init__(limit)
+        self.limit = limit
+
+
+class Budget:
+    """Members and decompressed bytes left for one archive tree."""
+
+    __slots__ = ("max_members", "max_bytes", "members", "bytes")
+
+    def __init__(self, max_members: int, max_bytes: int):
+        self.max_members = max_members
+        self.max_bytes = max_bytes
+        self.members = 0
+        self.bytes = 0
+
+    def count_member(self) -> None:
+        if self.members >= self.max_members:
+            raise LimitExceeded("max_members")
+        self.members += 1
+
+    def charge(self, size: int) -> None:
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            raise LimitExceeded("max_bytes")
+
+    @property
+    def remaining(self) -> int:
+        return max(self.max_bytes - self.bytes, 0)
+
+
+class MeteredStream:
+    """A decompressing stream whose work is charged to a ``Budget``.
+
+    Reads are charged the bytes returned and never decompress more than the budget
+    has left. Seeking forward is charged the bytes skipped and seeking backwards the
+    bytes from the start, since a compressed stream is decompressed again from the
+    beginning to go back.
+    """
+
+    def __init__(self, stream: BinaryIO, budget: Budget, size: int | None = None):
+        self.stream = stream
+        self.budget = budget
+        self.size = size
+
+    def read(self, size: int | None = -1) -> bytes:
+        limit = self.budget.remaining + 1
+        data = self.stream.read(limit if size is None or size < 0 else min(size, limit))
+        self.budget.charge(len(data))
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        position = self.stream.tell()
+        if whence == io.SEEK_CUR:
+            offset += position
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                raise io.UnsupportedOperation("the size of the stream is unknown")
+            offset += self.size
+        self.budget.charge(offset - position if offset >= position else offset)
+        return self.stream.seek(offset)
+
+    def tell(self) -> int:
+        return self.stream.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+class Member:
+    """A member of an archive: its windows and how to open it again, or why it could not be read."""
+
+    __slots__ = ("name", "windows", "open", "error")
+
+    def __init__(
+        self,
+        name: str,
+        windows: ByteWindows | None = None,
+        open: Callable[[], BinaryIO] | None = None,
+        error: str | None = None,
+    ):
+        self.name = name
+        self.windows = windows
+        self.open = open
+        self.error = error
+
+
+def gzip_member_name(name: str) -> str:
+    if name.endswith(".tgz"):
+        return name[:-4] + ".tar"
+    return name[:-3] if name.endswith(".gz") else name
+
+
+class ArchiveInspector:
+    """Expand archives into a tree of member detections.
+
+    ``identify`` runs one batched detection over a list of windows and ``describe``
+    turns a result and a size into the detection fields of a node.
+    """
+
+    def __init__(
+        self,
+        identify: Callable[[list[ByteWindows]], list[MagikaResult]],
+        describe: Callable[[MagikaResult, int], dict[str, Any]],
+        window_size: int,
+        max_depth: int,
+        max_members: int,
+        max_bytes: int,
+        batch_size: int = 256,
+    ):
+        self.identify = identify
+        self.describe = describe
+        self.window_size = window_size
+        self.max_depth = max_depth
+        self.max_members = max_members
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+
+    def expand(self, node: dict[str, Any], stream: BinaryIO, name: str = "") -> dict[str, Any]:
+        """Add the members of ``stream`` to ``node`` if its label is an archive format."""
+        if node["label"] in ARCHIVE_LABELS:
+            self._expand(node, node["label"], stream, name, 0, Budget(self.max_members, self.max_bytes))
+        return node
+
+    def _expand(self, node: dict[str, Any], kind: str, stream: BinaryIO, name: str, depth: int, budget: Budget) -> None:
+        if depth >= self.max_depth:
+            node["truncated"] = "max_depth"
+            return
+        children = node["members"] = []
+        batch: list[Member] = []
+        try:
+            if kind == "zip" and isinstance(stream, MeteredStream):
+                # the central directory is at the end: decompress once instead of rewinding
+                stream = io.BytesIO(stream.read())
+            with self._open(kind, stream) as archive:
+                for member in self._members(kind, archive, name, budget):
+                    batch.append(member)
+                    if len(batch) == self.batch_size:
+                        self._add(children, batch, depth, budget)
+                        batch = []
+                # nested archives are expanded while their parent is still open
+                self._add(children, batch, depth, budget)
+                batch = []
+        except LimitExceeded as exc:
+            node["truncated"] = exc.limit
+        except ARCHIVE_ERRORS as exc:
+            node["error"] = f"could not read {kind} archive: {exc}"
+        # members read before the archive stopped are identified, but not expanded:
+        # the archive is closed and their streams cannot be reopened
+        self._add(children, batch, None, budget)
+
+    def _add(self, children: list[dict[str, Any]], batch: list[Member], depth: int | None, budget: Budget) -> None:
+        readable = [member for member in batch if member.windows is not None]
+        results = iter(self.identify([member.windows for member in readable])) if readable else iter(())
+        for member in batch:
+            if member.windows is None:
+                children.append({"name": member.name, "error": member.error})
+                continue
+            child = {**self.describe(next(results), member.windows.size), "name": member.name}
+            children.append(child)
+            if depth is not None and child["label"] in ARCHIVE_LABELS:
+                try:
+                    stream = member.open()
+                except ARCHIVE_ERRORS as exc:
+                    child["error"] = f"could not open member: {exc}"
+                    continue
+                with closing(stream):
+                    self._expand(child, child["label"], stream, member.name, depth + 1, budget)
+
+    def _open(self, kind: str, stream: BinaryIO):
+        if kind == "zip":
+            return zipfile.ZipFile(stream)
+        if kind == "tar":
+            # tarfile reads from the current position
+            stream.seek(0)
+            return tarfile.open(fileobj=stream, mode="r:")
+        return nullcontext(stream)
+
+    def _members(self, kind: str, archive, name: str, budget: Budget) -> Iterator[Member]:
+        if kind == "zip":
+            return self._zip_members(archive, budget)
+        if kind == "tar":
+            return self._tar_members(archive, budget)
+        return self._gzip_members(archive, name, budget)
+
+    def _zip_members(self, archive: zipfile.ZipFile, budget: Budget) -> Iterator[Member]:
+        def open_member(info: zipfile.ZipInfo) -> BinaryIO:
+            member = archive.open(info)
+            if info.compress_type == zipfile.ZIP_STORED:
+                return member
+            return MeteredStream(member, budget, info.file_size)
+
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            budget.count_member()
+            try:
+                with closing(open_member(info)) as member:
+                    windows = read_windows(member, self.window_size, info.file_size)
+            except ARCHIVE_ERRORS as exc:
+                yield Member(info.filename, error=f"could not read member: {exc}")
+                continue
+            yield Member(info.filename, windows, lambda info=info: open_member(info))
+
+    def _tar_members(self, archive: tarfile.TarFile, budget: Budget) -> Iterator[Member]:
+        # members are visited in file order, so a decompressing stream only moves forward
+        for info in archive:
+            if not info.isfile():
+                continue
+            budget.count_member()
+            windows = read_windows(archive.extractfile(info), self.window_size, info.size)
+            yield Member(info.name, windows, lambda info=info: archive.extractfile(info))
+
+    def _gzip_members(self, stream: BinaryIO, name: str, budget: Budget) -> Iterator[Member]:
+        def open_content() -> BinaryIO:
+            stream.seek(0)
+            return MeteredStream(gzip.GzipFile(fileobj=stream, mode="rb"), budget)
+
+        budget.count_member()
+        with closing(open_content()) as content:
+            windows = read_stream_windows(content, self.window_size)
+        yield Member(gzip_member_name(name), windows, open_content)
@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from example.model import warm_up_on_boot
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'example.settings')
 
 application = get_asgi_application()
+
+# Load the Magika model and run a dummy inference before serving (MAGIKA_WARMUP).
+warm_up_on_boot()
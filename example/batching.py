@@ -0,0 +1,69 @@
+"""
+Cross-request micro-batching in front of the shared Magika model.
+
+Concurrent requests hand their extracted features to a ``MicroBatcher``; a single
+background thread collects them for at most ``max_wait`` seconds (or until
+``max_batch_size`` items are queued), runs one batched inference and hands every
+caller its own result.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+
+class MicroBatcher:
+    """Group single-item inference calls from many threads into batched calls."""
+
+    def __init__(self, infer: Callable[[list[Any]], list[Any]], max_wait: float, max_batch_size: int):
+        self.infer = infer
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, item: Any) -> Any:
+        """Queue ``item`` for the next batch and block until its result is ready."""
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _ensure_started(self) -> None:
+        # The worker thread is started lazily so that it is created in the process
+        # that serves requests, not in a parent that forks workers after import.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="magika-microbatcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list[tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.infer(items)
+            except BaseException as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
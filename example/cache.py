@@ -0,0 +1,96 @@
+"""
+Detection result cache keyed by the bytes Magika's features are built from.
+
+Two inputs with the same size and the same head and tail windows always get the
+same prediction, so a BLAKE2b digest of exactly those bytes is used as the key.
+Keys are namespaced by the Magika model version, so results computed by another
+model are never returned. Entries live in a bounded in-process LRU with a TTL and,
+optionally, in a Django cache backend shared by all workers.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from .windows import ByteWindows
+
+
+def window_digest(windows: ByteWindows) -> str:
+    """BLAKE2b-128 of the size (8 bytes, little endian), the head and, if different, the tail window."""
+    digest = hashlib.blake2b(windows.size.to_bytes(8, "little"), digest_size=16)
+    digest.update(windows.head)
+    if windows.tail is not windows.head:
+        digest.update(windows.tail)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """Bounded LRU with TTL in front of an optional shared Django cache."""
+
+    def __init__(self, version: str, max_entries: int = 10000, ttl: float = 3600, backend=None):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def key(self, digest: str) -> str:
+        return f"magika:{self.version}:{digest}"
+
+    def key_for(self, windows: ByteWindows) -> str:
+        return self.key(window_digest(windows))
+
+    def get(self, key: str) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                self._store(key, value, now)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        self._store(key, value, time.monotonic())
+        if self.backend is not None:
+            self.backend.set(key, value, timeout=self.ttl)
+
+    def _store(self, key: str, value: Any, now: float) -> None:
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,207 @@
+"""
+Executors that run Magika inference off the ASGI event loop, or off the GIL.
+
+onnxruntime releases the GIL while a session runs, so a small thread pool is
+enough to keep inference off the event loop. ``BoundedExecutor`` caps the number
+of running plus queued calls; once that cap is reached new calls fail fast with
+``ExecutorSaturated`` instead of piling up behind a saturated pool.
+
+Feature extraction is pure Python and holds the GIL, so the detection of a batch
+can also be split across an inference backend (``INFERENCE_BACKEND``):
+``InlineBackend`` runs it on the calling thread, ``ThreadBackend`` splits batches
+across threads, which overlap only in the model, and ``ProcessBackend`` splits them
+across worker processes that each own a model. The windows are passed to the
+processes through one shared memory segment per batch; only its name and the
+offsets are pickled, and only the label names and scores come back.
+"""
+
+import asyncio
+import os
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Callable
+
+from magika import Magika, MagikaResult
+
+from .model import WARMUP_CONTENT, build_local_magika, session_options
+from .windows import ByteWindows
+
+
+class ExecutorSaturated(Exception):
+    """Raised when an executor has no free running or queued slots."""
+
+
+class BoundedExecutor:
+    """Thread pool with ``max_workers`` threads and at most ``max_pending`` queued calls."""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="magika-inference")
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run ``func(*args)`` in the pool and await its result."""
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturated(f"{self.max_workers} inference threads busy and {self.max_pending} calls queued")
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot is freed when the call ends, not when the caller stops waiting: a
+        # cancelled request (e.g. a disconnected client) leaves its call running
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def split_batch(items: Sequence, parts: int, min_size: int) -> list[Sequence]:
+    """Split ``items`` into at most ``parts`` contiguous chunks of at least ``min_size`` items."""
+    parts = max(1, min(parts, len(items) // max(min_size, 1)))
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for index in range(parts):
+        end = start + size + (index < extra)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+class InlineBackend:
+    """Identify windows on the calling thread."""
+
+    def __init__(self, identify: Callable[[list[ByteWindows]], list[MagikaResult]]):
+        self.identify = identify
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ThreadBackend:
+    """Identify the chunks of a batch in a pool of ``workers`` threads."""
+
+    def __init__(self, identify: Callable[[list[ByteWindows]], list[MagikaResult]], workers: int, min_chunk: int):
+        self._identify = identify
+        self.workers = workers
+        self.min_chunk = min_chunk
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="magika-backend")
+
+    def identify(self, windows: list[ByteWindows]) -> list[MagikaResult]:
+        chunks = split_batch(windows, self.workers, self.min_chunk)
+        if len(chunks) == 1:
+            return self._identify(windows)
+        return [result for results in self._executor.map(self._identify, chunks) for result in results]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# the model of a ProcessBackend worker process
+_process_magika: Magika | None = None
+
+
+def start_process_worker(ort_threads: int) -> None:
+    global _process_magika
+    _process_magika = build_local_magika(session_options(intra_op=ort_threads))
+    _process_magika.identify_bytes(WARMUP_CONTENT)
+
+
+def identify_shared(name: str, layout: list[tuple[int, int, int, int, int]]) -> list[tuple[str, str, float, str]]:
+    """Identify the windows at ``layout`` (head offset and length, tail offset and length, size) in segment ``name``."""
+    segment = SharedMemory(name=name, track=False)
+    try:
+        buffer = segment.buf
+        # Magika strips the windows with ``bytes`` methods, so they are copied out
+        windows = [
+            ByteWindows(bytes(buffer[head : head + head_size]), bytes(buffer[tail : tail + tail_size]), size)
+            for head, head_size, tail, tail_size, size in layout
+        ]
+        del buffer
+    finally:
+        segment.close()
+    results: list[MagikaResult | None] = [None] * len(windows)
+    pending = []
+    for index, item in enumerate(windows):
+        result, features = _process_magika._get_result_or_features_from_seekable(item)
+        if result is None:
+            pending.append((Path(str(index)), features))
+        else:
+            results[index] = result
+    if pending:
+        for path, result in _process_magika._get_results_from_features(pending).items():
+            results[int(path)] = result
+    return [
+        (str(result.dl.label), str(result.output.label), result.score, str(result.prediction.overwrite_reason))
+        for result in results
+    ]
+
+
+class ProcessBackend:
+    """Identify the chunks of a batch in ``workers`` processes, each with its own model.
+
+    The processes are started on first use. ``build_result`` turns the label
+    names and score sent back by a process into a ``MagikaResult``.
+    """
+
+    def __init__(
+        self,
+        build_result: Callable[[tuple[str, str, float, str]], MagikaResult],
+        workers: int,
+        min_chunk: int,
+        ort_threads: int = 1,
+    ):
+        self.build_result = build_result
+        self.workers = workers
+        self.min_chunk = min_chunk
+        self.ort_threads = ort_threads
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        self.workers,
+                        # forking a process that runs onnxruntime and server threads is unsafe
+                        mp_context=get_context("spawn"),
+                        initializer=start_process_worker,
+                        initargs=(self.ort_threads,),
+                    )
+        return self._executor
+
+    def identify(self, windows: list[ByteWindows]) -> list[MagikaResult]:
+        if not windows:
+            return []
+        pool = self._pool()
+        layout, size = [], 0
+        for item in windows:
+            tail = size + len(item.head) if item.tail is not item.head else size
+            layout.append((size, len(item.head), tail, len(item.tail), item.size))
+            size = max(size + len(item.head), tail + len(item.tail))
+        segment = SharedMemory(create=True, size=max(size, 1))
+        try:
+            for item, (head, head_size, tail, tail_size, _) in zip(windows, layout):
+                segment.buf[head : head + head_size] = item.head
+                segment.buf[tail : tail + tail_size] = item.tail
+            offsets = split_batch(layout, self.workers, self.min_chunk)
+            futures = [pool.submit(identify_shared, segment.name, chunk) for chunk in offsets]
+            return [self.build_result(fields) for future in futures for fields in future.result()]
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def default_workers() -> int:
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
@@ -0,0 +1,159 @@
+"""
+Shared-model inference over a local Unix socket.
+
+One ``InferenceServer`` process owns the ONNX session; HTTP workers create a
+``RemoteMagika`` instead of ``Magika``. ``RemoteMagika`` loads only the model
+configuration and replaces the ONNX session with a ``RemoteSession`` that sends the
+feature matrix to the server, so feature extraction, result building and caching
+stay in the worker while the model itself is loaded once per host. Feature
+batches arriving concurrently from several workers are merged by a
+``MicroBatcher`` into a single session run.
+
+Run the server with ``python -m example.inference_server --socket /tmp/magika.sock``
+and point the workers at it with ``INFERENCE_SOCKET=/tmp/magika.sock``.
+
+Each frame is a ``(rows, cols)`` header of two little-endian uint32 followed by
+the matrix: uint16 feature tokens from the worker, float32 scores in the reply.
+"""
+
+import argparse
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+from magika import Magika
+
+from .batching import MicroBatcher
+
+HEADER = struct.Struct("<II")
+
+
+def send_matrix(sock: socket.socket, matrix: np.ndarray) -> None:
+    rows, cols = matrix.shape
+    sock.sendall(HEADER.pack(rows, cols) + matrix.tobytes())
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("inference socket closed")
+        received += count
+    return bytes(buffer)
+
+
+def recv_matrix(sock: socket.socket, dtype) -> np.ndarray:
+    rows, cols = HEADER.unpack(recv_exact(sock, HEADER.size))
+    data = recv_exact(sock, rows * cols * np.dtype(dtype).itemsize)
+    return np.frombuffer(data, dtype=dtype).reshape(rows, cols)
+
+
+class RemoteSession:
+    """Stand-in for ``onnxruntime.InferenceSession`` that runs on the inference server.
+
+    Every thread keeps its own connection, which is (re)opened on first use so
+    that workers can start before the server is listening.
+    """
+
+    def __init__(self, socket_path: str, connect_timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except OSError:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+
+    def run(self, output_names, input_feed) -> list[np.ndarray]:
+        features = np.asarray(input_feed["bytes"], dtype=np.uint16)
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._local.sock = self._connect()
+        try:
+            send_matrix(sock, features)
+            return [recv_matrix(sock, np.float32)]
+        except OSError:
+            sock.close()
+            self._local.sock = None
+            raise
+
+
+class RemoteMagika(Magika):
+    """``Magika`` whose model runs in a shared ``InferenceServer`` process."""
+
+    def __init__(self, socket_path: str, **kwargs):
+        self._socket_path = socket_path
+        super().__init__(**kwargs)
+
+    def _init_onnx_session(self) -> RemoteSession:
+        return RemoteSession(self._socket_path)
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    """Serve batched ONNX inference for ``RemoteSession`` clients."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, magika: Magika, max_wait: float = 0.002, max_batch_size: int = 256):
+        self.magika = magika
+        self.batcher = MicroBatcher(self._infer, max_wait, max_batch_size)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, InferenceRequestHandler)
+
+    def _infer(self, matrices: list[np.ndarray]) -> list[np.ndarray]:
+        features = np.concatenate(matrices).astype(np.int32)
+        scores = self.magika._onnx_session.run(["target_label"], {"bytes": features})[0]
+        offsets = np.cumsum([len(matrix) for matrix in matrices])[:-1]
+        return np.split(scores, offsets)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class InferenceRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                features = recv_matrix(self.request, np.uint16)
+            except ConnectionError:
+                return
+            send_matrix(self.request, np.ascontiguousarray(self.server.batcher.submit(features), dtype=np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Magika model to HTTP workers over a Unix socket.")
+    parser.add_argument("--socket", default=os.getenv("INFERENCE_SOCKET", "/tmp/magika.sock"))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("MICROBATCH_MAX_WAIT_MS", 2)))
+    parser.add_argument("--max-batch", type=int, default=int(os.getenv("MICROBATCH_MAX_SIZE", 256)))
+    args = parser.parse_args()
+
+    from .model import build_local_magika
+
+    server = InferenceServer(args.socket, build_local_magika(), args.max_wait_ms / 1000, args.max_batch)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Detection jobs queued in the database and run by a local worker pool.
+
+The ``DetectionJob`` table is the queue: no broker is needed, and the SQLite
+``IMMEDIATE`` transactions configured in settings make claiming a job atomic
+across worker processes. Jobs are claimed by priority, then age. A running job
+refreshes its heartbeat after every batch; a job whose heartbeat is older than the
+lease (its worker died) is queued again. A job that raises is retried with an
+exponential backoff until it has run ``max_attempts`` times.
+
+``run_job`` reads the head and tail windows of every file and identifies them in
+batches with the same code as the upload endpoints; the management command
+``jobworker`` passes it ``api.identify_seekables``.
+"""
+
+import os
+import shutil
+from collections.abc import Callable, Iterator
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from magika import MagikaResult
+
+from .models import DetectionJob
+from .windows import ByteWindows, read_windows
+
+ACTIVE = (DetectionJob.QUEUED, DetectionJob.RUNNING)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while too many jobs are queued or running."""
+
+
+class TooManyFiles(Exception):
+    """Raised when the paths of a job expand to more files than allowed."""
+
+
+def submit(items: list[dict[str, str]], priority: int = 0, max_attempts: int = 3, job_id=None) -> DetectionJob:
+    fields = {"id": job_id} if job_id is not None else {}
+    return DetectionJob.objects.create(
+        items=items, priority=priority, max_attempts=max_attempts, total=len(items), **fields
+    )
+
+
+def active_count() -> int:
+    return DetectionJob.objects.filter(status__in=ACTIVE).count()
+
+
+def spool_dir(root: str, job_id) -> Path:
+    return Path(root) / str(job_id)
+
+
+def claim(worker: str) -> DetectionJob | None:
+    """Mark the next available job as running by ``worker`` and return it."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            DetectionJob.objects.filter(status=DetectionJob.QUEUED, available_at__lte=now)
+            .order_by("-priority", "created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        # the status condition keeps the claim atomic on databases without IMMEDIATE transactions
+        claimed = DetectionJob.objects.filter(pk=job.pk, status=DetectionJob.QUEUED).update(
+            status=DetectionJob.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def reclaim_stale(lease: float) -> int:
+    """Queue again the running jobs whose worker stopped sending heartbeats."""
+    expired = DetectionJob.objects.filter(
+        status=DetectionJob.RUNNING, heartbeat_at__lt=timezone.now() - timedelta(seconds=lease)
+    )
+    failed = expired.filter(attempts__gte=F("max_attempts")).update(
+        status=DetectionJob.FAILED, error="worker lost", finished_at=timezone.now()
+    )
+    return failed + expired.update(status=DetectionJob.QUEUED, worker="")
+
+
+def retry_or_fail(job: DetectionJob, error: str, backoff: float, retry: bool = True) -> None:
+    job.error = error
+    if retry and job.attempts < job.max_attempts:
+        job.status = DetectionJob.QUEUED
+        job.available_at = timezone.now() + timedelta(seconds=backoff * 2 ** (job.attempts - 1))
+    else:
+        job.status = DetectionJob.FAILED
+        job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "available_at", "finished_at"])
+
+
+def expand(items: list[dict[str, str]], max_files: int) -> Iterator[dict[str, str]]:
+    """Yield the items of a job with directories replaced by the files below them."""
+    count = 0
+    for item in items:
+        paths = walk(item["path"]) if os.path.isdir(item["path"]) else [item["path"]]
+        for path in paths:
+            count += 1
+            if count > max_files:
+                raise TooManyFiles(f"the job has more than {max_files} files")
+            yield item if path == item["path"] else {"name": path, "path": path}
+
+
+def walk(root: str) -> Iterator[str]:
+    # symbolic links are skipped so that a job cannot reach outside the directories it was given
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            if not os.path.islink(path):
+                yield path
+
+
+def read_item_windows(path: str, window_size: int) -> ByteWindows | OSError:
+    try:
+        with open(path, "rb") as stream:
+            return read_windows(stream, window_size)
+    except OSError as exc:
+        return exc
+
+
+def run_job(
+    job: DetectionJob,
+    identify: Callable[[list[ByteWindows]], list[MagikaResult]],
+    describe: Callable[[MagikaResult, int], dict[str, Any]],
+    window_size: int,
+    batch_size: int,
+    max_files: int,
+) -> None:
+    """Detect every file of ``job``, recording progress after each batch."""
+    items = list(expand(job.items, max_files))
+    job.total = len(items)
+    job.completed = 0
+    results = []
+    for start in range(0, len(items), batch_size):
+        batch = items[start : start + batch_size]
+        windows = [read_item_windows(item["path"], window_size) for item in batch]
+        readable = [item for item in windows if not isinstance(item, OSError)]
+        identified = iter(identify(readable)) if readable else iter(())
+        for item, item_windows in zip(batch, windows):
+            if isinstance(item_windows, OSError):
+                results.append({"name": item["name"], "error": f"{type(item_windows).__name__}: {item_windows}"})
+            else:
+                results.append({**describe(next(identified), item_windows.size), "name": item["name"]})
+        job.completed = len(results)
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=["total", "completed", "heartbeat_at"])
+    job.results = results
+    job.status = DetectionJob.DONE
+    job.error = ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["results", "status", "error", "finished_at"])
+
+
+def remove_spool(root: str, job: DetectionJob) -> None:
+    if job.status in (DetectionJob.DONE, DetectionJob.FAILED):
+        shutil.rmtree(spool_dir(root, job.id), ignore_errors=True)
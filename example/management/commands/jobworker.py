@@ -0,0 +1,125 @@
+"""
+Local worker pool for the detection job queue.
+
+Starts ``--processes`` worker processes that claim jobs from the database, run
+them and record their results. Workers lower their CPU priority with ``--nice`` and
+run onnxruntime with ``--ort-threads`` threads, so that bulk jobs running next to
+the Granian workers on the same host leave CPU for interactive uploads. SIGINT or
+SIGTERM stops the workers after the batch they are running.
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def work(options: dict, stop) -> None:
+    """Claim and run jobs until ``stop`` is set (or the queue is empty with ``burst``)."""
+    from example import api, jobs
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    last_reclaim = 0.0
+    while not stop.is_set():
+        if time.monotonic() - last_reclaim > options["lease"] / 2:
+            jobs.reclaim_stale(options["lease"])
+            last_reclaim = time.monotonic()
+        job = jobs.claim(worker)
+        if job is None:
+            if options["burst"]:
+                return
+            stop.wait(options["poll_interval"])
+            continue
+        try:
+            jobs.run_job(
+                job,
+                api.identify_seekables,
+                lambda result, size: api.detection(result, size, api.model_version),
+                api.window_size,
+                api.max_batch_size,
+                api.job_max_files,
+            )
+        except jobs.TooManyFiles as exc:
+            jobs.retry_or_fail(job, str(exc), options["backoff"], retry=False)
+        except Exception:
+            jobs.retry_or_fail(job, traceback.format_exc(limit=5), options["backoff"])
+        jobs.remove_spool(api.job_spool_dir, job)
+
+
+def load_model(ort_threads: int) -> None:
+    """Load the worker's model with ``ort_threads`` onnxruntime threads, whatever ``ORT_INTRA_OP_THREADS`` says."""
+    from example import model
+
+    if model.inference_socket:
+        # the shared inference server owns the session and its threads
+        return
+    model.get_magika(lambda: model.build_local_magika(model.session_options(intra_op=ort_threads)))
+
+
+def run_worker(options: dict, ort_threads: int, stop) -> None:
+    """Entry point of a worker process."""
+    import django
+
+    # the parent stops the workers through ``stop``; a second Ctrl+C kills them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if options["nice"]:
+        os.nice(options["nice"])
+    django.setup()
+    load_model(ort_threads)
+    work(options, stop)
+
+
+class Command(BaseCommand):
+    help = "Run detection jobs queued through /api/jobs in a pool of worker processes."
+
+    # the system checks import the URLconf, and with it the model settings, too early
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2, help="Worker processes; 0 runs one worker in-process.")
+        parser.add_argument("--ort-threads", type=int, default=1, help="onnxruntime intra-op threads per worker.")
+        parser.add_argument("--nice", type=int, default=10, help="Added to the CPU niceness of the workers.")
+        parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between polls of an empty queue.")
+        parser.add_argument("--lease", type=float, default=60, help="Seconds without heartbeat before a job is retried.")
+        parser.add_argument("--backoff", type=float, default=5, help="Seconds before the first retry, doubled each time.")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        if processes < 0:
+            raise CommandError("--processes must not be negative")
+        worker_options = {name: options[name] for name in ("nice", "poll_interval", "lease", "backoff", "burst")}
+
+        if processes == 0:
+            stop = threading.Event()
+            self._stop_on_signals(stop)
+            load_model(options["ort_threads"])
+            work(worker_options, stop)
+            return
+        context = multiprocessing.get_context("spawn")
+        stop = context.Event()
+        workers = [
+            context.Process(
+                target=run_worker, args=(worker_options, options["ort_threads"], stop), name=f"jobworker-{index}"
+            )
+            for index in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        self._stop_on_signals(stop)
+        self.stdout.write(f"Started {processes} job workers")
+        for process in workers:
+            process.join()
+
+    def _stop_on_signals(self, stop) -> None:
+        def handler(signum, frame):
+            self.stderr.write("Stopping job workers after their current batch")
+            stop.set()
+
+        signal.signal(signal.SIGINT, handler)
+        signal.signal(signal.SIGTERM, handler)
@@ -0,0 +1,166 @@
+"""
+Bulk file type detection over directory trees or path lists.
+
+Paths are walked lazily, so the file list of the tree is never held in memory:
+each directory is sorted by name, which holds only the entries of the directories
+on the current path (``--unordered`` reads them in file system order). A thread pool
+reads the head and tail windows of the next batch while the current batch goes
+through the same detection code as the upload endpoints, and results are
+streamed out as JSONL or CSV. The number of completed inputs is written to the
+checkpoint file after every batch, so an interrupted scan resumes where it
+stopped (the walk order is deterministic); at most the batch in flight when the
+scan was interrupted is written twice.
+"""
+
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from example.api import identify_seekables, window_size
+from example.windows import read_windows
+
+FIELDS = ["path", "size", "label", "mime_type", "group", "score", "error"]
+
+
+def walk(root: str, ordered: bool = True):
+    """Yield every file below ``root`` without listing the whole tree.
+
+    With ``ordered`` the entries of each directory are sorted by name, so the order is
+    deterministic but a directory's listing is held while it is walked; otherwise they
+    are yielded in file system order as ``os.scandir`` reads them.
+    """
+    if not os.path.isdir(root):
+        yield root
+        return
+    try:
+        scandir = os.scandir(root)
+    except OSError:
+        return
+    with scandir:
+        entries = sorted(scandir, key=lambda entry: entry.name) if ordered else scandir
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path, ordered)
+            elif entry.is_file():
+                yield entry.path
+
+
+def iter_paths(roots: list[str], stdin, ordered: bool = True) -> itertools.chain:
+    sources = []
+    for root in roots:
+        if root == "-":
+            sources.append(line.rstrip("\n") for line in stdin if line.strip())
+        else:
+            sources.append(walk(root, ordered))
+    return itertools.chain.from_iterable(sources)
+
+
+def read_path_windows(path: str):
+    try:
+        with open(path, "rb") as stream:
+            return read_windows(stream, window_size)
+    except OSError as exc:
+        return exc
+
+
+class Command(BaseCommand):
+    help = "Detect the file type of every file in directory trees or in a path list read from stdin ('-')."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Directories or files to scan, or '-' to read paths from stdin.")
+        parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+        parser.add_argument("--output", help="Write results to this file instead of stdout (appended on resume).")
+        parser.add_argument("--checkpoint", help="File recording progress; an existing checkpoint resumes the scan.")
+        parser.add_argument(
+            "--unordered",
+            action="store_true",
+            help="Walk directories in file system order instead of sorting each one (not with --checkpoint).",
+        )
+        parser.add_argument("--batch-size", type=int, default=256)
+        parser.add_argument("--threads", type=int, default=8, help="Threads reading file windows.")
+        parser.add_argument("--progress-every", type=float, default=10, help="Seconds between progress reports.")
+
+    def handle(self, *args, **options):
+        completed = 0
+        if options["checkpoint"] and os.path.exists(options["checkpoint"]):
+            with open(options["checkpoint"]) as checkpoint:
+                completed = json.load(checkpoint)["completed"]
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options["unordered"] and options["checkpoint"]:
+            raise CommandError("--checkpoint needs the deterministic order, it cannot be used with --unordered")
+
+        paths = itertools.islice(iter_paths(options["paths"], sys.stdin, not options["unordered"]), completed, None)
+        output = open(options["output"], "a" if completed else "w", newline="") if options["output"] else self.stdout
+        try:
+            writer = self._writer(output, options["format"], header=not completed)
+            self._scan(paths, writer, output, completed, options)
+        finally:
+            if options["output"]:
+                output.close()
+
+    def _writer(self, output, fmt, header):
+        if fmt == "csv":
+            writer = csv.DictWriter(output, fieldnames=FIELDS)
+            if header:
+                writer.writeheader()
+            return writer.writerow
+        return lambda record: output.write(json.dumps(record) + "\n")
+
+    def _scan(self, paths, writer, output, completed, options) -> None:
+        batches = itertools.batched(paths, options["batch_size"])
+        start = last_report = time.monotonic()
+        scanned = 0
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            pending = self._submit(pool, next(batches, None))
+            while pending is not None:
+                batch, reads = pending
+                # read the next batch while the current one is being identified
+                pending = self._submit(pool, next(batches, None))
+                windows = [read.result() for read in reads]
+                readable = [item for item in windows if not isinstance(item, Exception)]
+                results = iter(identify_seekables(readable))
+                for path, item in zip(batch, windows):
+                    if isinstance(item, Exception):
+                        writer({"path": path, "error": str(item)})
+                        continue
+                    result = next(results)
+                    writer(
+                        {
+                            "path": path,
+                            "size": item.size,
+                            "label": str(result.output.label),
+                            "mime_type": result.output.mime_type,
+                            "group": result.output.group,
+                            "score": round(result.score, 4),
+                        }
+                    )
+                output.flush()
+                scanned += len(batch)
+                self._save_checkpoint(options["checkpoint"], completed + scanned)
+
+                now = time.monotonic()
+                if now - last_report >= options["progress_every"]:
+                    self.stderr.write(f"{scanned} files, {scanned / (now - start):.1f} files/s")
+                    last_report = now
+        elapsed = time.monotonic() - start
+        if scanned:
+            self.stderr.write(f"{scanned} files in {elapsed:.1f}s, {scanned / elapsed:.1f} files/s")
+
+    def _submit(self, pool, batch):
+        if batch is None:
+            return None
+        return batch, [pool.submit(read_path_windows, path) for path in batch]
+
+    def _save_checkpoint(self, path, completed):
+        if not path:
+            return
+        with open(f"{path}.tmp", "w") as checkpoint:
+            json.dump({"completed": completed}, checkpoint)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,68 @@
+"""
+Compare the signature precheck with Magika on a corpus of files.
+
+Every file is labelled both by ``SIGNATURES`` and by the model, without the
+detection cache. For each signature label the report gives the files it matched,
+how many of them Magika labels the same and what Magika says about the others;
+a label is safe to answer without the model when they always agree. The totals
+give the share of files the precheck would answer and the time it saves.
+"""
+
+import itertools
+import sys
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from example.api import lookup_seekables
+from example.model import model_config
+from example.signatures import SIGNATURES, SignatureTable
+
+from .scan import iter_paths, read_path_windows
+
+
+class Command(BaseCommand):
+    help = "Compare the magic-number signature precheck with Magika on directory trees or a path list ('-')."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Directories or files to compare, or '-' to read paths from stdin.")
+        parser.add_argument("--limit", type=int, help="Stop after this many files.")
+        parser.add_argument("--batch-size", type=int, default=256)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        table = SignatureTable(SIGNATURES, model_config().min_file_size_for_dl)
+        paths = itertools.islice(iter_paths(options["paths"], sys.stdin), options["limit"])
+        matched: dict[str, Counter] = defaultdict(Counter)
+        files = 0
+        signature_seconds = model_seconds = 0.0
+        for batch in itertools.batched(paths, options["batch_size"]):
+            windows = [item for item in map(read_path_windows, batch) if not isinstance(item, Exception)]
+            start = time.perf_counter()
+            labels = [table.match(item.head, item.size) for item in windows]
+            signature_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            results = lookup_seekables(windows, None, cached=False, precheck=False)
+            model_seconds += time.perf_counter() - start
+            files += len(windows)
+            for label, result in zip(labels, results):
+                if label is not None:
+                    matched[str(label)][str(result.output.label)] += 1
+
+        self.stdout.write(f"{'label':<10} {'matched':>8} {'agree':>8}  magika labels of the others")
+        for label, magika_labels in sorted(matched.items()):
+            agree = magika_labels[label]
+            others = ", ".join(f"{other}:{count}" for other, count in magika_labels.most_common() if other != label)
+            self.stdout.write(f"{label:<10} {magika_labels.total():>8} {agree:>8}  {others}")
+        hits = sum(counts.total() for counts in matched.values())
+        agreed = sum(counts[label] for label, counts in matched.items())
+        self.stdout.write(
+            f"{files} files, {hits} matched ({hits / files:.1%})" if files else "no readable files",
+        )
+        if hits:
+            self.stdout.write(
+                f"agreement {agreed / hits:.2%}; signatures {signature_seconds / files * 1e6:.1f} us/file, "
+                f"model {model_seconds / files * 1e6:.1f} us/file"
+            )
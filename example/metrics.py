@@ -0,0 +1,267 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+The detection path is instrumented with ``stage(name)``, a context manager that
+records the elapsed time of one stage (multipart parsing, window reads, feature
+extraction, ONNX inference, response rendering) in the ``magika_stage_seconds``
+histogram. Recording a sample is a bisect and two additions under a lock, so the
+instrumentation can stay on in production; ``METRICS_ENABLED=false`` turns every
+timer into a no-op.
+
+Metrics are kept per process. With several server workers each worker reports
+its own values, so scrape them through a per-worker target or aggregate with
+``sum without (instance)`` as usual for multi-process exporters.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Iterable
+
+metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = tuple(1024 * 4**power for power in range(9))
+
+STAGES = ("multipart", "read", "features", "inference", "render")
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds."""
+
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name: str, labels: dict[str, str]) -> Iterable[str]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            le = bound if isinstance(bound, str) else format_value(float(bound))
+            yield f"{name}_bucket{format_labels({**labels, 'le': le})} {cumulative}"
+        yield f"{name}_sum{format_labels(labels)} {format_value(total)}"
+        yield f"{name}_count{format_labels(labels)} {cumulative}"
+
+
+class HistogramFamily:
+    """Histograms of one metric, one per value of an optional label."""
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...], label: str | None = None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        self._children: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str = "") -> Histogram:
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(value, Histogram(self.buckets))
+        return child
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for value, child in sorted(self._children.items()):
+            yield from child.samples(self.name, {self.label: value} if self.label else {})
+
+
+class CounterFamily:
+    """Monotonic counters of one metric, one per value of an optional label."""
+
+    def __init__(self, name: str, help: str, label: str | None = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, value: str = "") -> None:
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def inc_many(self, values: Iterable[str]) -> None:
+        with self._lock:
+            for value in values:
+                self._values[value] = self._values.get(value, 0) + 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for value, total in values:
+            yield f"{self.name}{format_labels({self.label: value} if self.label else {})} {format_value(total)}"
+
+
+class Gauge:
+    """A value read from ``callback`` whenever the metrics are rendered."""
+
+    def __init__(self, name: str, help: str, callback: Callable[[], float | None], type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.type = type
+
+    def render(self) -> Iterable[str]:
+        value = self.callback()
+        if value is None:
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield f"{self.name} {format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "".join(f"{line}\n" for metric in self.metrics for line in metric.render())
+
+
+class Timer:
+    """Context manager adding the time spent in its block to ``histogram``."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(perf_counter() - self.start)
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+registry = Registry()
+
+stage_seconds = registry.register(
+    HistogramFamily("magika_stage_seconds", "Time spent in each stage of the detection path.", LATENCY_BUCKETS, "stage")
+)
+stage_histograms = {name: stage_seconds.labels(name) for name in STAGES}
+
+detections_total = registry.register(CounterFamily("magika_detections_total", "Detections by output label.", "label"))
+
+request_bytes_read = registry.register(
+    HistogramFamily("magika_request_bytes_read", "Bytes read from the uploaded files of one request.", BYTES_BUCKETS)
+)
+
+
+def stage(name: str) -> Timer | NullTimer:
+    """Time a stage of the detection path, e.g. ``with stage("inference"): ...``."""
+    if not metrics_enabled:
+        return NULL_TIMER
+    return Timer(stage_histograms[name])
+
+
+def record_detections(labels: Iterable[str]) -> None:
+    if metrics_enabled:
+        detections_total.inc_many(labels)
+
+
+def record_bytes_read(count: int) -> None:
+    if metrics_enabled:
+        request_bytes_read.observe(count)
+
+
+tier_probed_total = registry.register(
+    CounterFamily("magika_tier_probed_total", "Files identified at each tier of tiered detection.", "tier")
+)
+tier_accepted_total = registry.register(
+    CounterFamily("magika_tier_accepted_total", "Files whose answer was kept at each tier of tiered detection.", "tier")
+)
+
+
+def record_tier(tier: str, probed: int, accepted: int) -> None:
+    if metrics_enabled:
+        tier_probed_total.inc(probed, tier)
+        tier_accepted_total.inc(accepted, tier)
+
+
+tier_whole_files_total = registry.register(
+    CounterFamily("magika_tier_whole_files_total", "Files of tiered detection no longer than a prefix, identified whole.")
+)
+
+
+def record_whole_files(count: int) -> None:
+    if metrics_enabled:
+        tier_whole_files_total.inc(count)
+
+
+admission_rejected_total = registry.register(
+    CounterFamily("magika_admission_rejected_total", "Requests rejected by admission control, by reason.", "reason")
+)
+
+
+def record_rejection(reason: str) -> None:
+    if metrics_enabled:
+        admission_rejected_total.inc(1, reason)
+
+
+signature_checks_total = registry.register(
+    CounterFamily("magika_signature_checks_total", "Signature prechecks by matched label, or miss.", "result")
+)
+
+
+def record_signature(result: str) -> None:
+    if metrics_enabled:
+        signature_checks_total.inc(1, result)
+
+
+lookups_total = registry.register(
+    CounterFamily("magika_lookups_total", "Detection lookups by content hash, by result (hit or miss).", "result")
+)
+
+
+def record_lookups(hits: int, misses: int) -> None:
+    if metrics_enabled:
+        lookups_total.inc(hits, "hit")
+        lookups_total.inc(misses, "miss")
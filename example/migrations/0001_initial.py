@@ -0,0 +1,32 @@
+# Generated by Django 6.1.2 on 2026-10-17 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=32)),
+                ('size', models.BigIntegerField()),
+                ('label', models.CharField(max_length=64)),
+                ('mime_type', models.CharField(max_length=128)),
+                ('group', models.CharField(max_length=32)),
+                ('score', models.FloatField()),
+                ('model_version', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['label'], name='detection_label')],
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'model_version'), name='detection_hash_version')],
+            },
+        ),
+    ]
@@ -0,0 +1,213 @@
+"""
+Lazy, thread-safe access to the shared Magika model.
+
+Importing the API no longer builds the ONNX session: ``get_magika()`` loads the
+model on first use, so management commands such as ``manage.py check`` stay cheap.
+``warm_up()`` loads the model and runs a dummy inference; the WSGI/ASGI entry
+points call it at worker boot according to ``MAGIKA_WARMUP`` and ``/api/ready``
+reports when it has finished. With ``MAGIKA_WARMUP=off`` there is no warm-up, so
+the worker is ready as soon as ``get_magika()`` has loaded the model.
+
+The model configuration (window size, model name) is read straight from the model
+directory so it is available without loading the session.
+
+The onnxruntime session is built by ``TunedMagika`` from the ``ORT_*`` settings
+below, so several workers per host can be given a bounded number of threads each.
+With ``ORT_OPTIMIZED_MODEL_DIR`` set, the optimized graph is saved on first load
+and reloaded (without re-optimizing) by later processes.
+"""
+
+import os
+import threading
+import time
+from collections.abc import Callable
+from functools import cache
+from pathlib import Path
+
+import magika
+import onnxruntime as rt
+from magika import Magika
+from magika.types import ModelConfig
+
+from .inference_server import RemoteMagika
+
+# When INFERENCE_SOCKET is set the ONNX session lives in a shared inference
+# server process (python -m example.inference_server) instead of every worker.
+inference_socket = os.getenv("INFERENCE_SOCKET", "")
+
+# "sync" warms the model up while the worker boots, "background" does it in a
+# thread so the worker starts serving immediately, "off" loads it on first use.
+warmup_mode = os.getenv("MAGIKA_WARMUP", "sync")
+
+# onnxruntime session tuning; 0 threads means onnxruntime's default (one per core).
+intra_op_threads = int(os.getenv("ORT_INTRA_OP_THREADS", 0))
+inter_op_threads = int(os.getenv("ORT_INTER_OP_THREADS", 0))
+graph_optimization = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+execution_mode = os.getenv("ORT_EXECUTION_MODE", "sequential")
+optimized_model_dir = os.getenv("ORT_OPTIMIZED_MODEL_DIR", "")
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": rt.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": rt.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": rt.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": rt.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": rt.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": rt.ExecutionMode.ORT_PARALLEL,
+}
+
+# Private Magika methods the detection paths call or override. Magika is pinned to
+# the range they were tested with (pyproject.toml); a release outside it that drops
+# one fails here, at import, rather than on the first detection.
+MAGIKA_PRIVATE_API = (
+    "_get_default_model_name",
+    "_load_model_config",
+    "_init_onnx_session",
+    "_get_result_or_features_from_seekable",
+    "_get_results_from_features",
+    "_get_result_from_labels_and_score",
+)
+
+
+def check_magika_api(cls: type = Magika) -> None:
+    missing = [name for name in MAGIKA_PRIVATE_API if not callable(getattr(cls, name, None))]
+    if missing:
+        raise ImportError(
+            f"magika {magika.__version__} does not provide {', '.join(missing)}; "
+            "this project needs magika>=1.0.3,<1.1"
+        )
+
+
+check_magika_api()
+
+model_dir = Path(magika.__file__).parent / "models" / Magika._get_default_model_name()
+
+model_version = f"{magika.__version__}:{model_dir.name}"
+
+WARMUP_CONTENT = b"<!DOCTYPE html><html><head><title>warm up</title></head><body></body></html>\n" * 16
+
+_lock = threading.Lock()
+_magika: Magika | None = None
+_warm = threading.Event()
+timings: dict[str, float] = {}
+
+
+@cache
+def model_config() -> ModelConfig:
+    return Magika._load_model_config(model_dir / "config.min.json")
+
+
+def session_options(
+    intra_op: int = intra_op_threads,
+    inter_op: int = inter_op_threads,
+    optimization: str = graph_optimization,
+    mode: str = execution_mode,
+) -> rt.SessionOptions:
+    options = rt.SessionOptions()
+    options.intra_op_num_threads = intra_op
+    options.inter_op_num_threads = inter_op
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[optimization]
+    options.execution_mode = EXECUTION_MODES[mode]
+    return options
+
+
+class TunedMagika(Magika):
+    """``Magika`` whose onnxruntime session is built from explicit ``SessionOptions``.
+
+    When ``optimized_model_path`` is given, the optimized graph is written there on
+    the first load and later instances load it with graph optimization disabled.
+    """
+
+    def __init__(self, options: rt.SessionOptions, optimized_model_path: Path | None = None, **kwargs):
+        self._session_options = options
+        self._optimized_model_path = optimized_model_path
+        super().__init__(**kwargs)
+
+    def _init_onnx_session(self) -> rt.InferenceSession:
+        start_time = time.time()
+        rt.disable_telemetry_events()
+        options = self._session_options
+        model_path = self._model_path
+        saved_model_path = None
+        if self._optimized_model_path is not None:
+            if self._optimized_model_path.is_file():
+                model_path = self._optimized_model_path
+                options.graph_optimization_level = rt.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                # Several workers may start at once: each writes its own file and the
+                # last rename wins, so no process ever loads a partially written model.
+                self._optimized_model_path.parent.mkdir(parents=True, exist_ok=True)
+                saved_model_path = self._optimized_model_path.with_suffix(f".{os.getpid()}.tmp")
+                options.optimized_model_filepath = str(saved_model_path)
+        onnx_session = rt.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        if saved_model_path is not None:
+            os.replace(saved_model_path, self._optimized_model_path)
+        self._log.debug(f'ONNX DL model "{model_path}" loaded in {1000 * (time.time() - start_time):.03f} ms')
+        return onnx_session
+
+
+def optimized_model_path() -> Path | None:
+    # The optimized graph depends on the model, the onnxruntime version and the
+    # optimization level (and, for "all", on the host's CPU).
+    if not optimized_model_dir:
+        return None
+    return Path(optimized_model_dir) / f"{model_dir.name}-ort{rt.__version__}-{graph_optimization}.onnx"
+
+
+def build_local_magika(options: rt.SessionOptions | None = None) -> Magika:
+    """Build a Magika instance that owns a tuned onnxruntime session."""
+    return TunedMagika(options or session_options(), optimized_model_path(), model_dir=model_dir)
+
+
+def build_magika() -> Magika:
+    if inference_socket:
+        return RemoteMagika(inference_socket, model_dir=model_dir)
+    return build_local_magika()
+
+
+def get_magika(build: Callable[[], Magika] | None = None) -> Magika:
+    """Return the shared Magika instance, loading it with ``build`` (default ``build_magika``) on first use."""
+    global _magika
+    if _magika is None:
+        with _lock:
+            if _magika is None:
+                start = time.perf_counter()
+                _magika = (build or build_magika)()
+                timings["load_seconds"] = time.perf_counter() - start
+    return _magika
+
+
+def is_loaded() -> bool:
+    return _magika is not None
+
+
+def is_warm() -> bool:
+    return _warm.is_set()
+
+
+def is_ready() -> bool:
+    """Whether the worker can serve detections at full speed."""
+    if warmup_mode == "off":
+        return is_loaded()
+    return is_warm()
+
+
+def warm_up() -> None:
+    """Load the model and run one dummy inference through it."""
+    if _warm.is_set():
+        return
+    magika_model = get_magika()
+    start = time.perf_counter()
+    magika_model.identify_bytes(WARMUP_CONTENT)
+    timings["warmup_seconds"] = time.perf_counter() - start
+    _warm.set()
+
+
+def warm_up_on_boot() -> None:
+    """Warm the model up at worker boot according to ``MAGIKA_WARMUP``."""
+    if warmup_mode == "sync":
+        warm_up()
+    elif warmup_mode == "background":
+        threading.Thread(target=warm_up, name="magika-warmup", daemon=True).start()
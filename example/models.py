@@ -0,0 +1,65 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+
+class DetectionRecord(models.Model):
+    """A stored detection, keyed by the digest of the windows it was computed from.
+
+    ``content_hash`` is ``cache.window_digest`` of the input, so the same bytes give
+    the same hash whatever endpoint they were uploaded through.
+    """
+
+    content_hash = models.CharField(max_length=32)
+    size = models.BigIntegerField()
+    label = models.CharField(max_length=64)
+    mime_type = models.CharField(max_length=128)
+    group = models.CharField(max_length=32)
+    score = models.FloatField()
+    model_version = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # also the index used by lookups by hash
+            models.UniqueConstraint(fields=["content_hash", "model_version"], name="detection_hash_version"),
+        ]
+        indexes = [models.Index(fields=["label"], name="detection_label")]
+
+    def __str__(self):
+        return f"{self.content_hash} {self.label}"
+
+
+class DetectionJob(models.Model):
+    """A queued detection of uploaded files or server paths, run by ``manage.py jobworker``."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED)
+    priority = models.IntegerField(default=0)
+    # [{"name": ..., "path": ...}]; uploads point into the job's spool directory
+    items = models.JSONField()
+    results = models.JSONField(null=True)
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True)
+    heartbeat_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "-priority", "created_at"], name="job_queue")]
+
+    def __str__(self):
+        return f"{self.id} {self.status}"
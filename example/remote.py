@@ -0,0 +1,198 @@
+"""
+Head and tail windows of remote objects, fetched with HTTP range requests.
+
+``RangeReader`` asks for the first ``window_size`` bytes of a URL with a
+``Range`` header, learns the object size from ``Content-Range`` and then asks for
+the last ``window_size`` bytes, so detection transfers at most two windows per
+object whatever its size. Servers that ignore ``Range`` and answer ``200`` are
+read to the end through ``read_stream_windows``, up to ``max_stream_size`` bytes.
+
+Works with any HTTP(S) server that implements range requests, including
+S3-compatible object stores through presigned or public URLs. Connections are
+kept alive in a per-host pool and URLs are fetched concurrently by a thread pool.
+"""
+
+import http.client
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .windows import ByteWindows, StreamTooLarge, read_stream_windows
+
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class RemoteError(Exception):
+    """Raised when the windows of a remote object cannot be fetched."""
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, at most ``max_idle`` idle ones per host."""
+
+    def __init__(self, timeout: float = 10, max_idle: int = 16):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle: dict[tuple[str, str, int | None], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _new(self, scheme: str, host: str, port: int | None) -> http.client.HTTPConnection:
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    @contextmanager
+    def connection(self, scheme: str, host: str, port: int | None):
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            connection = idle.pop() if idle else None
+        reused = connection is not None
+        if connection is None:
+            connection = self._new(scheme, host, port)
+        try:
+            yield connection, reused
+        except BaseException:
+            connection.close()
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if connection.sock is not None and len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            connections = [connection for idle in self._idle.values() for connection in idle]
+            self._idle.clear()
+        for connection in connections:
+            connection.close()
+
+
+def parse_content_range(value: str | None) -> tuple[int | None, int | None]:
+    """Return the first byte and the total size from a ``Content-Range`` header."""
+    match = CONTENT_RANGE.fullmatch(value or "")
+    if match is None:
+        raise RemoteError(f"invalid Content-Range {value!r}")
+    first, _, total = match.groups()
+    return (int(first) if first is not None else None), (int(total) if total != "*" else None)
+
+
+class RangeReader:
+    """Fetch the head and tail windows of URLs with pooled, concurrent range requests."""
+
+    def __init__(
+        self,
+        window_size: int,
+        max_stream_size: int,
+        max_workers: int = 16,
+        timeout: float = 10,
+        allowed_hosts: set[str] | None = None,
+    ):
+        self.window_size = window_size
+        self.max_stream_size = max_stream_size
+        self.allowed_hosts = allowed_hosts
+        self.pool = ConnectionPool(timeout, max_idle=max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="magika-range")
+
+    def check_url(self, url: str):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise RemoteError("only http and https URLs are supported")
+        if self.allowed_hosts is not None and "*" not in self.allowed_hosts and parts.hostname not in self.allowed_hosts:
+            raise RemoteError(f"host {parts.hostname!r} is not allowed")
+        return parts
+
+    def _get(self, parts, byte_range: str, read):
+        """GET ``byte_range`` of the object and pass the response to ``read``.
+
+        A request on a reused keep-alive connection that the server has closed in
+        the meantime is retried once on a new connection.
+        """
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        for attempt in range(2):
+            with self.pool.connection(parts.scheme, parts.hostname, parts.port) as (connection, reused):
+                try:
+                    connection.request("GET", target, headers={"Range": f"bytes={byte_range}"})
+                    response = connection.getresponse()
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    if reused and attempt == 0:
+                        connection.close()
+                        continue
+                    raise
+                try:
+                    return read(response)
+                finally:
+                    if not response.isclosed():
+                        # at most a window is read, even from a server that sends more than the
+                        # range asked for; the rest of the response is not worth draining
+                        connection.close()
+
+    def fetch(self, url: str) -> tuple[ByteWindows, int]:
+        """Return the windows of ``url`` and the number of body bytes transferred."""
+        parts = self.check_url(url)
+        try:
+            head, total, streamed = self._get(parts, f"0-{self.window_size - 1}", self._read_head)
+            if streamed is not None:
+                return streamed, streamed.size
+            if total is None and len(head) < self.window_size:
+                total = len(head)
+            if total is not None and total <= self.window_size:
+                return ByteWindows(head, head, total), len(head)
+            # an unknown total is learnt from the Content-Range of a suffix range
+            byte_range = f"{total - self.window_size}-{total - 1}" if total is not None else f"-{self.window_size}"
+            tail, tail_total = self._get(parts, byte_range, self._read_tail)
+        except (OSError, http.client.HTTPException) as exc:
+            raise RemoteError(f"{type(exc).__name__}: {exc}") from exc
+        total = total if total is not None else tail_total
+        if total is None or len(tail) != self.window_size:
+            raise RemoteError("could not read the end of the object")
+        return ByteWindows(head, tail, total), len(head) + len(tail)
+
+    def _read_head(self, response) -> tuple[bytes, int | None, ByteWindows | None]:
+        if response.status == 200:
+            # the server ignored the Range header and sends the whole object
+            try:
+                return b"", None, read_stream_windows(response, self.window_size, self.max_stream_size)
+            except StreamTooLarge:
+                raise RemoteError(
+                    f"server does not support range requests and the object exceeds {self.max_stream_size} bytes"
+                )
+        if response.status == 416:
+            response.read(self.window_size)
+            _, total = parse_content_range(response.getheader("Content-Range"))
+            if total == 0:
+                return b"", 0, None
+            raise RemoteError("range not satisfiable")
+        if response.status != 206:
+            response.read(self.window_size)
+            raise RemoteError(f"unexpected status {response.status}")
+        head = response.read(self.window_size)
+        _, total = parse_content_range(response.getheader("Content-Range"))
+        return head, total, None
+
+    def _read_tail(self, response) -> tuple[bytes, int | None]:
+        body = response.read(self.window_size)
+        if response.status != 206:
+            raise RemoteError(f"unexpected status {response.status} for the tail range")
+        _, total = parse_content_range(response.getheader("Content-Range"))
+        return body, total
+
+    def fetch_many(self, urls: list[str]) -> list[tuple[ByteWindows, int] | RemoteError]:
+        """Fetch every URL concurrently; failures are returned in place of the windows."""
+
+        def fetch(url):
+            try:
+                return self.fetch(url)
+            except RemoteError as exc:
+                return exc
+
+        return list(self._executor.map(fetch, urls))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
@@ -0,0 +1,29 @@
+"""
+JSON renderer for the Ninja API backed by orjson.
+
+orjson serializes the response dicts several times faster than the standard
+library encoder and returns bytes, which Django sends as-is. Types orjson does not
+know fall back to Ninja's encoder. ``dumps`` is the same encoder for responses
+that are not rendered by Ninja, such as streamed ones.
+"""
+
+from typing import Any
+
+import orjson
+from django.http import HttpRequest
+from ninja.renderers import JSONRenderer
+from ninja.responses import NinjaJSONEncoder
+
+from .metrics import stage
+
+_fallback = NinjaJSONEncoder().default
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_fallback, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, request: HttpRequest, data: Any, *, response_status: int) -> Any:
+        with stage("render"):
+            return dumps(data)
@@ -0,0 +1,111 @@
+"""
+Response schemas of the detection endpoints.
+
+A detection is returned as typed fields instead of a formatted sentence. With
+``?compact=true`` the upload endpoints return only the integer ID of each output
+label; ``GET /api/labels`` maps the IDs back to labels for the running model.
+
+The models are plain pydantic models rather than ``ninja.Schema``: Ninja's schema
+validator wraps every item in a ``DjangoGetter`` for ORM access, which costs
+several times more per detection and is not needed for dicts.
+"""
+
+from datetime import datetime
+from uuid import UUID
+
+from magika import ContentTypeLabel, MagikaResult
+from pydantic import BaseModel
+
+# IDs are positions in Magika's label enum, which is fixed for a Magika release;
+# clients should refresh their copy of /api/labels when the model version changes.
+LABELS = [str(label) for label in ContentTypeLabel]
+LABEL_IDS = {label: index for index, label in enumerate(ContentTypeLabel)}
+
+
+class Detection(BaseModel):
+    label: str
+    mime_type: str
+    group: str
+    score: float
+    model_version: str
+    size: int
+
+
+class NamedDetection(Detection):
+    name: str
+
+
+class StoredDetection(Detection):
+    content_hash: str
+
+
+class CompactDetection(BaseModel):
+    label_id: int
+
+
+class DetectionError(BaseModel):
+    name: str
+    error: str
+
+
+class ArchiveMember(NamedDetection):
+    members: list["ArchiveMember | DetectionError"] | None = None
+    truncated: str | None = None
+    error: str | None = None
+
+
+class ArchiveDetection(Detection):
+    members: list[ArchiveMember | DetectionError] | None = None
+    truncated: str | None = None
+    error: str | None = None
+
+
+class UrlBatch(BaseModel):
+    urls: list[str]
+
+
+class PathBatch(BaseModel):
+    paths: list[str]
+
+
+class LookupBatch(BaseModel):
+    hashes: list[str]
+
+
+class PathJob(BaseModel):
+    paths: list[str]
+
+
+class JobStatus(BaseModel):
+    id: UUID
+    status: str
+    priority: int
+    total: int
+    completed: int
+    attempts: int
+    error: str
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+    results: list[NamedDetection | DetectionError] | None
+
+
+class LabelTable(BaseModel):
+    model_version: str
+    labels: list[str]
+
+
+def detection(result: MagikaResult, size: int, model_version: str) -> dict:
+    output = result.output
+    return {
+        "label": str(output.label),
+        "mime_type": output.mime_type,
+        "group": output.group,
+        "score": result.score,
+        "model_version": model_version,
+        "size": size,
+    }
+
+
+def label_id(result: MagikaResult) -> int:
+    return LABEL_IDS[result.output.label]
@@ -0,0 +1,81 @@
+"""
+Signature precheck: answer well-known binary formats from their leading bytes.
+
+A file that starts with the magic number of one of ``SIGNATURES`` is labelled
+without running the model. The table is compiled into a dict keyed on the first
+two bytes of each signature, so a lookup is one dict access and a
+``startswith`` or two, whatever the number of signatures.
+
+Only signatures whose label Magika agrees with on real files are listed (see
+``manage.py signatures``). Containers are left to the model because it tells
+their variants apart: zip (also docx, xlsx, jar, apk...), RIFF (wav, webp, avi),
+OLE2 (doc, xls, msi) and ``MZ`` executables.
+"""
+
+import threading
+
+from magika import ContentTypeLabel
+
+from .metrics import record_signature
+
+SIGNATURES: dict[bytes, ContentTypeLabel] = {
+    b"\x89PNG\r\n\x1a\n": ContentTypeLabel.PNG,
+    b"\xff\xd8\xff": ContentTypeLabel.JPEG,
+    b"GIF87a": ContentTypeLabel.GIF,
+    b"GIF89a": ContentTypeLabel.GIF,
+    b"%PDF-": ContentTypeLabel.PDF,
+    b"\x1f\x8b\x08": ContentTypeLabel.GZIP,
+    b"\x7fELF": ContentTypeLabel.ELF,
+    b"7z\xbc\xaf\x27\x1c": ContentTypeLabel.SEVENZIP,
+    b"\xfd7zXZ\x00": ContentTypeLabel.XZ,
+    b"Rar!\x1a\x07": ContentTypeLabel.RAR,
+    b"SQLite format 3\x00": ContentTypeLabel.SQLITE,
+    b"\x00asm": ContentTypeLabel.WASM,
+    b"OggS\x00": ContentTypeLabel.OGG,
+    b"fLaC": ContentTypeLabel.FLAC,
+}
+
+KEY_SIZE = 2
+
+
+class SignatureTable:
+    """Match leading bytes against ``signatures``, counting the hits per label."""
+
+    def __init__(self, signatures: dict[bytes, ContentTypeLabel], min_size: int = 0):
+        self.min_size = min_size
+        self._table: dict[bytes, list[tuple[bytes, ContentTypeLabel]]] = {}
+        for prefix, label in signatures.items():
+            if len(prefix) < KEY_SIZE:
+                raise ValueError(f"signature {prefix!r} is shorter than {KEY_SIZE} bytes")
+            self._table.setdefault(prefix[:KEY_SIZE], []).append((prefix, label))
+        for candidates in self._table.values():
+            # the most specific signature wins
+            candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+        self._checked = 0
+        self._hits: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def match(self, head: bytes, size: int) -> ContentTypeLabel | None:
+        """The label of the signature ``head`` starts with, if any; ``head`` is the start of a ``size``-byte file."""
+        label = None
+        if size >= self.min_size:
+            for prefix, candidate in self._table.get(bytes(head[:KEY_SIZE]), ()):
+                if head[: len(prefix)] == prefix:
+                    label = candidate
+                    break
+        with self._lock:
+            self._checked += 1
+            if label is not None:
+                self._hits[label] = self._hits.get(label, 0) + 1
+        record_signature(str(label) if label is not None else "miss")
+        return label
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = sum(self._hits.values())
+            return {
+                "checked": self._checked,
+                "hits": hits,
+                "hit_rate": hits / self._checked if self._checked else None,
+                "labels": {str(label): count for label, count in sorted(self._hits.items())},
+            }
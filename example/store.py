@@ -0,0 +1,107 @@
+"""
+Persistent store of detection results.
+
+Requests hand their results to a ``DetectionStore`` without touching the database:
+records are buffered in memory and a background thread writes them with one
+``bulk_create`` per batch, at most ``flush_interval`` seconds after they were
+added. When the buffer is full new records are dropped rather than slowing
+requests down. Lookups by hash also see records that have not been written yet.
+"""
+
+import logging
+import threading
+from typing import Any
+
+from django.db import DatabaseError, close_old_connections
+
+from .models import DetectionRecord
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("content_hash", "size", "label", "mime_type", "group", "score", "model_version")
+
+
+class DetectionStore:
+    """Buffer detection records and write them to the database in batches."""
+
+    def __init__(self, model_version: str, batch_size: int = 500, flush_interval: float = 1.0, max_pending: int = 10000):
+        self.model_version = model_version
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.written = 0
+        self.dropped = 0
+
+    def add(self, content_hash: str, detection: dict[str, Any]) -> None:
+        """Queue ``detection`` (the fields of ``schemas.Detection``) for writing."""
+        record = {field: detection[field] for field in FIELDS if field in detection}
+        record["content_hash"] = content_hash
+        with self._lock:
+            if content_hash not in self._pending and len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending[content_hash] = record
+            full = len(self._pending) >= self.batch_size
+        self._ensure_started()
+        if full:
+            self._wake.set()
+
+    def get(self, content_hash: str) -> dict[str, Any] | None:
+        """Return the stored detection of ``content_hash`` for the current model version."""
+        with self._lock:
+            record = self._pending.get(content_hash)
+        if record is not None:
+            return dict(record)
+        return (
+            DetectionRecord.objects.filter(content_hash=content_hash, model_version=self.model_version)
+            .values(*FIELDS)
+            .first()
+        )
+
+    def find(self, label: str, limit: int) -> list[dict[str, Any]]:
+        """Return the most recently stored detections with ``label``."""
+        records = DetectionRecord.objects.filter(label=label, model_version=self.model_version)
+        return list(records.order_by("-id").values(*FIELDS)[:limit])
+
+    def flush(self) -> int:
+        """Write the buffered records now; returns the number of records handed to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        records = [DetectionRecord(**record) for record in pending.values()]
+        try:
+            # a hash already stored by another worker is skipped by the unique constraint
+            DetectionRecord.objects.bulk_create(records, batch_size=self.batch_size, ignore_conflicts=True)
+        except DatabaseError:
+            logger.exception("Could not write %d detection records", len(records))
+            with self._lock:
+                self.dropped += len(records)
+            return 0
+        with self._lock:
+            self.written += len(records)
+        return len(records)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped}
+
+    def _ensure_started(self) -> None:
+        # started lazily, in the worker process, like the micro-batcher
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="magika-store", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            close_old_connections()
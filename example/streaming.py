@@ -0,0 +1,124 @@
+"""
+Streamed detection responses, written one result at a time.
+
+``multipart_windows`` parses a ``multipart/form-data`` body incrementally with
+Django's multipart ``Parser`` and yields the head and tail windows of each file as
+soon as its part has been read, so neither the uploads nor the list of results are
+ever held in memory. ``multipart_files`` yields the parts themselves, for callers
+that copy them elsewhere, without Django's limit on the number of files. ``streaming_response`` encodes results as NDJSON lines or
+Server-Sent Events and sends every chunk as soon as it is produced.
+
+Under ASGI Django would collect a synchronous iterator into a list before sending
+it, so there the iterator is advanced in a worker thread, one chunk per step, and
+handed to Django as an asynchronous iterator.
+"""
+
+import logging
+from collections.abc import AsyncIterator, Iterable, Iterator
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.http.multipartparser import FILE, ChunkIter, LazyStream, MultiPartParserError, Parser, exhaust
+from django.utils.encoding import force_str
+from django.utils.http import parse_header_parameters
+
+from .renderers import dumps
+from .windows import ByteWindows, read_stream_windows
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def multipart_files(request, field_name: str, chunk_size: int = 64 * 1024) -> Iterator[tuple[str, LazyStream]]:
+    """Yield the name and content stream of each file uploaded as ``field_name``, in body order.
+
+    Each stream must be read before the next file is requested. Other fields are
+    skipped. Raises ``MultiPartParserError`` right away, before anything is read, if
+    the body is not ``multipart/form-data``.
+    """
+    content_type, options = parse_header_parameters(request.META.get("CONTENT_TYPE", ""))
+    boundary = options.get("boundary")
+    if content_type != "multipart/form-data" or not boundary:
+        raise MultiPartParserError("Expected a multipart/form-data body with a boundary")
+    stream = LazyStream(ChunkIter(request, chunk_size))
+    return _parse_files(stream, boundary.encode("ascii"), field_name)
+
+
+def multipart_windows(
+    request, field_name: str, window_size: int, chunk_size: int = 64 * 1024
+) -> Iterator[tuple[str, ByteWindows]]:
+    """Yield the name and windows of each file uploaded as ``field_name``, in body order.
+
+    Raises ``MultiPartParserError`` like ``multipart_files``.
+    """
+    files = multipart_files(request, field_name, chunk_size)
+    return (
+        (name, read_stream_windows(field_stream, window_size, chunk_size=chunk_size)) for name, field_stream in files
+    )
+
+
+def _parse_files(stream: LazyStream, boundary: bytes, field_name: str) -> Iterator[tuple[str, LazyStream]]:
+    for item_type, meta_data, field_stream in Parser(stream, boundary):
+        try:
+            disposition = meta_data["content-disposition"][1]
+        except (KeyError, IndexError):
+            disposition = {}
+        if item_type != FILE or force_str(disposition.get("name", b""), errors="replace").strip() != field_name:
+            exhaust(field_stream)
+            continue
+        name = force_str(disposition.get("filename", b""), errors="replace")
+        # the same sanitizing as Django's upload handlers: no directories
+        name = name.rsplit("/", 1)[-1].rsplit("\\", 1)[-1]
+        yield name, field_stream
+    exhaust(stream)
+
+
+def ndjson_events(items: Iterable[Any]) -> Iterator[bytes]:
+    for item in items:
+        yield dumps(item) + b"\n"
+
+
+def sse_events(items: Iterable[Any]) -> Iterator[bytes]:
+    for index, item in enumerate(items):
+        yield b"id: %d\ndata: %s\n\n" % (index, dumps(item))
+
+
+def encode(items: Iterable[Any], format: str) -> Iterator[bytes]:
+    """Encode ``items`` in ``format``, ending with an error record if producing them fails.
+
+    The status line has already been sent when an item fails, so the error can only
+    be reported in the body: as a ``{"detail": ...}`` line, or an ``error`` event.
+    """
+    try:
+        yield from (sse_events(items) if format == "sse" else ndjson_events(items))
+    except Exception as exc:
+        logger.exception("Streamed detection failed")
+        detail = dumps({"detail": f"{type(exc).__name__}: {exc}"})
+        yield b"event: error\ndata: %s\n\n" % detail if format == "sse" else detail + b"\n"
+
+
+async def iterate_in_thread(iterator: Iterator[bytes]) -> AsyncIterator[bytes]:
+    step = sync_to_async(next, thread_sensitive=False)
+    try:
+        while (chunk := await step(iterator, None)) is not None:
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def streaming_response(request, items: Iterable[Any], format: str) -> StreamingHttpResponse:
+    """Stream ``items`` in ``format`` (``"ndjson"`` or ``"sse"``)."""
+    chunks = encode(items, format)
+    response = StreamingHttpResponse(
+        iterate_in_thread(chunks) if isinstance(request, ASGIRequest) else chunks,
+        content_type=CONTENT_TYPES[format],
+    )
+    response["Cache-Control"] = "no-cache"
+    # ask reverse proxies such as nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
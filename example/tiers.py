@@ -0,0 +1,144 @@
+"""
+Tiered detection: identify files from as few bytes as possible.
+
+Each file is first identified from a short prefix (the first tier), as if the file
+ended there. A confident answer is kept; otherwise the next, longer prefix is tried,
+and files still undecided after the last tier are identified from their real head
+and tail windows, exactly like ``UPLOAD_DETECTION=windows``. A file no longer than a
+tier is complete in that tier's prefix, so it is identified from its windows right
+away; such files are counted apart, not as probed or accepted by that tier.
+
+An answer counts as confident when its score is at least ``min_score`` and Magika
+did not overwrite the model's label for low confidence. The probes bypass the
+detection cache and store, which are keyed by the windows of whole files; the final
+tier goes through them as usual.
+"""
+
+import threading
+from collections.abc import Callable
+from typing import BinaryIO
+
+from magika import MagikaResult, OverwriteReason
+from magika.types import Seekable
+
+from .metrics import record_tier, record_whole_files
+from .windows import ByteWindows, read_windows
+
+FINAL_TIER = "windows"
+
+
+class FileSource:
+    """A file read on demand: a prefix for the probes, its windows for the final tier."""
+
+    def __init__(self, stream: BinaryIO, size: int, window_size: int, windows: ByteWindows | None = None):
+        self.stream = stream
+        self.size = size
+        self.window_size = window_size
+        self._windows = windows
+        # bytes read from ``stream``; windows captured while uploading come for free
+        self.bytes_read = 0
+
+    def read_head(self, size: int) -> bytes:
+        if self._windows is not None and size <= len(self._windows.head):
+            return self._windows.head[:size]
+        self.stream.seek(0)
+        head = self.stream.read(size)
+        self.bytes_read += len(head)
+        return head
+
+    def windows(self) -> ByteWindows:
+        if self._windows is None:
+            self._windows = read_windows(self.stream, self.window_size, self.size)
+            tail = self._windows.tail
+            self.bytes_read += len(self._windows.head) + (len(tail) if tail is not self._windows.head else 0)
+        return self._windows
+
+
+class TieredDetector:
+    """Identify ``FileSource`` objects through tiers of increasing prefix sizes."""
+
+    def __init__(
+        self,
+        probe: Callable[[list[Seekable]], list[MagikaResult]],
+        identify: Callable[[list[Seekable]], list[MagikaResult]],
+        sizes: list[int],
+        min_score: float,
+        window_size: int,
+    ):
+        self.probe = probe
+        self.identify = identify
+        self.sizes = sorted(set(sizes))
+        self.min_score = min_score
+        self.window_size = window_size
+        self.tiers = [str(size) for size in self.sizes] + [FINAL_TIER]
+        self._probed = dict.fromkeys(self.tiers, 0)
+        self._accepted = dict.fromkeys(self.tiers, 0)
+        self._whole_files = 0
+        self._bytes_read = 0
+        self._lock = threading.Lock()
+
+    def confident(self, result: MagikaResult) -> bool:
+        return result.score >= self.min_score and result.prediction.overwrite_reason == OverwriteReason.NONE
+
+    def detect(self, sources: list[FileSource]) -> list[MagikaResult]:
+        """Identify ``sources``, each with the first tier that answers confidently."""
+        results: list[MagikaResult | None] = [None] * len(sources)
+        pending = list(range(len(sources)))
+        for tier, size in zip(self.tiers, self.sizes):
+            if not pending:
+                break
+            complete = [index for index in pending if sources[index].size <= size]
+            partial = [index for index in pending if sources[index].size > size]
+            if complete:
+                windows = [sources[index].windows() for index in complete]
+                for index, result in zip(complete, self.identify(windows)):
+                    results[index] = result
+            pending = []
+            if partial:
+                probes = [ByteWindows.from_bytes(sources[index].read_head(size), self.window_size) for index in partial]
+                for index, result in zip(partial, self.probe(probes)):
+                    if self.confident(result):
+                        results[index] = result
+                    else:
+                        pending.append(index)
+            self._record(tier, len(partial), len(partial) - len(pending))
+            self._record_whole_files(len(complete))
+        if pending:
+            windows = [sources[index].windows() for index in pending]
+            for index, result in zip(pending, self.identify(windows)):
+                results[index] = result
+            self._record(FINAL_TIER, len(pending), len(pending))
+        with self._lock:
+            self._bytes_read += sum(source.bytes_read for source in sources)
+        return results
+
+    def _record(self, tier: str, probed: int, accepted: int) -> None:
+        with self._lock:
+            self._probed[tier] += probed
+            self._accepted[tier] += accepted
+        record_tier(tier, probed, accepted)
+
+    def _record_whole_files(self, count: int) -> None:
+        with self._lock:
+            self._whole_files += count
+        record_whole_files(count)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tiers = [
+                {
+                    "tier": tier,
+                    "probed": self._probed[tier],
+                    "accepted": self._accepted[tier],
+                    "hit_rate": self._accepted[tier] / self._probed[tier] if self._probed[tier] else None,
+                }
+                for tier in self.tiers
+            ]
+            files = sum(self._accepted.values()) + self._whole_files
+            return {
+                "min_score": self.min_score,
+                "tiers": tiers,
+                "whole_files": self._whole_files,
+                "files": files,
+                "bytes_read_per_file": self._bytes_read / files if files else None,
+            }
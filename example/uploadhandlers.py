@@ -0,0 +1,71 @@
+"""
+Upload handlers that capture Magika's head and tail windows while the multipart
+body streams in.
+
+``WindowCaptureUploadHandler`` keeps the first ``window_size`` bytes of every
+uploaded file and a bounded ring of its last ``window_size`` bytes. In the default
+mode it passes each chunk on to Django's regular handlers so the upload is still
+stored as usual; in detect-only mode it is the only handler, the payload is
+discarded as it arrives and memory per file stays at two windows.
+"""
+
+import io
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.datastructures import MultiValueDict
+
+from .windows import ByteWindows, WindowAccumulator
+
+
+class WindowedUploadedFile(UploadedFile):
+    """An upload whose payload was discarded; only its head window is readable."""
+
+    def __init__(self, windows: ByteWindows, name, content_type, charset, content_type_extra=None):
+        super().__init__(io.BytesIO(windows.head), name, content_type, windows.size, charset, content_type_extra)
+        self.windows = windows
+
+
+class WindowCaptureUploadHandler(FileUploadHandler):
+    """Record the head and tail windows of each uploaded file in ``request.upload_windows``."""
+
+    def __init__(self, request=None, window_size: int = 4096, detect_only: bool = False):
+        super().__init__(request)
+        self.window_size = window_size
+        self.detect_only = detect_only
+        if request is not None and not hasattr(request, "upload_windows"):
+            request.upload_windows = MultiValueDict()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.accumulator = WindowAccumulator(self.window_size)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.accumulator.feed(raw_data)
+        if self.detect_only:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        windows = self.accumulator.windows()
+        if self.request is not None:
+            self.request.upload_windows.appendlist(self.field_name, windows)
+        if self.detect_only:
+            return WindowedUploadedFile(
+                windows, self.file_name, self.content_type, self.charset, self.content_type_extra
+            )
+        return None
+
+
+def install_window_capture(request, mode: str, window_size: int) -> None:
+    """Install ``WindowCaptureUploadHandler`` on ``request`` according to ``mode``.
+
+    ``mode`` is ``"windows"`` to capture windows in front of Django's handlers,
+    ``"detect-only"`` to capture windows and discard the payload, or anything else
+    to leave the request's upload handlers untouched. Must be called before the
+    request body is parsed.
+    """
+    if mode == "windows":
+        request.upload_handlers.insert(0, WindowCaptureUploadHandler(request, window_size))
+    elif mode == "detect-only":
+        request.upload_handlers = [WindowCaptureUploadHandler(request, window_size, detect_only=True)]
@@ -0,0 +1,160 @@
+"""
+Head and tail byte windows of an input.
+
+Magika builds its features from at most ``block_size`` bytes at the beginning and
+at the end of a file, so those two windows plus the total size are all it needs.
+``ByteWindows`` exposes them through the same ``size``/``read_at`` interface as
+``magika.types.Seekable``, which lets any source that can produce the windows
+(an upload, a socket, a ranged HTTP read, ...) be identified with constant I/O.
+"""
+
+import io
+import mmap
+import os
+import stat
+from typing import BinaryIO
+
+
+class ByteWindows:
+    """The first and last ``len(head)``/``len(tail)`` bytes of a ``size`` byte input."""
+
+    __slots__ = ("head", "tail", "size")
+
+    def __init__(self, head: bytes, tail: bytes, size: int):
+        self.head = head
+        self.tail = tail
+        self.size = size
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        if size == 0:
+            return b""
+        if offset + size <= len(self.head):
+            return self.head[offset : offset + size]
+        tail_start = self.size - len(self.tail)
+        if offset >= tail_start and offset + size <= self.size:
+            return self.tail[offset - tail_start : offset - tail_start + size]
+        raise ValueError(f"Range {offset}:{offset + size} is outside of the head and tail windows")
+
+    @classmethod
+    def from_bytes(cls, content: bytes, window_size: int) -> "ByteWindows":
+        if len(content) <= window_size:
+            return cls(content, content, len(content))
+        return cls(content[:window_size], content[-window_size:], len(content))
+
+
+def read_windows(stream: BinaryIO, window_size: int, size: int | None = None) -> ByteWindows:
+    """Seek to both ends of ``stream`` and read only the head and tail windows.
+
+    ``size`` may be passed when it is already known (e.g. ``UploadedFile.size``) to
+    avoid an extra seek to the end of the stream.
+    """
+    if size is None:
+        size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    head = stream.read(min(window_size, size))
+    if size <= window_size:
+        return ByteWindows(head, head, size)
+    stream.seek(size - window_size)
+    tail = stream.read(window_size)
+    return ByteWindows(head, tail, size)
+
+
+class MappedWindows(ByteWindows):
+    """The windows of a local file, as views into a read-only memory mapping of it.
+
+    Nothing is read when the file is opened: the pages of the windows are faulted in
+    when Magika reads them, and ``read_at`` copies out only the bytes it asks for
+    (Magika strips them with ``bytes`` methods). ``head`` and ``tail`` are
+    memoryviews, valid until ``close``. A file truncated while it is mapped makes
+    reads past its new end fail with SIGBUS, so map only files that are not being
+    rewritten in place.
+    """
+
+    __slots__ = ("_map",)
+
+    def __init__(self, path: str, window_size: int):
+        # O_NONBLOCK keeps a FIFO from blocking the open; it is then refused as not a regular file
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            info = os.fstat(fd)
+            if not stat.S_ISREG(info.st_mode):
+                raise OSError(f"{path} is not a regular file")
+            # an empty file cannot be mapped
+            self._map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ) if info.st_size else None
+        finally:
+            os.close(fd)
+        if self._map is None:
+            super().__init__(b"", b"", 0)
+            return
+        if hasattr(mmap, "MADV_RANDOM"):
+            # only the windows are read, so read-ahead around them would be wasted I/O
+            self._map.madvise(mmap.MADV_RANDOM)
+        size = len(self._map)
+        with memoryview(self._map) as view:
+            head = view[:window_size]
+            tail = head if size <= window_size else view[size - window_size :]
+        super().__init__(head, tail, size)
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        return bytes(super().read_at(offset, size))
+
+    def close(self) -> None:
+        if self._map is None:
+            return
+        self.head.release()
+        self.tail.release()
+        self._map.close()
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StreamTooLarge(ValueError):
+    """Raised when a stream is longer than the allowed maximum."""
+
+
+class WindowAccumulator:
+    """Collect the head and tail windows of a stream that can only be read front to back.
+
+    Memory stays at two windows whatever the length of the stream.
+    """
+
+    __slots__ = ("window_size", "head", "tail", "size")
+
+    def __init__(self, window_size: int):
+        self.window_size = window_size
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.size = 0
+
+    def feed(self, data: bytes) -> None:
+        if len(self.head) < self.window_size:
+            self.head += data[: self.window_size - len(self.head)]
+        self.tail += data[-self.window_size :]
+        if len(self.tail) > self.window_size:
+            del self.tail[: len(self.tail) - self.window_size]
+        self.size += len(data)
+
+    def windows(self) -> ByteWindows:
+        head = bytes(self.head)
+        tail = head if self.size <= self.window_size else bytes(self.tail)
+        return ByteWindows(head, tail, self.size)
+
+
+def read_stream_windows(
+    stream: BinaryIO, window_size: int, max_size: int | None = None, chunk_size: int = 64 * 1024
+) -> ByteWindows:
+    """Read a non-seekable ``stream`` to its end, keeping only the head and tail windows.
+
+    Raises ``StreamTooLarge`` as soon as more than ``max_size`` bytes have been read.
+    """
+    accumulator = WindowAccumulator(window_size)
+    while data := stream.read(chunk_size):
+        accumulator.feed(data)
+        if max_size is not None and accumulator.size > max_size:
+            raise StreamTooLarge(f"stream is longer than {max_size} bytes")
+    return accumulator.windows()
@@ -0,0 +1,30 @@
+"""
+Payloads and helpers shared by the test modules.
+"""
+import gzip
+import io
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from example import api
+
+PDF = b"%PDF-1.7\n" + bytes(range(256)) * 64 + b"\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n"
+PYTHON = b"import os\nimport sys\n\n\ndef main():\n    print(os.getcwd(), sys.argv)\n\n\nif __name__ == '__main__':\n    main()\n" * 20
+HTML = b"<!DOCTYPE html><html><head><title>Test</title></head><body>" + b"<p>row</p>" * 200 + b"</body></html>"
+GZIP = gzip.compress(b"".join(b"line %d of a log file\n" % index for index in range(2000)), mtime=0)
+
+
+def named_file(content: bytes, name: str) -> io.BytesIO:
+    """An in-memory file the test client uploads as ``name``."""
+    upload = io.BytesIO(content)
+    upload.name = name
+    return upload
+
+
+def patch_api(testcase: SimpleTestCase, **values) -> None:
+    """Replace attributes of ``example.api`` (e.g. ``cache=None``) until ``testcase`` ends."""
+    for name, value in values.items():
+        patcher = mock.patch.object(api, name, value)
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
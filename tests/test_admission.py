@@ -0,0 +1,187 @@
+"""
+Tests for the rate limits and in-flight cap of the detection endpoints.
+"""
+import json
+import threading
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import Client, TestCase
+
+from example import api
+from example.admission import InFlightLimiter, RateLimiter, key_client, parse_client_rates
+from tests.helpers import PDF, named_file, patch_api
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def local_cache():
+    return LocMemCache("admission-test", {})
+
+
+class RateLimiterTestCase(TestCase):
+    """Test the token buckets."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = local_cache()
+        self.cache.clear()
+
+    def test_burst_then_rate(self):
+        """Test that a burst is admitted at once, then one request per interval."""
+        limiter = RateLimiter(self.cache, rate=2, burst=3, clock=self.clock)
+        self.assertEqual([limiter.acquire("a") for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(limiter.acquire("a"), 0.5)
+        # a rejected request takes no token
+        self.assertAlmostEqual(limiter.acquire("a"), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(limiter.acquire("a"), 0)
+        self.assertGreater(limiter.acquire("a"), 0)
+        # clients have their own buckets
+        self.assertEqual(limiter.acquire("b"), 0)
+
+    def test_refill(self):
+        """Test that an idle client gets its whole burst back, and no more."""
+        limiter = RateLimiter(self.cache, rate=10, burst=2, clock=self.clock)
+        for _ in range(2):
+            limiter.acquire("a")
+        self.clock.now += 60
+        self.assertEqual([limiter.acquire("a") == 0 for _ in range(3)], [True, True, False])
+
+    def test_client_limits(self):
+        """Test that listed clients use their own rate, and rate 0 means no limit."""
+        limits = parse_client_rates("key:secret=0, ip:10.0.0.5=1:2")
+        self.assertEqual(limits, {key_client("secret"): (0.0, 0.0), "ip:10.0.0.5": (1.0, 2.0)})
+        limiter = RateLimiter(self.cache, rate=100, burst=1, limits=limits, clock=self.clock)
+        self.assertTrue(all(limiter.acquire(key_client("secret")) == 0 for _ in range(50)))
+        self.assertEqual([limiter.acquire("ip:10.0.0.5") > 0 for _ in range(3)], [False, False, True])
+        self.assertFalse(RateLimiter(self.cache, rate=0, burst=1).enabled)
+
+    def test_concurrent(self):
+        """Test that concurrent requests never take more than the burst."""
+        limiter = RateLimiter(self.cache, rate=0.001, burst=20, clock=self.clock)
+        admitted = []
+
+        def take():
+            for _ in range(10):
+                admitted.append(limiter.acquire("a") == 0)
+
+        threads = [threading.Thread(target=take) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(admitted), 20)
+
+
+class InFlightLimiterTestCase(TestCase):
+    def test_limit(self):
+        """Test that slots are refused at the limit and given back on release."""
+        limiter = InFlightLimiter(2)
+        self.assertEqual([limiter.acquire() for _ in range(3)], [True, True, False])
+        limiter.release()
+        self.assertTrue(limiter.acquire())
+        self.assertTrue(all(InFlightLimiter(0).acquire() for _ in range(100)))
+
+
+class AdmissionApiTestCase(TestCase):
+    """Test the 429 responses of the detection endpoints."""
+
+    def setUp(self):
+        self.client = Client()
+        cache = local_cache()
+        cache.clear()
+        patch_api(
+            self,
+            rate_limiter=RateLimiter(cache, 1, 2, parse_client_rates("key:gold=1000:1000")),
+            in_flight=InFlightLimiter(0),
+        )
+
+    def upload(self, path="/api/upload", **headers):
+        upload = named_file(PDF, "a.pdf")
+        return self.client.post(path, {"file": upload}, headers=headers)
+
+    def test_rate_limited(self):
+        """Test that requests over the rate get a 429 with Retry-After, before the body is parsed."""
+        self.assertEqual([self.upload().status_code for _ in range(2)], [200, 200])
+        with mock.patch.object(api, "install_window_capture") as install:
+            response = self.upload()
+        install.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertIn("Rate limit", json.loads(response.content)["detail"])
+        # the limit is per client, and is shared by the endpoints
+        self.assertEqual(self.client.post("/api/upload", REMOTE_ADDR="10.0.0.9").status_code, 422)
+        self.assertEqual(self.client.post("/api/upload/raw", PDF, content_type="application/pdf").status_code, 429)
+
+    def test_spoofed_forwarded_for(self):
+        """Test that X-Forwarded-For only names the client behind ADMISSION_NUM_PROXIES trusted proxies."""
+        statuses = [self.upload(**{"X-Forwarded-For": f"10.1.0.{i}"}).status_code for i in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+        with mock.patch.object(api, "admission_num_proxies", 1):
+            # the proxy appends the address it saw, after whatever the client sent
+            self.assertEqual(self.upload(**{"X-Forwarded-For": "1.2.3.4, 10.2.0.1"}).status_code, 200)
+            self.assertEqual(self.upload(**{"X-Forwarded-For": "5.6.7.8, 10.2.0.1"}).status_code, 200)
+            self.assertEqual(self.upload(**{"X-Forwarded-For": "9.9.9.9, 10.2.0.1"}).status_code, 429)
+            self.assertEqual(self.upload(**{"X-Forwarded-For": "10.2.0.2"}).status_code, 200)
+
+    def test_api_key(self):
+        """Test that listed API keys have their own limits and unknown keys count as the address."""
+        for _ in range(5):
+            self.assertEqual(self.upload(**{"X-API-Key": "gold"}).status_code, 200)
+        self.assertEqual([self.upload(**{"X-API-Key": str(i)}).status_code for i in range(3)], [200, 200, 429])
+
+    def test_in_flight(self):
+        """Test that requests beyond ADMISSION_MAX_IN_FLIGHT are rejected and slots are released."""
+        with mock.patch.object(api, "in_flight", InFlightLimiter(1)):
+            api.in_flight.acquire()
+            self.assertEqual(self.upload().status_code, 429)
+            api.in_flight.release()
+            self.assertEqual(self.upload().status_code, 200)
+            self.assertEqual(api.in_flight.count, 0)
+
+    def test_async_slot_is_held(self):
+        """Test that async endpoints hold their slot while the view runs."""
+        counts = []
+
+        def detect(*args):
+            counts.append(api.in_flight.count)
+            return {"label_id": 0}
+
+        with (
+            mock.patch.object(api, "in_flight", InFlightLimiter(1)),
+            mock.patch.object(api, "detect_upload", side_effect=detect),
+            mock.patch.object(api, "detect_upload_batch", side_effect=lambda *args: [detect()["label_id"]]),
+        ):
+            self.assertEqual(self.upload("/api/async/upload?compact=true").status_code, 200)
+            upload = named_file(PDF, "a.pdf")
+            self.assertEqual(self.client.post("/api/async/upload/batch?compact=true", {"files": upload}).status_code, 200)
+            self.assertEqual(api.in_flight.count, 0)
+        self.assertEqual(counts, [1, 1])
+
+    def test_async_rate_limited(self):
+        """Test that async endpoints answer 429 over the rate."""
+        self.assertEqual([self.upload("/api/async/upload").status_code for _ in range(3)], [200, 200, 429])
+        upload = named_file(PDF, "a.pdf")
+        response = self.client.post("/api/async/upload/batch", {"files": upload})
+        self.assertEqual((response.status_code, response["Retry-After"]), (429, "1"))
+
+    def test_async_and_streamed(self):
+        """Test that async and streamed endpoints hold their slot until they are done."""
+        with mock.patch.object(api, "in_flight", InFlightLimiter(1)):
+            self.assertEqual(self.upload("/api/async/upload").status_code, 200)
+            self.assertEqual(api.in_flight.count, 0)
+
+            upload = named_file(PDF, "a.pdf")
+            response = self.client.post("/api/upload/stream", {"files": upload})
+            self.assertEqual(api.in_flight.count, 1)
+            self.assertEqual(json.loads(b"".join(response.streaming_content))["label"], "pdf")
+            response.close()
+            self.assertEqual(api.in_flight.count, 0)
@@ -58,16 +58,16 @@ class APITestCase(TestCase):
         response_data = json.loads(response.content.decode())
         
         # Check response structure
-        self.assertIn('Detected File Type', response_data)
-        self.assertIn('Size', response_data)
+        self.assertIn('label', response_data)
+        self.assertIn('size', response_data)
         
         # Check that size is correct
-        self.assertEqual(response_data['Size'], len(test_content))
+        self.assertEqual(response_data['size'], len(test_content))
         
         # Check that file type is detected (should be text-related)
-        detected_type = response_data['Detected File Type']
+        detected_type = response_data['label']
         self.assertIsInstance(detected_type, str)
-        self.assertNotEqual(detected_type, 'Unknown')
+        self.assertEqual(response_data['group'], 'text')
 
     def test_upload_endpoint_with_empty_file(self):
         """Test upload endpoint with an empty file."""
@@ -80,9 +80,8 @@ class APITestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         
         response_data = json.loads(response.content.decode())
-        self.assertIn('Detected File Type', response_data)
-        self.assertIn('Size', response_data)
-        self.assertEqual(response_data['Size'], 0)
+        self.assertEqual(response_data['label'], 'empty')
+        self.assertEqual(response_data['size'], 0)
 
     def test_upload_endpoint_with_json_file(self):
         """Test upload endpoint with a JSON file."""
@@ -95,9 +94,9 @@ class APITestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         
         response_data = json.loads(response.content.decode())
-        self.assertIn('Detected File Type', response_data)
-        self.assertIn('Size', response_data)
-        self.assertEqual(response_data['Size'], len(test_content))
+        self.assertIn('label', response_data)
+        self.assertIn('size', response_data)
+        self.assertEqual(response_data['size'], len(test_content))
 
     def test_upload_endpoint_with_html_file(self):
         """Test upload endpoint with an HTML file."""
@@ -110,9 +109,9 @@ class APITestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         
         response_data = json.loads(response.content.decode())
-        self.assertIn('Detected File Type', response_data)
-        self.assertIn('Size', response_data)
-        self.assertEqual(response_data['Size'], len(test_content))
+        self.assertIn('label', response_data)
+        self.assertIn('size', response_data)
+        self.assertEqual(response_data['size'], len(test_content))
 
     def test_upload_endpoint_methods(self):
         """Test that upload endpoint only accepts POST requests."""
@@ -163,9 +162,149 @@ class APITestCase(TestCase):
             self.fail("Response is not valid JSON")
         
         # Check required fields
-        self.assertIn('Detected File Type', response_data)
-        self.assertIn('Size', response_data)
+        self.assertEqual(set(response_data), {'label', 'mime_type', 'group', 'score', 'model_version', 'size'})
         
         # Check field types
-        self.assertIsInstance(response_data['Detected File Type'], str)
-        self.assertIsInstance(response_data['Size'], int)
\ No newline at end of file
+        self.assertIsInstance(response_data['label'], str)
+        self.assertIsInstance(response_data['mime_type'], str)
+        self.assertIsInstance(response_data['score'], float)
+        self.assertIsInstance(response_data['size'], int)
+
+class BatchUploadAPITestCase(TestCase):
+    """Test the batch upload endpoint."""
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = Client()
+
+    def _make_file(self, content, name):
+        test_file = io.BytesIO(content)
+        test_file.name = name
+        return test_file
+
+    def test_batch_upload_returns_results_in_order(self):
+        """Test that every uploaded file gets a result, in upload order."""
+        contents = [
+            (b'<!DOCTYPE html><html><head><title>Test</title></head><body><p>Hello World</p></body></html>', 'a.html'),
+            (b"", 'empty.txt'),
+            (b'{"test": "data", "number": 42, "nested": {"list": [1, 2, 3]}}', 'b.json'),
+            (b"abc", 'tiny.txt'),
+        ]
+        files = [self._make_file(content, name) for content, name in contents]
+
+        response = self.client.post('/api/upload/batch', {'files': files})
+
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content.decode())
+        self.assertEqual(len(response_data), len(contents))
+        for item, (content, name) in zip(response_data, contents):
+            self.assertEqual(item['name'], name)
+            self.assertEqual(item['size'], len(content))
+        self.assertEqual(response_data[0]['label'], 'html')
+        self.assertEqual(response_data[1]['label'], 'empty')
+
+    def test_batch_upload_matches_single_detection(self):
+        """Test that batched inference agrees with per-file identification."""
+        from example.api import m
+
+        contents = [
+            b'#!/usr/bin/env python\ndef hello():\n    print("Hello, World!")\n\nhello()\n',
+            b'name,age,city\nJohn,30,New York\nJane,25,Los Angeles\nBob,41,Chicago\n',
+        ]
+        files = [self._make_file(content, f'file{i}') for i, content in enumerate(contents)]
+
+        response = self.client.post('/api/upload/batch', {'files': files})
+
+        self.assertEqual(response.status_code, 200)
+        detected = json.loads(response.content.decode())
+        expected = [m.identify_bytes(content) for content in contents]
+        self.assertEqual([item['label'] for item in detected], [str(result.output.label) for result in expected])
+        for item, result in zip(detected, expected):
+            self.assertAlmostEqual(item['score'], result.score, places=4)
+
+    def test_batch_upload_no_files(self):
+        """Test batch upload endpoint without providing files."""
+        response = self.client.post('/api/upload/batch')
+        self.assertIn(response.status_code, [400, 422])
+
+    def test_batch_upload_rejects_oversized_batch(self):
+        """Test that batches above the configured maximum are rejected."""
+        from unittest import mock
+
+        files = [self._make_file(b"hello", f'{i}.txt') for i in range(3)]
+        with mock.patch('example.api.max_batch_size', 2):
+            response = self.client.post('/api/upload/batch', {'files': files})
+        self.assertEqual(response.status_code, 413)
+
+    def test_batch_upload_above_django_file_limit(self):
+        """Test that batches of more than Django's default 100 files are accepted up to MAX_BATCH_SIZE."""
+        files = [self._make_file(b"hello world\n", f'{i}.txt') for i in range(101)]
+
+        response = self.client.post('/api/upload/batch', {'files': files})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content.decode())), 101)
+
+    def test_batch_upload_above_data_upload_max_number_files(self):
+        """Test that Django's file count limit answers with the API's 413, not an HTML 400."""
+        from django.test import override_settings
+
+        files = [self._make_file(b"hello", f'{i}.txt') for i in range(3)]
+        with override_settings(DATA_UPLOAD_MAX_NUMBER_FILES=2):
+            response = self.client.post('/api/upload/batch', {'files': files})
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("At most 2 files", json.loads(response.content)["detail"])
+
+
+class DetectionSchemaTestCase(TestCase):
+    """Test the typed detection response, compact mode and label table."""
+
+    html_content = b'<!DOCTYPE html><html><head><title>Test</title></head><body><p>Hello World</p></body></html>'
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = Client()
+
+    def _make_file(self, content, name):
+        test_file = io.BytesIO(content)
+        test_file.name = name
+        return test_file
+
+    def test_upload_returns_typed_fields(self):
+        """Test that the upload response carries the detection as separate fields."""
+        from example.model import model_version
+
+        response = self.client.post('/api/upload', {'file': self._make_file(self.html_content, 'a.html')})
+
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content)
+        self.assertEqual(response_data['label'], 'html')
+        self.assertEqual(response_data['mime_type'], 'text/html')
+        self.assertEqual(response_data['group'], 'code')
+        self.assertGreater(response_data['score'], 0.5)
+        self.assertEqual(response_data['model_version'], model_version)
+
+    def test_compact_upload_returns_label_ids(self):
+        """Test that compact mode returns label IDs that resolve through /api/labels."""
+        labels = json.loads(self.client.get('/api/labels').content)['labels']
+
+        response = self.client.post('/api/upload?compact=true', {'file': self._make_file(self.html_content, 'a.html')})
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content)
+        self.assertEqual(set(response_data), {'label_id'})
+        self.assertEqual(labels[response_data['label_id']], 'html')
+
+        files = [self._make_file(self.html_content, 'a.html'), self._make_file(b"", 'empty.txt')]
+        response = self.client.post('/api/upload/batch?compact=true', {'files': files})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([labels[label_id] for label_id in json.loads(response.content)], ['html', 'empty'])
+
+    def test_labels_endpoint(self):
+        """Test that the label table lists every Magika label with the model version."""
+        from magika import ContentTypeLabel
+        from example.model import model_version
+
+        response_data = json.loads(self.client.get('/api/labels').content)
+
+        self.assertEqual(response_data['model_version'], model_version)
+        self.assertEqual(response_data['labels'], [str(label) for label in ContentTypeLabel])
@@ -0,0 +1,214 @@
+"""
+Tests for recursive detection of archive members.
+"""
+import gzip
+import io
+import json
+import tarfile
+import zipfile
+from unittest import mock
+
+from django.test import Client, SimpleTestCase, TestCase
+
+from example import api
+from example.archives import ArchiveInspector, Budget, LimitExceeded, MeteredStream
+from tests.helpers import PDF, PYTHON, named_file
+
+
+def make_zip(members: dict[str, bytes], compression=zipfile.ZIP_DEFLATED) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def make_tar(members: dict[str, bytes], mode="w") -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def labels(node) -> dict:
+    """Map member names to their label, or to the labels of their own members."""
+    return {
+        member["name"]: labels(member) if "members" in member else member.get("label", member.get("error"))
+        for member in node["members"]
+    }
+
+
+class MeteredStreamTestCase(SimpleTestCase):
+    """Test the decompression budget."""
+
+    def test_reads_and_seeks_are_charged(self):
+        budget = Budget(10, 100)
+        stream = MeteredStream(io.BytesIO(bytes(200)), budget, size=200)
+        stream.read(10)
+        stream.seek(50)
+        self.assertEqual(budget.bytes, 50)
+        stream.seek(20)
+        self.assertEqual(budget.bytes, 70)
+        with self.assertRaises(LimitExceeded):
+            stream.read()
+
+    def test_member_count(self):
+        budget = Budget(1, 100)
+        budget.count_member()
+        with self.assertRaisesRegex(LimitExceeded, "max_members"):
+            budget.count_member()
+
+
+class ArchiveInspectorTestCase(SimpleTestCase):
+    """Test ArchiveInspector on archives built in memory."""
+
+    def inspect(self, content: bytes, name="upload", **limits):
+        options = {"max_depth": 5, "max_members": 1000, "max_bytes": 64 * 1024**2, **limits}
+        inspector = ArchiveInspector(
+            api.identify_seekables,
+            lambda result, size: api.detection(result, size, api.model_version),
+            api.window_size,
+            **options,
+        )
+        windows = api.ByteWindows.from_bytes(content, api.window_size)
+        node = api.detection(api.identify_seekable(windows), len(content), api.model_version)
+        return inspector.expand(node, io.BytesIO(content), name)
+
+    def test_zip(self):
+        """Test stored and deflated zip members, skipping directories."""
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            content = make_zip({"docs/": b"", "docs/a.pdf": PDF, "main.py": PYTHON, "empty": b""}, compression)
+            node = self.inspect(content)
+            self.assertEqual(node["label"], "zip")
+            self.assertEqual(labels(node), {"docs/a.pdf": "pdf", "main.py": "python", "empty": "empty"})
+            self.assertEqual(node["members"][0]["size"], len(PDF))
+
+    def test_large_member_windows(self):
+        """Test that a member larger than two windows is identified from its head and tail."""
+        content = PDF.replace(b"\ntrailer", b"\nstream\n" + bytes(range(256)) * 16384 + b"\nendstream\ntrailer")
+        node = self.inspect(make_zip({"big.pdf": content}))
+        self.assertEqual(node["members"][0]["label"], "pdf")
+
+    def test_tar_and_gzip(self):
+        """Test a plain tar, a gzip file and a gzipped tar."""
+        tar = make_tar({"a.pdf": PDF, "main.py": PYTHON})
+        self.assertEqual(labels(self.inspect(tar)), {"a.pdf": "pdf", "main.py": "python"})
+
+        node = self.inspect(gzip.compress(PDF), "a.pdf.gz")
+        self.assertEqual(node["label"], "gzip")
+        self.assertEqual(labels(node), {"a.pdf": "pdf"})
+
+        node = self.inspect(make_tar({"a.pdf": PDF, "main.py": PYTHON}, "w:gz"), "files.tgz")
+        self.assertEqual(labels(node), {"files.tar": {"a.pdf": "pdf", "main.py": "python"}})
+
+    def test_nested_archives(self):
+        """Test that archives inside archives are expanded."""
+        inner = make_zip({"a.pdf": PDF})
+        content = make_zip({"inner.zip": inner, "inner.tar": make_tar({"main.py": PYTHON}), "b.pdf": PDF})
+        node = self.inspect(content)
+        self.assertEqual(
+            labels(node), {"inner.zip": {"a.pdf": "pdf"}, "inner.tar": {"main.py": "python"}, "b.pdf": "pdf"}
+        )
+
+    def test_non_archive(self):
+        """Test that other files are returned unchanged."""
+        node = self.inspect(PDF)
+        self.assertEqual(node["label"], "pdf")
+        self.assertNotIn("members", node)
+
+    def test_depth_limit(self):
+        """Test that nesting deeper than max_depth is not expanded."""
+        content = make_zip({"a.pdf": PDF})
+        for _ in range(3):
+            content = make_zip({"nested.zip": content})
+        node = self.inspect(content, max_depth=2)
+        nested = node["members"][0]["members"][0]
+        self.assertEqual(nested["label"], "zip")
+        self.assertEqual(nested["truncated"], "max_depth")
+        self.assertNotIn("members", nested)
+
+    def test_member_limit(self):
+        """Test that members past max_members are dropped and the archive is truncated."""
+        node = self.inspect(make_zip({f"{index}.py": PYTHON for index in range(10)}), max_members=4)
+        self.assertEqual(node["truncated"], "max_members")
+        self.assertEqual(len(node["members"]), 4)
+        self.assertTrue(all(member["label"] == "python" for member in node["members"]))
+
+    def test_zip_bomb(self):
+        """Test that decompression stops at max_bytes."""
+        content = make_zip({"a.pdf": PDF, "zeros": bytes(64 * 1024**2)})
+        self.assertLess(len(content), 1024**2)
+        node = self.inspect(content, max_bytes=1024**2)
+        self.assertEqual(node["truncated"], "max_bytes")
+        self.assertEqual(labels(node), {"a.pdf": "pdf"})
+
+        node = self.inspect(gzip.compress(PDF + bytes(64 * 1024**2)), "zeros.gz", max_bytes=1024**2)
+        self.assertEqual(node["label"], "gzip")
+        self.assertEqual(node["truncated"], "max_bytes")
+        self.assertEqual(node["members"], [])
+
+    def test_corrupt_archive(self):
+        """Test that an unreadable archive is reported on its node."""
+        content = make_zip({"a.pdf": PDF, "main.py": PYTHON})
+        # without its end of central directory record the zip cannot be opened
+        node = self.inspect(content.replace(b"PK\x05\x06", b"\x00" * 4))
+        self.assertEqual(node["label"], "zip")
+        self.assertIn("could not read zip archive", node["error"])
+
+    def test_encrypted_member(self):
+        """Test that a member that cannot be read gets an error entry."""
+        content = bytearray(make_zip({"a.pdf": PDF, "secret": PYTHON}, zipfile.ZIP_STORED))
+        # set the encryption flag of the second member in its central directory entry
+        entry = content.rindex(b"PK\x01\x02")
+        content[entry + 8] |= 0x1
+        node = self.inspect(bytes(content))
+        self.assertEqual(node["members"][0]["label"], "pdf")
+        self.assertEqual(node["members"][1]["name"], "secret")
+        self.assertIn("could not read member", node["members"][1]["error"])
+
+
+class RecursiveUploadTestCase(TestCase):
+    """Test /api/upload?recursive=true."""
+
+    def setUp(self):
+        self.client = Client()
+
+    def _upload(self, content, name, query="?recursive=true"):
+        upload = named_file(content, name)
+        return self.client.post("/api/upload" + query, {"file": upload})
+
+    def test_recursive_upload(self):
+        """Test that the response includes the member tree."""
+        response = self._upload(make_zip({"a.pdf": PDF, "inner.zip": make_zip({"main.py": PYTHON})}), "files.zip")
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data["label"], "zip")
+        self.assertEqual(labels(data), {"a.pdf": "pdf", "inner.zip": {"main.py": "python"}})
+        self.assertEqual(set(data["members"][0]), {"label", "mime_type", "group", "score", "model_version", "size", "name"})
+
+    def test_non_recursive_upload_is_unchanged(self):
+        """Test that archives are not expanded without recursive=true."""
+        data = json.loads(self._upload(make_zip({"a.pdf": PDF}), "files.zip", "").content)
+        self.assertEqual(set(data), {"label", "mime_type", "group", "score", "model_version", "size"})
+
+    def test_limits_are_applied(self):
+        """Test that the configured limits bound the expansion."""
+        with mock.patch.object(api.archive_inspector, "max_members", 2):
+            data = json.loads(self._upload(make_zip({f"{index}.py": PYTHON for index in range(5)}), "a.zip").content)
+        self.assertEqual(data["truncated"], "max_members")
+        self.assertEqual(len(data["members"]), 2)
+
+    def test_compact_is_rejected(self):
+        """Test that compact and recursive cannot be combined."""
+        response = self._upload(make_zip({"a.pdf": PDF}), "files.zip", "?recursive=true&compact=true")
+        self.assertEqual(response.status_code, 400)
+
+    def test_async_recursive_upload(self):
+        """Test the async endpoint with recursive=true."""
+        upload = named_file(make_tar({"a.pdf": PDF}), "files.tar")
+        data = json.loads(self.client.post("/api/async/upload?recursive=true", {"file": upload}).content)
+        self.assertEqual(labels(data), {"a.pdf": "pdf"})
@@ -0,0 +1,134 @@
+"""
+Tests for the async (ASGI) upload endpoints and the bounded inference executor.
+"""
+import asyncio
+import io
+import json
+import threading
+from unittest import mock
+
+from django.test import AsyncClient, Client, TestCase
+
+from example import api
+from example.executors import BoundedExecutor, ExecutorSaturated
+
+
+class BoundedExecutorTestCase(TestCase):
+    """Test BoundedExecutor backpressure."""
+
+    def test_runs_function_in_pool(self):
+        """Test that the function runs outside the calling thread."""
+        executor = BoundedExecutor(max_workers=2, max_pending=0)
+        self.addCleanup(executor.shutdown)
+        caller = threading.get_ident()
+        self.assertNotEqual(asyncio.run(executor.run(threading.get_ident)), caller)
+
+    def test_rejects_calls_when_saturated(self):
+        """Test that calls beyond running plus queued slots fail fast."""
+        executor = BoundedExecutor(max_workers=1, max_pending=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+
+        async def scenario():
+            first = asyncio.ensure_future(executor.run(release.wait))
+            second = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(ExecutorSaturated):
+                await executor.run(release.wait)
+            release.set()
+            await asyncio.gather(first, second)
+            # slots are released once calls complete
+            self.assertTrue(await executor.run(release.wait))
+
+        asyncio.run(scenario())
+
+    def test_cancelled_call_keeps_its_slot(self):
+        """Test that cancelling the caller does not free the slot of a call still running."""
+        executor = BoundedExecutor(max_workers=1, max_pending=0)
+        self.addCleanup(executor.shutdown)
+        started, release = threading.Event(), threading.Event()
+
+        def work():
+            started.set()
+            return release.wait(5)
+
+        async def scenario():
+            running = asyncio.ensure_future(executor.run(work))
+            await asyncio.to_thread(started.wait)
+            running.cancel()
+            await asyncio.sleep(0.01)
+            with self.assertRaises(ExecutorSaturated):
+                await executor.run(release.wait, 5)
+            release.set()
+            await asyncio.sleep(0.05)
+            self.assertTrue(await executor.run(release.wait, 5))
+
+        asyncio.run(scenario())
+
+
+class AsyncUploadAPITestCase(TestCase):
+    """Test the /api/async upload endpoints."""
+
+    html_content = b"<!DOCTYPE html><html><body>" + b"<p>paragraph</p>\n" * 300 + b"</body></html>"
+
+    def setUp(self):
+        """Set up test clients."""
+        self.client = Client()
+        self.async_client = AsyncClient()
+
+    def _file(self, content, name):
+        test_file = io.BytesIO(content)
+        test_file.name = name
+        return test_file
+
+    def test_async_upload_matches_sync_upload(self):
+        """Test that the async endpoint returns the same result as /api/upload."""
+        expected = json.loads(self.client.post('/api/upload', {'file': self._file(self.html_content, 'a.html')}).content)
+
+        response = asyncio.run(self.async_client.post('/api/async/upload', {'file': self._file(self.html_content, 'a.html')}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected)
+
+    def test_async_batch_upload(self):
+        """Test the async batch endpoint returns results in order."""
+        files = [self._file(self.html_content, 'a.html'), self._file(b"", 'empty.txt')]
+
+        response = asyncio.run(self.async_client.post('/api/async/upload/batch', {'files': files}))
+
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content)
+        self.assertEqual([item['name'] for item in response_data], ['a.html', 'empty.txt'])
+        self.assertEqual(response_data[1]['label'], 'empty')
+
+    def test_async_upload_parses_off_the_event_loop(self):
+        """Test that the multipart body of an async upload is parsed outside the event loop thread."""
+        threads = []
+        install = api.install_window_capture
+
+        def capture(*args):
+            threads.append(threading.current_thread())
+            return install(*args)
+
+        async def post():
+            threads.append(threading.current_thread())
+            return await self.async_client.post('/api/async/upload', {'file': self._file(self.html_content, 'a.html')})
+
+        with mock.patch('example.api.install_window_capture', capture):
+            response = asyncio.run(post())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(threads), 2)
+        self.assertIsNot(threads[0], threads[1])
+
+    def test_async_upload_returns_503_when_saturated(self):
+        """Test that a saturated executor results in 503 with Retry-After."""
+
+        async def saturated(*args):
+            raise ExecutorSaturated("busy")
+
+        with mock.patch('example.api.inference_executor.run', saturated):
+            response = asyncio.run(
+                self.async_client.post('/api/async/upload', {'file': self._file(self.html_content, 'a.html')})
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
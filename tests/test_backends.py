@@ -0,0 +1,77 @@
+"""
+Tests for the inline, thread and process inference backends.
+"""
+import json
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from example import api
+from example.executors import ProcessBackend, ThreadBackend, split_batch
+from example.windows import ByteWindows
+from tests.helpers import HTML, PDF, PYTHON, named_file
+
+CONTENTS = [PDF, PYTHON, HTML, b"", b"ab"] * 3
+
+
+def windows():
+    return [ByteWindows.from_bytes(content, api.window_size) for content in CONTENTS]
+
+
+def labels(results):
+    return [str(result.output.label) for result in results]
+
+
+class SplitBatchTestCase(TestCase):
+    def test_split(self):
+        """Test that chunks are contiguous, balanced and no smaller than min_size."""
+        self.assertEqual(split_batch(list(range(10)), 3, 1), [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        self.assertEqual(split_batch(list(range(10)), 4, 4), [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]])
+        self.assertEqual(split_batch([1, 2], 8, 4), [[1, 2]])
+
+
+class BackendTestCase(TestCase):
+    """Test that every backend gives the inline results, in order."""
+
+    def setUp(self):
+        self.expected = labels(api.extract_and_identify(windows()))
+
+    def test_thread_backend(self):
+        identify = mock.Mock(wraps=api.extract_and_identify)
+        backend = ThreadBackend(identify, 3, 2)
+        self.addCleanup(backend.shutdown)
+        self.assertEqual(labels(backend.identify(windows())), self.expected)
+        self.assertEqual(identify.call_count, 3)
+
+    def test_process_backend(self):
+        backend = ProcessBackend(api.result_from_cache, 2, 4)
+        self.addCleanup(backend.shutdown)
+        results = backend.identify(windows())
+        self.assertEqual(labels(results), self.expected)
+        self.assertEqual(results[0].score, api.extract_and_identify(windows()[:1])[0].score)
+        # the views of a memory mapping are copied into the shared segment like bytes
+        mapped = [ByteWindows(memoryview(item.head), memoryview(item.tail), item.size) for item in windows()]
+        self.assertEqual(labels(backend.identify(mapped)), self.expected)
+        self.assertEqual(backend.identify([]), [])
+
+
+class BackendApiTestCase(TestCase):
+    def test_upload_batch(self):
+        """Test that the upload endpoints identify through the configured backend."""
+        files = []
+        for index, content in enumerate(CONTENTS[:3]):
+            upload = named_file(content, f"{index}.bin")
+            files.append(upload)
+        backend = ThreadBackend(api.extract_and_identify, 2, 1)
+        self.addCleanup(backend.shutdown)
+        with (
+            mock.patch.object(api, "inference_backend", backend),
+            mock.patch.object(api, "cache", None),
+            mock.patch.object(backend, "identify", wraps=backend.identify) as identify,
+        ):
+            response = Client().post("/api/upload/batch", {"files": files})
+            upload = named_file(PDF, "a.pdf")
+            single = Client().post("/api/upload", {"file": upload})
+        self.assertEqual([item["label"] for item in json.loads(response.content)], ["pdf", "python", "html"])
+        self.assertEqual(json.loads(single.content)["label"], "pdf")
+        self.assertEqual(identify.call_count, 2)
@@ -0,0 +1,87 @@
+"""
+Tests for the cross-request micro-batcher.
+"""
+import threading
+from unittest import mock
+
+from django.test import TestCase
+
+from example.batching import MicroBatcher
+
+
+class MicroBatcherTestCase(TestCase):
+    """Test MicroBatcher grouping and error propagation."""
+
+    def _submit_concurrently(self, batcher, items):
+        results = [None] * len(items)
+        barrier = threading.Barrier(len(items))
+
+        def worker(index, item):
+            barrier.wait()
+            results[index] = batcher.submit(item)
+
+        threads = [threading.Thread(target=worker, args=(i, item)) for i, item in enumerate(items)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_each_caller_gets_its_own_result(self):
+        """Test that results are routed back to the submitting caller."""
+        batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_wait=0.05, max_batch_size=64)
+        results = self._submit_concurrently(batcher, list(range(20)))
+        self.assertEqual(results, [item * 2 for item in range(20)])
+
+    def test_concurrent_calls_are_batched(self):
+        """Test that concurrent submissions are grouped into fewer inference calls."""
+        batch_sizes = []
+
+        def infer(items):
+            batch_sizes.append(len(items))
+            return items
+
+        batcher = MicroBatcher(infer, max_wait=0.2, max_batch_size=64)
+        self._submit_concurrently(batcher, list(range(16)))
+        self.assertEqual(sum(batch_sizes), 16)
+        self.assertLess(len(batch_sizes), 16)
+
+    def test_batch_size_is_capped(self):
+        """Test that no batch exceeds max_batch_size."""
+        batch_sizes = []
+
+        def infer(items):
+            batch_sizes.append(len(items))
+            return items
+
+        batcher = MicroBatcher(infer, max_wait=0.2, max_batch_size=4)
+        self._submit_concurrently(batcher, list(range(12)))
+        self.assertEqual(sum(batch_sizes), 12)
+        self.assertLessEqual(max(batch_sizes), 4)
+
+    def test_inference_errors_reach_every_caller(self):
+        """Test that an exception in inference is raised in the waiting callers."""
+
+        def infer(items):
+            raise RuntimeError("inference failed")
+
+        batcher = MicroBatcher(infer, max_wait=0.001, max_batch_size=8)
+        with self.assertRaises(RuntimeError):
+            batcher.submit(1)
+        # the worker thread keeps serving after a failed batch
+        batcher.infer = lambda items: items
+        self.assertEqual(batcher.submit(2), 2)
+
+    def test_check_file_type_magika_uses_batcher(self):
+        """Test that check_file_type_magika goes through the batcher when configured."""
+        from example import api
+
+        content = b'<!DOCTYPE html><html><head><title>Test</title></head><body><h1>Hello</h1></body></html>'
+        expected = api.check_file_type_magika(content).output
+
+        batcher = MicroBatcher(api.identify_features, max_wait=0.001, max_batch_size=8)
+        with mock.patch.object(api, "cache", None), mock.patch.object(api, "batcher", batcher), mock.patch.object(
+            batcher, "infer", wraps=batcher.infer
+        ) as infer:
+            self.assertEqual(api.check_file_type_magika(content).output, expected)
+        infer.assert_called_once()
@@ -0,0 +1,124 @@
+"""
+Tests for the detection result cache.
+"""
+import io
+import json
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+
+from example.cache import DetectionCache
+from example.windows import ByteWindows
+from tests.helpers import patch_api
+
+
+class DetectionCacheTestCase(TestCase):
+    """Test DetectionCache keys, eviction, TTL and shared backend."""
+
+    def test_key_depends_on_windows_size_and_version(self):
+        """Test that keys change with the windows, the size and the model version."""
+        cache = DetectionCache("v1")
+        windows = ByteWindows(b"head", b"tail", 100)
+        self.assertEqual(cache.key_for(windows), cache.key_for(ByteWindows(b"head", b"tail", 100)))
+        self.assertNotEqual(cache.key_for(windows), cache.key_for(ByteWindows(b"head", b"tail", 101)))
+        self.assertNotEqual(cache.key_for(windows), cache.key_for(ByteWindows(b"head", b"tall", 100)))
+        self.assertNotEqual(cache.key_for(windows), DetectionCache("v2").key_for(windows))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = DetectionCache("v1", max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL."""
+        cache = DetectionCache("v1", ttl=10)
+        cache.set("a", 1)
+        with mock.patch("example.cache.time.monotonic", return_value=time.monotonic() + 11):
+            self.assertIsNone(cache.get("a"))
+
+    def test_hit_and_miss_counters(self):
+        """Test that hits and misses are counted."""
+        cache = DetectionCache("v1")
+        cache.get("a")
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("a")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    @override_settings(CACHES={"shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_shared_backend_is_consulted_on_local_miss(self):
+        """Test that a second worker's cache finds results through the shared backend."""
+        first = DetectionCache("v1", backend=caches["shared"])
+        second = DetectionCache("v1", backend=caches["shared"])
+        first.set("a", ("txt", "txt", 1.0, "none"))
+        self.assertEqual(second.get("a"), ("txt", "txt", 1.0, "none"))
+        self.assertEqual(second.stats()["shared_hits"], 1)
+        self.assertEqual(second.get("a"), ("txt", "txt", 1.0, "none"))
+        self.assertEqual(second.stats()["hits"], 1)
+
+
+class CachedDetectionTestCase(TestCase):
+    """Test that the API reuses cached detections."""
+
+    content = b"<!DOCTYPE html><html><body>" + b"<p>paragraph</p>\n" * 500 + b"</body></html>"
+
+    def setUp(self):
+        """Set up test client and an empty cache."""
+        from example import api
+
+        self.client = Client()
+        self.cache = DetectionCache(api.model_version)
+        patch_api(self, cache=self.cache)
+
+    def _upload(self):
+        test_file = io.BytesIO(self.content)
+        test_file.name = 'page.html'
+        response = self.client.post('/api/upload', {'file': test_file})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())
+
+    def test_repeated_upload_skips_inference(self):
+        """Test that a repeated upload is answered from the cache."""
+        from example import api
+
+        first = self._upload()
+        with mock.patch.object(api, "identify_features", wraps=api.identify_features) as identify_features:
+            second = self._upload()
+        identify_features.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_batch_upload_uses_cache(self):
+        """Test that cached files are not sent to the model in a batch."""
+        from example import api
+
+        self._upload()
+        files = []
+        for name, content in (('page.html', self.content), ('data.json', b'{"name": "test", "value": [1, 2, 3]}')):
+            test_file = io.BytesIO(content)
+            test_file.name = name
+            files.append(test_file)
+        with mock.patch.object(api, "identify_features", wraps=api.identify_features) as identify_features:
+            response = self.client.post('/api/upload/batch', {'files': files})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(identify_features.call_args.args[0]), 1)
+
+    def test_cache_stats_endpoint(self):
+        """Test that /api/cache/stats exposes the counters."""
+        self._upload()
+        self._upload()
+        response = self.client.get('/api/cache/stats')
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.content.decode())
+        self.assertTrue(stats["enabled"])
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
@@ -0,0 +1,69 @@
+"""
+Tests for the shared-model inference server and its RemoteMagika client.
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import TestCase
+
+from example.api import m
+from example.inference_server import InferenceServer, RemoteMagika, RemoteSession
+
+
+class InferenceServerTestCase(TestCase):
+    """Test RemoteMagika against an InferenceServer running in a thread."""
+
+    samples = [
+        b'<!DOCTYPE html><html><head><title>Test</title></head><body><h1>Hello</h1></body></html>',
+        b'{"name": "test", "value": 123, "array": [1, 2, 3]}',
+        b'#!/usr/bin/env python\ndef hello():\n    print("Hello, World!")\n\nhello()\n',
+        b"%PDF-1.7\n" + bytes(range(256)) * 16 + b"\n%%EOF\n",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.socket_path = os.path.join(cls.tmpdir.name, "magika.sock")
+        cls.server = InferenceServer(cls.socket_path, m, max_wait=0.005, max_batch_size=64)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.remote = RemoteMagika(cls.socket_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def test_remote_results_match_local_model(self):
+        """Test that predictions through the server match the in-process model."""
+        for content in self.samples:
+            with self.subTest(content=content[:20]):
+                local = m.identify_bytes(content)
+                remote = self.remote.identify_bytes(content)
+                self.assertEqual(remote.output.label, local.output.label)
+                self.assertAlmostEqual(remote.score, local.score, places=5)
+
+    def test_concurrent_clients(self):
+        """Test that concurrent threads each get their own correct result."""
+        expected = [m.identify_bytes(content).output.label for content in self.samples]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            labels = list(pool.map(lambda content: self.remote.identify_bytes(content).output.label, self.samples * 8))
+        self.assertEqual(labels, expected * 8)
+
+    def test_remote_magika_is_magika(self):
+        """Test that RemoteMagika can replace the module-level Magika instance."""
+        from magika import Magika
+
+        self.assertIsInstance(self.remote, Magika)
+        self.assertIsInstance(self.remote._onnx_session, RemoteSession)
+
+    def test_missing_server_raises(self):
+        """Test that a client gives up when no server is listening."""
+        session = RemoteSession(os.path.join(self.tmpdir.name, "missing.sock"), connect_timeout=0.2)
+        with self.assertRaises(OSError):
+            session.run(["target_label"], {"bytes": [[0] * 2048]})
@@ -0,0 +1,215 @@
+"""
+Tests for the detection job queue and its worker.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from example import api, jobs, model
+from example.management.commands.jobworker import work
+from example.models import DetectionJob
+from tests.helpers import PDF, PYTHON, named_file, patch_api
+
+WORKER_OPTIONS = {"nice": 0, "poll_interval": 0.01, "lease": 60, "backoff": 0, "burst": True}
+
+
+def run_worker():
+    work(WORKER_OPTIONS, threading.Event())
+
+
+class JobTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.spool = os.path.join(self.directory.name, "spool")
+        self.root = os.path.join(self.directory.name, "root")
+        os.makedirs(os.path.join(self.root, "sub"))
+        for name, content in (("a.pdf", PDF), ("sub/main.py", PYTHON)):
+            with open(os.path.join(self.root, name), "wb") as file:
+                file.write(content)
+        patch_api(self, job_spool_dir=self.spool, job_path_roots=[os.path.realpath(self.root)])
+
+    def submit_files(self, *contents, priority=0):
+        files = []
+        for index, content in enumerate(contents):
+            upload = named_file(content, f"{index}.bin")
+            files.append(upload)
+        return self.client.post(f"/api/jobs?priority={priority}", {"files": files})
+
+    def submit_paths(self, *paths):
+        return self.client.post("/api/jobs/paths", data=json.dumps({"paths": list(paths)}), content_type="application/json")
+
+    def get_job(self, job_id, wait=0):
+        return json.loads(self.client.get(f"/api/jobs/{job_id}?wait={wait}").content)
+
+
+class JobApiTestCase(JobTestCase):
+    """Test submitting jobs, running them and polling their results."""
+
+    def test_upload_job(self):
+        """Test that uploaded files are spooled, detected by a worker and removed."""
+        response = self.submit_files(PDF, PYTHON)
+
+        self.assertEqual(response.status_code, 202)
+        job = json.loads(response.content)
+        self.assertEqual((job["status"], job["total"], job["results"]), ("queued", 2, None))
+        self.assertEqual(len(os.listdir(os.path.join(self.spool, job["id"]))), 2)
+
+        run_worker()
+
+        job = self.get_job(job["id"])
+        self.assertEqual((job["status"], job["completed"], job["attempts"]), ("done", 2, 1))
+        self.assertEqual([(item["name"], item["label"]) for item in job["results"]], [("0.bin", "pdf"), ("1.bin", "python")])
+        self.assertFalse(os.path.exists(os.path.join(self.spool, job["id"])))
+
+    def test_upload_job_file_limits(self):
+        """Test that job uploads are bounded by JOB_MAX_FILES rather than Django's file count limit."""
+        with override_settings(DATA_UPLOAD_MAX_NUMBER_FILES=2):
+            response = self.submit_files(PDF, PYTHON, PDF)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)["total"], 3)
+
+        with mock.patch.object(api, "job_max_files", 2):
+            response = self.submit_files(PDF, PYTHON, PDF)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(len(os.listdir(self.spool)), 1)
+        self.assertEqual(self.client.post("/api/jobs", {"priority": "1"}).status_code, 400)
+        self.assertEqual(len(os.listdir(self.spool)), 1)
+
+    def test_path_job(self):
+        """Test that directories are expanded below the allowed roots."""
+        os.symlink("/etc/hostname", os.path.join(self.root, "link"))
+        job = json.loads(self.submit_paths(self.root).content)
+
+        run_worker()
+
+        results = self.get_job(job["id"])["results"]
+        self.assertEqual(
+            [(os.path.relpath(item["name"], self.root), item["label"]) for item in results],
+            [("a.pdf", "pdf"), ("sub/main.py", "python")],
+        )
+
+    def test_path_outside_roots(self):
+        """Test that paths outside JOB_PATH_ROOTS are refused."""
+        self.assertEqual(self.submit_paths("/etc/passwd").status_code, 403)
+        self.assertEqual(self.submit_paths(os.path.join(self.root, "..", "spool")).status_code, 403)
+        self.assertEqual(self.submit_paths(os.path.join(self.root, "missing")).status_code, 400)
+        with mock.patch.object(api, "job_path_roots", []):
+            self.assertEqual(self.submit_paths(self.root).status_code, 403)
+
+    def test_missing_file_is_an_item_error(self):
+        """Test that a file that cannot be read fails on its own, not the job."""
+        job = json.loads(self.submit_paths(os.path.join(self.root, "a.pdf")).content)
+        os.remove(os.path.join(self.root, "a.pdf"))
+
+        run_worker()
+
+        job = self.get_job(job["id"])
+        self.assertEqual(job["status"], "done")
+        self.assertIn("FileNotFoundError", job["results"][0]["error"])
+
+    def test_queue_limit(self):
+        """Test that submissions beyond JOB_MAX_ACTIVE answer 503 with Retry-After."""
+        with mock.patch.object(api, "job_max_active", 1):
+            self.assertEqual(self.submit_files(PDF).status_code, 202)
+            response = self.submit_files(PDF)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+
+    def test_wait(self):
+        """Test that wait returns at the deadline for an active job."""
+        job = json.loads(self.submit_files(PDF).content)
+        self.assertEqual(self.get_job(job["id"], wait=0.3)["status"], "queued")
+        self.assertEqual(self.client.get(f"/api/jobs/{'0' * 32}").status_code, 404)
+
+
+class LongPollTestCase(TransactionTestCase):
+    """Test GET /api/jobs/{id}?wait= under ASGI, where the ORM runs outside the test's thread."""
+
+    def test_wait_does_not_block_the_event_loop(self):
+        """Test that concurrent long polls wait side by side."""
+        job = jobs.submit([{"name": "a.pdf", "path": "/nonexistent"}])
+        client = AsyncClient()
+
+        async def poll_twice():
+            return await asyncio.gather(*(client.get(f"/api/jobs/{job.id}?wait=0.5") for _ in range(2)))
+
+        start = time.monotonic()
+        responses = asyncio.run(poll_twice())
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual([json.loads(response.content)["status"] for response in responses], ["queued", "queued"])
+
+
+class JobQueueTestCase(JobTestCase):
+    """Test claiming, retrying and reclaiming jobs."""
+
+    def test_priority_order(self):
+        """Test that jobs are claimed by priority, then in submission order."""
+        low = jobs.submit([], priority=0)
+        high = jobs.submit([], priority=5)
+        later = jobs.submit([], priority=0)
+        self.assertEqual([jobs.claim("test").id for _ in range(3)], [high.id, low.id, later.id])
+        self.assertIsNone(jobs.claim("test"))
+
+    def test_retry_then_fail(self):
+        """Test that a failing job is retried with backoff until max_attempts."""
+        job = jobs.submit([{"name": "a", "path": os.path.join(self.root, "a.pdf")}], max_attempts=2)
+        with mock.patch.object(api, "identify_seekables", side_effect=RuntimeError("model crashed")):
+            with mock.patch.dict(WORKER_OPTIONS, backoff=60):
+                run_worker()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (DetectionJob.QUEUED, 1))
+            self.assertIn("model crashed", job.error)
+            # the retry is not claimed before its backoff has passed
+            self.assertGreater(job.available_at, timezone.now() + timedelta(seconds=50))
+            self.assertIsNone(jobs.claim("test"))
+
+            DetectionJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+            run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (DetectionJob.FAILED, 2))
+
+    def test_too_many_files_is_not_retried(self):
+        """Test that a job expanding to more than JOB_MAX_FILES files fails at once."""
+        job = jobs.submit([{"name": self.root, "path": self.root}])
+        with mock.patch.object(api, "job_max_files", 1):
+            run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (DetectionJob.FAILED, 1))
+        self.assertIn("more than 1 files", job.error)
+
+    def test_reclaim_stale(self):
+        """Test that a job whose worker stopped sending heartbeats is queued again."""
+        job = jobs.submit([])
+        jobs.claim("lost")
+        DetectionJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+
+        self.assertEqual(jobs.reclaim_stale(60), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, DetectionJob.QUEUED)
+        self.assertEqual(jobs.claim("test").attempts, 2)
+
+
+class JobWorkerCommandTestCase(TestCase):
+    def test_ort_threads(self):
+        """Test that the worker's session gets --ort-threads threads, whatever ORT_INTRA_OP_THREADS says."""
+        with (
+            mock.patch.dict(os.environ, {"ORT_INTRA_OP_THREADS": "4"}),
+            mock.patch.object(model, "_magika", None),
+            mock.patch.object(model, "inference_socket", ""),
+            mock.patch.object(model, "build_local_magika") as build,
+            mock.patch("signal.signal"),
+        ):
+            call_command("jobworker", processes=0, ort_threads=1, burst=True)
+        self.assertEqual(build.call_args.args[0].intra_op_num_threads, 1)
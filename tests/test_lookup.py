@@ -0,0 +1,71 @@
+"""
+Tests for looking up detections by the hash of the windows before uploading.
+"""
+import json
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from example import api
+from example.cache import DetectionCache, window_digest
+from example.schemas import LABEL_IDS
+from example.store import DetectionStore
+from example.windows import ByteWindows
+from tests.helpers import PDF, named_file, patch_api
+
+PDF_HASH = window_digest(ByteWindows.from_bytes(PDF, api.window_size))
+MISSING = "0" * 32
+
+
+class LookupTestCase(TestCase):
+    """Test HEAD, GET and POST /api/lookup."""
+
+    def setUp(self):
+        self.client = Client()
+        patch_api(self, cache=DetectionCache(api.model_version), store=None)
+
+    def upload(self):
+        upload = named_file(PDF, "a.pdf")
+        return json.loads(self.client.post("/api/upload", {"file": upload}).content)
+
+    def test_lookup_after_upload(self):
+        """Test that a file is found by hash once uploaded, with the upload's detection."""
+        self.assertEqual(self.client.head(f"/api/lookup/{PDF_HASH}").status_code, 404)
+        detection = self.upload()
+
+        self.assertEqual(self.client.head(f"/api/lookup/{PDF_HASH.upper()}").status_code, 200)
+        self.assertEqual(json.loads(self.client.get(f"/api/lookup/{PDF_HASH}").content), detection)
+        compact = json.loads(self.client.get(f"/api/lookup/{PDF_HASH}?compact=true").content)
+        self.assertEqual(compact, {"label_id": LABEL_IDS["pdf"]})
+
+    def test_batch(self):
+        """Test that a batch lookup answers in order, with null for the files to upload."""
+        self.upload()
+        response = self.client.post(
+            "/api/lookup", data=json.dumps({"hashes": [MISSING, PDF_HASH]}), content_type="application/json"
+        )
+        results = json.loads(response.content)
+        self.assertIsNone(results[0])
+        self.assertEqual((results[1]["label"], results[1]["size"], results[1]["content_hash"]), ("pdf", len(PDF), PDF_HASH))
+
+        response = self.client.post(
+            "/api/lookup?compact=true", data=json.dumps({"hashes": [PDF_HASH, MISSING]}), content_type="application/json"
+        )
+        self.assertEqual(json.loads(response.content), [LABEL_IDS["pdf"], None])
+        with mock.patch.object(api, "max_batch_size", 1):
+            response = self.client.post(
+                "/api/lookup", data=json.dumps({"hashes": [PDF_HASH, MISSING]}), content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 413)
+
+    def test_store_and_old_cache_entries(self):
+        """Test that the store answers when the cache has no entry with a size."""
+        api.cache.set(api.cache.key(PDF_HASH), ("pdf", "pdf", 1.0, "none"))
+        self.assertEqual(self.client.get(f"/api/lookup/{PDF_HASH}").status_code, 404)
+
+        store = DetectionStore(api.model_version, batch_size=1000, flush_interval=3600)
+        detection = {"label": "pdf", "mime_type": "application/pdf", "group": "document", "score": 0.99, "size": len(PDF)}
+        store.add(PDF_HASH, {**detection, "model_version": api.model_version})
+        with mock.patch.object(api, "store", store):
+            result = json.loads(self.client.get(f"/api/lookup/{PDF_HASH}").content)
+        self.assertEqual((result["label"], result["score"], result["size"]), ("pdf", 0.99, len(PDF)))
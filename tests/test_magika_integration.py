@@ -4,6 +4,7 @@ Tests for Magika integration and file type detection functionality.
 import io
 import json
 from django.test import TestCase, Client
+from magika import MagikaResult
 from example.api import check_file_type_magika
 
 
@@ -20,9 +21,9 @@ class MagikaIntegrationTestCase(TestCase):
         result = check_file_type_magika(test_content)
         
         self.assertIsNotNone(result)
-        self.assertIsInstance(result, str)
-        self.assertIn("File Type is", result)
-        self.assertIn("with Mime Type", result)
+        self.assertIsInstance(result, MagikaResult)
+        self.assertTrue(result.ok)
+        self.assertTrue(result.output.mime_type)
 
     def test_magika_function_with_html_content(self):
         """Test the check_file_type_magika function with HTML content."""
@@ -30,9 +31,9 @@ class MagikaIntegrationTestCase(TestCase):
         result = check_file_type_magika(test_content)
         
         self.assertIsNotNone(result)
-        self.assertIsInstance(result, str)
-        self.assertIn("File Type is", result)
-        self.assertIn("with Mime Type", result)
+        self.assertIsInstance(result, MagikaResult)
+        self.assertTrue(result.ok)
+        self.assertTrue(result.output.mime_type)
 
     def test_magika_function_with_json_content(self):
         """Test the check_file_type_magika function with JSON content."""
@@ -40,9 +41,9 @@ class MagikaIntegrationTestCase(TestCase):
         result = check_file_type_magika(test_content)
         
         self.assertIsNotNone(result)
-        self.assertIsInstance(result, str)
-        self.assertIn("File Type is", result)
-        self.assertIn("with Mime Type", result)
+        self.assertIsInstance(result, MagikaResult)
+        self.assertTrue(result.ok)
+        self.assertTrue(result.output.mime_type)
 
     def test_magika_function_with_xml_content(self):
         """Test the check_file_type_magika function with XML content."""
@@ -50,9 +51,9 @@ class MagikaIntegrationTestCase(TestCase):
         result = check_file_type_magika(test_content)
         
         self.assertIsNotNone(result)
-        self.assertIsInstance(result, str)
-        self.assertIn("File Type is", result)
-        self.assertIn("with Mime Type", result)
+        self.assertIsInstance(result, MagikaResult)
+        self.assertTrue(result.ok)
+        self.assertTrue(result.output.mime_type)
 
     def test_magika_function_with_csv_content(self):
         """Test the check_file_type_magika function with CSV content."""
@@ -60,9 +61,9 @@ class MagikaIntegrationTestCase(TestCase):
         result = check_file_type_magika(test_content)
         
         self.assertIsNotNone(result)
-        self.assertIsInstance(result, str)
-        self.assertIn("File Type is", result)
-        self.assertIn("with Mime Type", result)
+        self.assertIsInstance(result, MagikaResult)
+        self.assertTrue(result.ok)
+        self.assertTrue(result.output.mime_type)
 
     def test_magika_function_with_python_content(self):
         """Test the check_file_type_magika function with Python code."""
@@ -70,18 +71,16 @@ class MagikaIntegrationTestCase(TestCase):
         result = check_file_type_magika(test_content)
         
         self.assertIsNotNone(result)
-        self.assertIsInstance(result, str)
-        self.assertIn("File Type is", result)
-        self.assertIn("with Mime Type", result)
+        self.assertIsInstance(result, MagikaResult)
+        self.assertTrue(result.ok)
+        self.assertTrue(result.output.mime_type)
 
     def test_magika_function_with_empty_content(self):
         """Test the check_file_type_magika function with empty content."""
         test_content = b""
         result = check_file_type_magika(test_content)
         
-        # Empty content might return None or a generic type
-        if result is not None:
-            self.assertIsInstance(result, str)
+        self.assertEqual(result.output.label, 'empty')
 
     def test_upload_detects_text_file_correctly(self):
         """Test that upload endpoint correctly detects text files."""
@@ -94,10 +93,8 @@ class MagikaIntegrationTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         response_data = json.loads(response.content.decode())
         
-        detected_type = response_data['Detected File Type']
         # Should detect some form of text
-        self.assertNotEqual(detected_type, 'Unknown')
-        self.assertIn('File Type is', detected_type)
+        self.assertEqual(response_data['group'], 'text')
 
     def test_upload_detects_html_file_correctly(self):
         """Test that upload endpoint correctly detects HTML files."""
@@ -124,9 +121,8 @@ class MagikaIntegrationTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         response_data = json.loads(response.content.decode())
         
-        detected_type = response_data['Detected File Type']
-        self.assertNotEqual(detected_type, 'Unknown')
-        self.assertIn('File Type is', detected_type)
+        self.assertEqual(response_data['group'], 'text')
+        self.assertEqual(response_data['mime_type'].split('/')[0], 'text')
 
     def test_upload_detects_json_file_correctly(self):
         """Test that upload endpoint correctly detects JSON files."""
@@ -149,9 +145,8 @@ class MagikaIntegrationTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         response_data = json.loads(response.content.decode())
         
-        detected_type = response_data['Detected File Type']
-        self.assertNotEqual(detected_type, 'Unknown')
-        self.assertIn('File Type is', detected_type)
+        self.assertEqual(response_data['label'], 'json')
+        self.assertEqual(response_data['mime_type'], 'application/json')
 
     def test_chunk_size_environment_variable(self):
         """Test that chunk size is correctly read from environment."""
@@ -174,10 +169,9 @@ class MagikaIntegrationTestCase(TestCase):
         response_data = json.loads(response.content.decode())
         
         # Should still detect the file type correctly
-        self.assertIn('Detected File Type', response_data)
-        self.assertIn('Size', response_data)
-        self.assertEqual(response_data['Size'], 1000)
-        self.assertNotEqual(response_data['Detected File Type'], 'Unknown')
+        self.assertIn('label', response_data)
+        self.assertEqual(response_data['size'], 1000)
+        self.assertNotEqual(response_data['label'], 'unknown')
 
     def test_magika_import_and_initialization(self):
         """Test that Magika is properly imported and initialized."""
@@ -207,5 +201,4 @@ class MagikaIntegrationTestCase(TestCase):
         data_json = json.loads(response_json.content.decode())
         data_txt = json.loads(response_txt.content.decode())
         
-        self.assertNotEqual(data_json['Detected File Type'], 'Unknown')
-        self.assertNotEqual(data_txt['Detected File Type'], 'Unknown')
\ No newline at end of file
+        self.assertEqual(data_json['label'], data_txt['label'])
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Tests for the metrics registry and the /api/metrics endpoint.
+"""
+import io
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from example import metrics
+from example.metrics import CounterFamily, Gauge, HistogramFamily, Registry
+
+
+class MetricsRegistryTestCase(TestCase):
+    """Test histogram, counter and gauge rendering."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that bucket counts include every smaller bucket and +Inf counts everything."""
+        histogram = HistogramFamily("test_seconds", "Test.", (0.1, 1.0), "stage")
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.labels("read").observe(value)
+
+        lines = list(histogram.render())
+
+        self.assertIn('test_seconds_bucket{stage="read",le="0.1"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="read",le="1.0"} 3', lines)
+        self.assertIn('test_seconds_bucket{stage="read",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_count{stage="read"} 4', lines)
+        self.assertIn('test_seconds_sum{stage="read"} 2.65', lines)
+
+    def test_counter_and_gauge(self):
+        """Test labelled counters and callback gauges, and that unset gauges are omitted."""
+        registry = Registry()
+        counter = registry.register(CounterFamily("test_total", "Test.", "label"))
+        registry.register(Gauge("test_ready", "Test.", lambda: 1))
+        registry.register(Gauge("test_missing", "Test.", lambda: None))
+        counter.inc_many(["html", "pdf", "html"])
+
+        text = registry.render()
+
+        self.assertIn('test_total{label="html"} 2\n', text)
+        self.assertIn('test_total{label="pdf"} 1\n', text)
+        self.assertIn("test_ready 1\n", text)
+        self.assertNotIn("test_missing", text)
+
+    def test_stage_is_noop_when_disabled(self):
+        """Test that METRICS_ENABLED=false records nothing."""
+        histogram = metrics.stage_histograms["read"]
+        count = sum(histogram.counts)
+        with mock.patch.object(metrics, "metrics_enabled", False):
+            with metrics.stage("read"):
+                pass
+        self.assertEqual(sum(histogram.counts), count)
+        with metrics.stage("read"):
+            pass
+        self.assertEqual(sum(histogram.counts), count + 1)
+
+
+class MetricsEndpointTestCase(TestCase):
+    """Test that the upload path reports its stages."""
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = Client()
+
+    def _counts(self):
+        return {name: sum(histogram.counts) for name, histogram in metrics.stage_histograms.items()}
+
+    def test_upload_records_stages_and_labels(self):
+        """Test that an upload is timed per stage and counted by label."""
+        from example import api
+
+        before = self._counts()
+        html_before = metrics.detections_total._values.get("html", 0)
+        test_file = io.BytesIO(b'<!DOCTYPE html><html><head><title>Test</title></head><body><p>Hello</p></body></html>')
+        test_file.name = 'a.html'
+
+        with mock.patch.object(api, "cache", None):
+            self.client.post('/api/upload', {'file': test_file})
+        after = self._counts()
+
+        for name in ("multipart", "read", "features", "inference", "render"):
+            self.assertEqual(after[name], before[name] + 1, name)
+        self.assertEqual(metrics.detections_total._values["html"], html_before + 1)
+
+    def test_metrics_endpoint(self):
+        """Test the text exposition served by /api/metrics."""
+        self.client.get('/api/hello')
+
+        response = self.client.get('/api/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE magika_stage_seconds histogram', text)
+        self.assertIn('magika_stage_seconds_count{stage="render"}', text)
+        self.assertIn('# TYPE magika_cache_misses_total counter', text)
+        self.assertIn('magika_model_ready ', text)
@@ -0,0 +1,156 @@
+"""
+Tests for lazy model loading, warm-up and the readiness endpoint.
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import Client, TestCase
+
+from example import model
+
+
+class LazyModelTestCase(TestCase):
+    """Test that the Magika model is loaded lazily and only once."""
+
+    def test_importing_api_does_not_load_model(self):
+        """Test that importing the URLconf and API leaves the model unloaded."""
+        code = (
+            "import os, django;"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'example.settings');"
+            "django.setup();"
+            "import example.urls, example.model;"
+            "print(example.model.is_loaded())"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(output.strip(), "False")
+
+    def test_concurrent_first_use_builds_model_once(self):
+        """Test that concurrent get_magika() calls build a single instance."""
+        built = []
+
+        def slow_build():
+            time.sleep(0.05)
+            built.append(object())
+            return built[-1]
+
+        with mock.patch.object(model, "_magika", None), mock.patch.object(model, "build_magika", slow_build):
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(model.get_magika())) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertTrue(all(result is built[0] for result in results))
+
+    def test_window_size_without_loading_model(self):
+        """Test that the model configuration is read without building a session."""
+        self.assertEqual(model.model_config().block_size, model.get_magika()._model_config.block_size)
+
+    def test_magika_private_api_is_checked(self):
+        """Test that a Magika release without the private methods used here fails with a clear error."""
+        model.check_magika_api()
+
+        class Changed(model.Magika):
+            _get_results_from_features = None
+
+        with self.assertRaisesRegex(ImportError, "_get_results_from_features.*magika>=1.0.3,<1.1"):
+            model.check_magika_api(Changed)
+
+
+class ReadinessTestCase(TestCase):
+    """Test warm-up and the /api/ready endpoint."""
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = Client()
+
+    def test_not_ready_before_warm_up(self):
+        """Test that /api/ready answers 503 until the model is warm."""
+        with mock.patch.object(model, "_warm", threading.Event()):
+            response = self.client.get('/api/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(json.loads(response.content)["ready"])
+
+    def test_ready_after_warm_up(self):
+        """Test that warm_up() makes /api/ready answer 200 with timings."""
+        with mock.patch.object(model, "_warm", threading.Event()):
+            model.warm_up()
+            response = self.client.get('/api/ready')
+        self.assertEqual(response.status_code, 200)
+        status = json.loads(response.content)
+        self.assertTrue(status["ready"])
+        self.assertIn("warmup_seconds", status)
+        self.assertEqual(status["model_version"], model.model_version)
+
+    def test_ready_when_loaded_without_warm_up(self):
+        """Test that with MAGIKA_WARMUP=off the worker is ready once get_magika() has loaded the model."""
+        loaded = object()
+        with (
+            mock.patch.object(model, "_warm", threading.Event()),
+            mock.patch.object(model, "_magika", None),
+            mock.patch.object(model, "build_magika", return_value=loaded),
+            mock.patch.object(model, "warmup_mode", "off"),
+            mock.patch("example.api.warmup_mode", "off"),
+        ):
+            self.assertFalse(model.is_ready())
+            response = self.client.get('/api/ready')
+            self.assertTrue(model.is_ready())
+            self.assertIs(model.get_magika(), loaded)
+        self.assertEqual(response.status_code, 200)
+        status = json.loads(response.content)
+        self.assertEqual((status["ready"], status["loaded"], status["warm"]), (True, True, False))
+
+    def test_warm_up_on_boot_modes(self):
+        """Test that MAGIKA_WARMUP=off skips warm-up and sync performs it."""
+        with mock.patch.object(model, "_warm", threading.Event()):
+            with mock.patch.object(model, "warmup_mode", "off"):
+                model.warm_up_on_boot()
+                self.assertFalse(model.is_warm())
+            with mock.patch.object(model, "warmup_mode", "sync"):
+                model.warm_up_on_boot()
+                self.assertTrue(model.is_warm())
+
+
+class SessionTuningTestCase(TestCase):
+    """Test onnxruntime session tuning."""
+
+    def test_session_options_from_settings(self):
+        """Test that settings are mapped onto SessionOptions."""
+        import onnxruntime as rt
+
+        options = model.session_options(intra_op=2, inter_op=1, optimization="basic", mode="parallel")
+        self.assertEqual(options.intra_op_num_threads, 2)
+        self.assertEqual(options.inter_op_num_threads, 1)
+        self.assertEqual(options.graph_optimization_level, rt.GraphOptimizationLevel.ORT_ENABLE_BASIC)
+        self.assertEqual(options.execution_mode, rt.ExecutionMode.ORT_PARALLEL)
+
+    def test_optimized_model_is_saved_and_reloaded(self):
+        """Test that the optimized graph is saved once and reused with matching predictions."""
+        import tempfile
+        from pathlib import Path
+
+        import onnxruntime as rt
+
+        content = b'<!DOCTYPE html><html><head><title>Test</title></head><body><h1>Hello</h1></body></html>'
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "optimized.onnx"
+            first = model.TunedMagika(model.session_options(intra_op=1), path, model_dir=model.model_dir)
+            self.assertTrue(path.is_file())
+            self.assertEqual(list(Path(directory).glob("*.tmp")), [])
+
+            options = model.session_options(intra_op=1)
+            with mock.patch.object(rt, "InferenceSession", wraps=rt.InferenceSession) as session:
+                second = model.TunedMagika(options, path, model_dir=model.model_dir)
+            self.assertEqual(session.call_args.args[0], str(path))
+            self.assertEqual(options.graph_optimization_level, rt.GraphOptimizationLevel.ORT_DISABLE_ALL)
+
+            self.assertEqual(first.identify_bytes(content).output.label, second.identify_bytes(content).output.label)
+            self.assertAlmostEqual(first.identify_bytes(content).score, second.identify_bytes(content).score, places=5)
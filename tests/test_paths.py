@@ -0,0 +1,129 @@
+"""
+Tests for detection of local files through memory mappings.
+"""
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from example import api
+from example.windows import MappedWindows, read_windows
+from tests.helpers import PDF, PYTHON, named_file, patch_api
+
+
+class MappedWindowsTestCase(TestCase):
+    """Test MappedWindows against read_windows."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as file:
+            file.write(content)
+        return path
+
+    def test_windows_match_read_windows(self):
+        """Test that the mapped windows hold the bytes read_windows reads."""
+        for content in (PDF, b"short", b"x" * api.window_size):
+            expected = read_windows(io.BytesIO(content), api.window_size)
+            with MappedWindows(self._write("file", content), api.window_size) as windows:
+                self.assertIsInstance(windows.head, memoryview)
+                self.assertEqual(
+                    (bytes(windows.head), bytes(windows.tail), windows.size), (expected.head, expected.tail, expected.size)
+                )
+                self.assertEqual(windows.read_at(windows.size - 3, 3), content[-3:])
+                self.assertIsInstance(windows.read_at(0, 3), bytes)
+
+    def test_close_releases_the_views(self):
+        """Test that the windows cannot be used after close."""
+        windows = MappedWindows(self._write("file", PDF), api.window_size)
+        head = windows.head
+        windows.close()
+        with self.assertRaises(ValueError):
+            bytes(head)
+        windows.close()
+
+    def test_empty_file(self):
+        """Test that an empty file, which cannot be mapped, has empty windows."""
+        with MappedWindows(self._write("empty", b""), api.window_size) as windows:
+            self.assertEqual((windows.head, windows.size), (b"", 0))
+
+    def test_special_files_are_refused(self):
+        """Test that directories and FIFOs are refused without blocking."""
+        fifo = os.path.join(self.directory.name, "fifo")
+        os.mkfifo(fifo)
+        for path in (self.directory.name, fifo):
+            with self.assertRaisesRegex(OSError, "not a regular file"):
+                MappedWindows(path, api.window_size)
+
+
+class PathDetectionTestCase(TestCase):
+    """Test the /api/paths endpoint."""
+
+    def setUp(self):
+        self.client = Client()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = os.path.realpath(os.path.join(self.directory.name, "shared"))
+        os.makedirs(self.root)
+        for name, content in (("a.pdf", PDF), ("main.py", PYTHON), ("empty", b"")):
+            with open(os.path.join(self.root, name), "wb") as file:
+                file.write(content)
+        patch_api(self, local_path_roots=[self.root])
+
+    def _post(self, paths, compact=False):
+        return self.client.post(
+            f"/api/paths?compact={str(compact).lower()}", data=json.dumps({"paths": paths}), content_type="application/json"
+        )
+
+    def test_matches_batch_upload(self):
+        """Test that mapped files get the detections of the same files uploaded."""
+        names = ["a.pdf", "main.py", "empty"]
+        uploads = []
+        for name in names:
+            with open(os.path.join(self.root, name), "rb") as file:
+                upload = named_file(file.read(), name)
+            uploads.append(upload)
+        expected = json.loads(self.client.post("/api/upload/batch", {"files": uploads}).content)
+
+        paths = [os.path.join(self.root, name) for name in names]
+        response = self._post(paths)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), [{**item, "name": path} for item, path in zip(expected, paths)])
+
+    def test_errors_stay_in_place(self):
+        """Test that missing files and directories are reported per path."""
+        paths = [os.path.join(self.root, "missing"), self.root, os.path.join(self.root, "a.pdf")]
+        missing, directory, found = json.loads(self._post(paths).content)
+
+        self.assertIn("No such file", missing["error"])
+        self.assertIn("not a regular file", directory["error"])
+        self.assertEqual(found["label"], "pdf")
+        self.assertEqual(json.loads(self._post(paths, compact=True).content)[:2], [None, None])
+
+    def test_mappings_are_closed(self):
+        """Test that every mapping is closed when the response is built."""
+        with mock.patch.object(MappedWindows, "close", autospec=True, side_effect=MappedWindows.close) as close:
+            self._post([os.path.join(self.root, "a.pdf"), os.path.join(self.root, "main.py")])
+        self.assertEqual(close.call_count, 2)
+
+    def test_paths_outside_the_roots(self):
+        """Test that paths outside LOCAL_PATH_ROOTS, also through symlinks, are refused."""
+        os.symlink("/etc/hostname", os.path.join(self.root, "link"))
+        self.assertEqual(self._post(["/etc/hostname"]).status_code, 403)
+        self.assertEqual(self._post([os.path.join(self.root, "link")]).status_code, 403)
+        self.assertEqual(self._post([os.path.join(self.root, "..", "shared-other")]).status_code, 403)
+        with mock.patch.object(api, "local_path_roots", []):
+            self.assertEqual(self._post([os.path.join(self.root, "a.pdf")]).status_code, 403)
+
+    def test_batch_size_is_limited(self):
+        """Test that too many paths are rejected."""
+        with mock.patch.object(api, "max_batch_size", 1):
+            response = self._post([os.path.join(self.root, "a.pdf")] * 2)
+        self.assertEqual(response.status_code, 413)
@@ -0,0 +1,74 @@
+"""
+Tests for the raw request body upload endpoint.
+"""
+import io
+import json
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from example.api import window_size
+
+
+class RawUploadTestCase(TestCase):
+    """Test /api/upload/raw with Content-Length and chunked bodies."""
+
+    pdf_content = b"%PDF-1.7\n" + bytes(range(256)) * 64 + b"\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n"
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = Client()
+
+    def _post_raw(self, content, **extra):
+        return self.client.post('/api/upload/raw', data=content, content_type='application/octet-stream', **extra)
+
+    def _post_chunked(self, content, terminated=True):
+        # A server that decodes chunked transfer encoding passes no CONTENT_LENGTH
+        # and flags that the input stream ends with the body.
+        extra = {'CONTENT_LENGTH': '', 'HTTP_TRANSFER_ENCODING': 'chunked', 'wsgi.input': io.BytesIO(content)}
+        if terminated:
+            extra['wsgi.input_terminated'] = True
+        return self._post_raw(b"", **extra)
+
+    def test_raw_upload_matches_multipart_upload(self):
+        """Test that a raw body gets the same result as the multipart upload."""
+        test_file = io.BytesIO(self.pdf_content)
+        test_file.name = 'document.pdf'
+        expected = json.loads(self.client.post('/api/upload', {'file': test_file}).content)
+
+        response = self._post_raw(self.pdf_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected)
+        self.assertEqual(expected['label'], 'pdf')
+
+    def test_chunked_upload(self):
+        """Test a body without Content-Length read to the end of the input stream."""
+        response = self._post_chunked(self.pdf_content)
+
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content)
+        self.assertEqual(response_data['label'], 'pdf')
+        self.assertEqual(response_data['size'], len(self.pdf_content))
+
+    def test_unterminated_input_without_length_is_rejected(self):
+        """Test that a body whose end cannot be found answers 411."""
+        response = self._post_chunked(self.pdf_content, terminated=False)
+        self.assertEqual(response.status_code, 411)
+
+    def test_oversized_body_is_rejected(self):
+        """Test the size limit by Content-Length and while draining a chunked body."""
+        with mock.patch('example.api.raw_upload_max_size', 2 * window_size):
+            self.assertEqual(self._post_raw(b"a" * (3 * window_size)).status_code, 413)
+            self.assertEqual(self._post_chunked(b"a" * (3 * window_size)).status_code, 413)
+            self.assertEqual(self._post_chunked(b"a" * window_size).status_code, 200)
+
+    def test_empty_and_compact(self):
+        """Test an empty body and the compact label ID response."""
+        labels = json.loads(self.client.get('/api/labels').content)['labels']
+
+        self.assertEqual(json.loads(self._post_raw(b"").content)['label'], 'empty')
+        response = self.client.post(
+            '/api/upload/raw?compact=true', data=self.pdf_content, content_type='application/octet-stream'
+        )
+        self.assertEqual(labels[json.loads(response.content)['label_id']], 'pdf')
@@ -0,0 +1,289 @@
+"""
+Tests for remote detection through HTTP range requests.
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import Client, SimpleTestCase, TestCase
+
+from example import api
+from example.remote import RangeReader, RemoteError, parse_content_range
+from example.windows import ByteWindows
+
+WINDOW_SIZE = 1024
+
+
+def fields(windows: ByteWindows) -> tuple[bytes, bytes, int]:
+    return bytes(windows.head), bytes(windows.tail), windows.size
+
+
+class ObjectServer(ThreadingHTTPServer):
+    """Serve ``objects`` by path, honouring single byte ranges unless ``ranges`` is off."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ObjectHandler)
+        self.objects: dict[str, bytes] = {}
+        self.ranges = True
+        self.range_ends = True
+        self.bytes_sent = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # clients hang up on bodies they do not want
+        pass
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+
+class ObjectHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        content = self.server.objects.get(self.path)
+        if content is None:
+            self._send(404, b"not found")
+            return
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if not self.server.ranges or match is None:
+            self._send(200, content)
+            return
+        first, last = match.groups()
+        if not first:
+            first, last = max(len(content) - int(last), 0), len(content) - 1
+        else:
+            first, last = int(first), min(int(last) if last else len(content) - 1, len(content) - 1)
+        if not self.server.range_ends:
+            # a broken server that sends everything from the first byte of the range
+            last = len(content) - 1
+        if first >= len(content):
+            self._send(416, b"", {"Content-Range": f"bytes */{len(content)}"})
+            return
+        self._send(206, content[first : last + 1], {"Content-Range": f"bytes {first}-{last}/{len(content)}"})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+
+class ServerMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ObjectServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.objects.clear()
+        self.server.ranges = True
+        self.server.range_ends = True
+        self.server.bytes_sent = 0
+        self.server.requests = 0
+
+
+class ParseContentRangeTestCase(SimpleTestCase):
+    """Test Content-Range parsing."""
+
+    def test_parse(self):
+        self.assertEqual(parse_content_range("bytes 0-9/100"), (0, 100))
+        self.assertEqual(parse_content_range("bytes 90-99/*"), (90, None))
+        self.assertEqual(parse_content_range("bytes */0"), (None, 0))
+
+    def test_invalid(self):
+        for value in (None, "", "bytes 0-9", "items 0-9/10"):
+            with self.assertRaises(RemoteError):
+                parse_content_range(value)
+
+
+class RangeReaderTestCase(ServerMixin, SimpleTestCase):
+    """Test RangeReader against a local HTTP server."""
+
+    def setUp(self):
+        super().setUp()
+        self.reader = RangeReader(WINDOW_SIZE, max_stream_size=64 * 1024, max_workers=4, timeout=5)
+
+    def tearDown(self):
+        self.reader.close()
+
+    def test_only_windows_are_transferred(self):
+        """Test that a large object costs one head and one tail range."""
+        content = bytes(range(256)) * 4096
+        self.server.objects["/big.bin"] = content
+
+        windows, transferred = self.reader.fetch(self.server.url("/big.bin"))
+
+        self.assertEqual(fields(windows), fields(ByteWindows.from_bytes(content, WINDOW_SIZE)))
+        self.assertEqual(transferred, 2 * WINDOW_SIZE)
+        self.assertEqual(self.server.bytes_sent, 2 * WINDOW_SIZE)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_small_and_empty_objects(self):
+        """Test that objects that fit in one window need a single request."""
+        self.server.objects["/small.txt"] = b"hello"
+        self.server.objects["/empty"] = b""
+
+        windows, transferred = self.reader.fetch(self.server.url("/small.txt"))
+        self.assertEqual(fields(windows), fields(ByteWindows.from_bytes(b"hello", WINDOW_SIZE)))
+        self.assertEqual(transferred, 5)
+
+        windows, transferred = self.reader.fetch(self.server.url("/empty"))
+        self.assertEqual(windows.size, 0)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_server_without_ranges_is_streamed(self):
+        """Test the bounded streaming fallback when Range is ignored."""
+        content = b"x" * 10000 + b"end"
+        self.server.objects["/file"] = content
+        self.server.ranges = False
+
+        windows, transferred = self.reader.fetch(self.server.url("/file"))
+
+        self.assertEqual(fields(windows), fields(ByteWindows.from_bytes(content, WINDOW_SIZE)))
+        self.assertEqual(transferred, len(content))
+
+    def test_streaming_fallback_is_bounded(self):
+        """Test that an oversized object from a server without ranges is an error."""
+        self.server.objects["/huge"] = b"x" * (128 * 1024)
+        self.server.ranges = False
+
+        with self.assertRaisesRegex(RemoteError, "does not support range requests"):
+            self.reader.fetch(self.server.url("/huge"))
+
+    def test_reads_are_bounded(self):
+        """Test that at most a window is read from a server that sends more than the range."""
+        content = bytes(range(256)) * 4096
+        self.server.objects["/big.bin"] = content
+        self.server.range_ends = False
+
+        windows, transferred = self.reader.fetch(self.server.url("/big.bin"))
+
+        self.assertEqual(fields(windows), fields(ByteWindows.from_bytes(content, WINDOW_SIZE)))
+        self.assertEqual(transferred, 2 * WINDOW_SIZE)
+        # the head's connection has unread data and is closed; only the tail's is pooled
+        self.assertEqual(len(self.reader.pool._idle[("http", "127.0.0.1", self.server.server_port)]), 1)
+
+    def test_connections_are_reused(self):
+        """Test that requests to the same host share keep-alive connections."""
+        self.server.objects["/a"] = b"a" * 5000
+        self.reader.fetch(self.server.url("/a"))
+        self.reader.fetch(self.server.url("/a"))
+        self.assertEqual(len(self.reader.pool._idle[("http", "127.0.0.1", self.server.server_port)]), 1)
+
+    def test_errors(self):
+        """Test missing objects, unreachable hosts and unsupported schemes."""
+        with self.assertRaisesRegex(RemoteError, "404"):
+            self.reader.fetch(self.server.url("/missing"))
+        with self.assertRaises(RemoteError):
+            self.reader.fetch("http://127.0.0.1:1/closed")
+        with self.assertRaisesRegex(RemoteError, "only http and https"):
+            self.reader.fetch("file:///etc/passwd")
+
+    def test_allowed_hosts(self):
+        """Test that only allow-listed hosts are fetched."""
+        self.server.objects["/a"] = b"a"
+        reader = RangeReader(WINDOW_SIZE, 1024, allowed_hosts={"example.com"})
+        with self.assertRaisesRegex(RemoteError, "not allowed"):
+            reader.fetch(self.server.url("/a"))
+        self.assertEqual(self.server.requests, 0)
+        reader.close()
+
+    def test_fetch_many_keeps_order(self):
+        """Test that concurrent fetches return results and errors in URL order."""
+        for index in range(8):
+            self.server.objects[f"/{index}"] = bytes([index]) * (3000 + index)
+        urls = [self.server.url(f"/{index}") for index in range(8)] + [self.server.url("/missing")]
+
+        fetched = self.reader.fetch_many(urls)
+
+        self.assertEqual([windows.size for windows, _ in fetched[:8]], [3000 + index for index in range(8)])
+        self.assertIsInstance(fetched[8], RemoteError)
+
+
+class UrlDetectionTestCase(ServerMixin, TestCase):
+    """Test the /api/urls endpoint."""
+
+    pdf_content = b"%PDF-1.7\n" + bytes(range(256)) * 64 + b"\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n"
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.server.objects["/document.pdf"] = self.pdf_content
+        patcher = mock.patch.object(api.range_reader, "allowed_hosts", {"127.0.0.1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, urls, **params):
+        path = "/api/urls" + ("?compact=true" if params.get("compact") else "")
+        return self.client.post(path, data=json.dumps({"urls": urls}), content_type="application/json")
+
+    def test_detect_urls(self):
+        """Test that remote objects get the same detection as uploads."""
+        url = self.server.url("/document.pdf")
+        response = self._post([url, self.server.url("/missing")])
+
+        self.assertEqual(response.status_code, 200)
+        found, missing = json.loads(response.content)
+        self.assertEqual(found["name"], url)
+        self.assertEqual(found["label"], "pdf")
+        self.assertEqual(found["size"], len(self.pdf_content))
+        self.assertEqual(missing["name"], self.server.url("/missing"))
+        self.assertIn("404", missing["error"])
+
+    def test_compact(self):
+        """Test that failed URLs are null in compact responses."""
+        response = self._post([self.server.url("/document.pdf"), self.server.url("/missing")], compact=True)
+        labels = json.loads(self.client.get("/api/labels").content)["labels"]
+
+        label, missing = json.loads(response.content)
+        self.assertEqual(labels[label], "pdf")
+        self.assertIsNone(missing)
+
+    def test_hosts_are_denied_by_default(self):
+        """Test that URLs are rejected when no host is allow-listed."""
+        with mock.patch.object(api.range_reader, "allowed_hosts", set()):
+            response = self._post([self.server.url("/document.pdf")])
+        self.assertIn("not allowed", json.loads(response.content)[0]["error"])
+        self.assertEqual(self.server.requests, 0)
+
+    def test_batch_size_is_limited(self):
+        """Test that too many URLs are rejected."""
+        with mock.patch.object(api, "max_batch_size", 2):
+            response = self._post([self.server.url("/document.pdf")] * 3)
+        self.assertEqual(response.status_code, 413)
+
+    def test_stream(self):
+        """Test that ?stream=ndjson sends the same results one line at a time."""
+        urls = [self.server.url("/document.pdf"), self.server.url("/missing"), self.server.url("/document.pdf")]
+        expected = json.loads(self._post(urls).content)
+
+        with mock.patch.object(api, "stream_batch_size", 2):
+            response = self.client.post(
+                "/api/urls?stream=ndjson", data=json.dumps({"urls": urls}), content_type="application/json"
+            )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
@@ -0,0 +1,110 @@
+"""
+Tests for the bulk ``scan`` management command.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class ScanCommandTestCase(TestCase):
+    """Test directory and stdin scans, output formats and checkpoints."""
+
+    files = {
+        "a.html": b"<!DOCTYPE html><html><head><title>Test</title></head><body><h1>Hello</h1></body></html>",
+        "b/c.json": b'{"name": "test", "value": 123, "array": [1, 2, 3]}',
+        "b/d/e.py": b'#!/usr/bin/env python\ndef hello():\n    print("Hello, World!")\n\nhello()\n',
+        "b/empty.txt": b"",
+        "f.csv": b"name,age,city\nJohn,30,New York\nJane,25,Los Angeles\n",
+    }
+
+    def setUp(self):
+        """Create a small directory tree."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.root = self.tmpdir.name
+        for name, content in self.files.items():
+            path = os.path.join(self.root, "tree", name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as stream:
+                stream.write(content)
+
+    def _scan(self, *args, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("scan", *args, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_scan_directory_jsonl(self):
+        """Test that every file in the tree is reported once, in a stable order."""
+        from example.api import m
+
+        stdout, stderr = self._scan(os.path.join(self.root, "tree"), batch_size=2)
+        records = [json.loads(line) for line in stdout.splitlines()]
+        paths = [os.path.relpath(record["path"], os.path.join(self.root, "tree")) for record in records]
+        self.assertEqual(paths, sorted(self.files, key=lambda name: name.split("/")))
+        for record, name in zip(records, paths):
+            self.assertEqual(record["size"], len(self.files[name]))
+            self.assertEqual(record["label"], str(m.identify_bytes(self.files[name]).output.label))
+        self.assertIn("files/s", stderr)
+
+    def test_scan_unordered(self):
+        """Test that --unordered reports the same files and refuses a checkpoint."""
+        from django.core.management.base import CommandError
+
+        tree = os.path.join(self.root, "tree")
+        stdout, _ = self._scan(tree, unordered=True)
+        paths = {os.path.relpath(json.loads(line)["path"], tree) for line in stdout.splitlines()}
+        self.assertEqual(paths, set(self.files))
+        with self.assertRaises(CommandError):
+            self._scan(tree, unordered=True, checkpoint=os.path.join(self.root, "scan.checkpoint"))
+
+    def test_scan_csv_output(self):
+        """Test CSV output with a header row."""
+        stdout, _ = self._scan(os.path.join(self.root, "tree"), format="csv")
+        rows = list(csv.DictReader(io.StringIO(stdout)))
+        self.assertEqual(len(rows), len(self.files))
+        self.assertEqual(set(rows[0]), {"path", "size", "label", "mime_type", "group", "score", "error"})
+
+    def test_scan_paths_from_stdin(self):
+        """Test that '-' reads the path list from stdin and reports unreadable paths."""
+        paths = [os.path.join(self.root, "tree", "a.html"), os.path.join(self.root, "missing.bin")]
+        with mock.patch("sys.stdin", io.StringIO("\n".join(paths) + "\n")):
+            stdout, _ = self._scan("-")
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([record["path"] for record in records], paths)
+        self.assertEqual(records[0]["label"], "html")
+        self.assertIn("error", records[1])
+
+    def test_resume_from_checkpoint(self):
+        """Test that an interrupted scan resumes without repeating completed files."""
+        from example.management.commands import scan
+
+        output = os.path.join(self.root, "results.jsonl")
+        checkpoint = os.path.join(self.root, "scan.checkpoint")
+        tree = os.path.join(self.root, "tree")
+
+        calls = []
+        original = scan.identify_seekables
+
+        def interrupt_second_batch(windows):
+            calls.append(len(windows))
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return original(windows)
+
+        with mock.patch.object(scan, "identify_seekables", interrupt_second_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                self._scan(tree, output=output, checkpoint=checkpoint, batch_size=2)
+        with open(checkpoint) as stream:
+            self.assertEqual(json.load(stream)["completed"], 2)
+
+        self._scan(tree, output=output, checkpoint=checkpoint, batch_size=2)
+        with open(output) as stream:
+            records = [json.loads(line) for line in stream]
+        self.assertEqual(len(records), len(self.files))
+        self.assertEqual(len({record["path"] for record in records}), len(self.files))
@@ -0,0 +1,93 @@
+"""
+Tests for the magic-number signature precheck.
+"""
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from magika import ContentTypeLabel
+
+from example import api
+from example.signatures import SIGNATURES, SignatureTable
+from tests.helpers import GZIP, PDF, PYTHON, named_file, patch_api
+
+
+class SignatureTableTestCase(TestCase):
+    """Test matching leading bytes."""
+
+    def test_match(self):
+        """Test that files are matched by their prefix and the longest signature wins."""
+        table = SignatureTable({b"PK": ContentTypeLabel.ZIP, b"PK\x03\x04": ContentTypeLabel.JAR}, min_size=8)
+        self.assertEqual(table.match(b"PK\x03\x04rest", 100), ContentTypeLabel.JAR)
+        self.assertEqual(table.match(b"PK\x05\x06rest", 100), ContentTypeLabel.ZIP)
+        self.assertIsNone(table.match(b"P", 100))
+        self.assertIsNone(table.match(b"PK\x03\x04", 4))
+        self.assertEqual(table.stats(), {"checked": 4, "hits": 2, "hit_rate": 0.5, "labels": {"jar": 1, "zip": 1}})
+        with self.assertRaises(ValueError):
+            SignatureTable({b"P": ContentTypeLabel.ZIP})
+
+    def test_builtin_signatures(self):
+        """Test the built-in table on real files and the shortest signatures."""
+        table = SignatureTable(SIGNATURES, min_size=8)
+        self.assertEqual(table.match(PDF[:4096], len(PDF)), ContentTypeLabel.PDF)
+        self.assertEqual(table.match(memoryview(GZIP)[:4096], len(GZIP)), ContentTypeLabel.GZIP)
+        self.assertIsNone(table.match(PYTHON[:4096], len(PYTHON)))
+        self.assertIsNone(table.match(b"PK\x03\x04" + bytes(100), 104))
+
+
+class SignaturePrecheckTestCase(TestCase):
+    """Test SIGNATURE_PRECHECK in the detection endpoints."""
+
+    def setUp(self):
+        self.client = Client()
+        patch_api(self, signature_precheck=True, signature_table=SignatureTable(SIGNATURES, 8), cache=None)
+
+    def upload_batch(self, *contents):
+        files = []
+        for index, content in enumerate(contents):
+            upload = named_file(content, f"{index}.bin")
+            files.append(upload)
+        return json.loads(self.client.post("/api/upload/batch", {"files": files}).content)
+
+    def test_model_is_skipped(self):
+        """Test that signature matches are answered without inference, and other files by the model."""
+        with mock.patch.object(api, "identify_features", wraps=api.identify_features) as identify:
+            results = self.upload_batch(PDF, GZIP, PYTHON)
+        self.assertEqual([item["label"] for item in results], ["pdf", "gzip", "python"])
+        self.assertEqual(results[0]["score"], 1.0)
+        self.assertEqual(len(identify.call_args.args[0]), 1)
+
+        with mock.patch.object(api, "identify_features") as identify:
+            upload = named_file(PDF, "a.pdf")
+            self.assertEqual(json.loads(self.client.post("/api/upload", {"file": upload}).content)["label"], "pdf")
+        identify.assert_not_called()
+
+        stats = json.loads(self.client.get("/api/signatures/stats").content)
+        self.assertEqual((stats["checked"], stats["hits"], stats["labels"]), (4, 3, {"gzip": 1, "pdf": 2}))
+
+    def test_disabled(self):
+        """Test that without SIGNATURE_PRECHECK every file goes to the model."""
+        with mock.patch.object(api, "signature_precheck", False):
+            self.assertEqual(self.upload_batch(PDF)[0]["label"], "pdf")
+            self.assertEqual(json.loads(self.client.get("/api/signatures/stats").content), {"enabled": False})
+        self.assertEqual(api.signature_table.stats()["checked"], 0)
+
+
+class SignaturesCommandTestCase(TestCase):
+    def test_report(self):
+        """Test that the command compares the signatures with Magika."""
+        with tempfile.TemporaryDirectory() as root:
+            for name, content in (("a.pdf", PDF), ("b.gz", GZIP), ("c.py", PYTHON)):
+                with open(os.path.join(root, name), "wb") as file:
+                    file.write(content)
+            stdout = io.StringIO()
+            call_command("signatures", root, stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[1].split(), ["gzip", "1", "1"])
+        self.assertEqual(lines[2].split(), ["pdf", "1", "1"])
+        self.assertEqual(lines[3], "3 files, 2 matched (66.7%)")
+        self.assertTrue(lines[4].startswith("agreement 100.00%"))
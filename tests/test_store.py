@@ -0,0 +1,150 @@
+"""
+Tests for the persistent detection store.
+"""
+import json
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+
+from example import api
+from example.cache import window_digest
+from example.models import DetectionRecord
+from example.store import DetectionStore
+from example.windows import ByteWindows
+from tests.helpers import PDF, named_file, patch_api
+
+
+def record(label="pdf", size=100, **fields):
+    return {
+        "label": label,
+        "mime_type": f"application/{label}",
+        "group": "document",
+        "score": 0.99,
+        "model_version": "v1",
+        "size": size,
+        **fields,
+    }
+
+
+def idle_store(**options) -> DetectionStore:
+    # the background thread only flushes when told to, so tests control the writes
+    return DetectionStore("v1", **{"batch_size": 1000, "flush_interval": 3600, **options})
+
+
+class DetectionStoreTestCase(TestCase):
+    """Test buffering, writing and reading detection records."""
+
+    def test_pending_records_are_visible(self):
+        """Test that a record can be looked up before it is written."""
+        store = idle_store()
+        store.add("a" * 32, record())
+        self.assertEqual(store.get("a" * 32)["label"], "pdf")
+        self.assertEqual(DetectionRecord.objects.count(), 0)
+
+    def test_flush(self):
+        """Test that records are written in one batch and read back by hash and label."""
+        store = idle_store()
+        for index in range(5):
+            store.add(f"{index:032x}", record("pdf" if index % 2 else "zip", size=index))
+        self.assertEqual(store.flush(), 5)
+        self.assertEqual(store.stats(), {"pending": 0, "written": 5, "dropped": 0})
+
+        self.assertEqual(store.get(f"{3:032x}"), {"content_hash": f"{3:032x}", **record(size=3)})
+        self.assertIsNone(store.get("f" * 32))
+        self.assertEqual([item["size"] for item in store.find("pdf", 10)], [3, 1])
+        self.assertEqual(len(store.find("zip", 2)), 2)
+
+    def test_duplicates_are_ignored(self):
+        """Test that a hash stored twice, e.g. by two workers, keeps one record."""
+        store = idle_store()
+        store.add("a" * 32, record())
+        store.flush()
+        store.add("a" * 32, record())
+        store.add("a" * 32, record())
+        store.flush()
+        self.assertEqual(DetectionRecord.objects.count(), 1)
+
+    def test_model_versions_are_separate(self):
+        """Test that records of another model version are not returned."""
+        store = idle_store()
+        store.add("a" * 32, record(model_version="v0"))
+        store.flush()
+        self.assertIsNone(store.get("a" * 32))
+        self.assertEqual(store.find("pdf", 10), [])
+
+    def test_full_buffer_drops_records(self):
+        """Test that records beyond max_pending are dropped instead of blocking."""
+        store = idle_store(max_pending=2)
+        for index in range(4):
+            store.add(f"{index:032x}", record())
+        self.assertEqual(store.stats(), {"pending": 2, "written": 0, "dropped": 2})
+
+    def test_sqlite_pragmas(self):
+        """Test that connections are configured for concurrent workers."""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class BackgroundWriteTestCase(TransactionTestCase):
+    """Test that the background thread writes records without being asked to."""
+
+    def test_background_flush(self):
+        store = DetectionStore("v1", batch_size=10, flush_interval=0.05)
+        store.add("a" * 32, record())
+        deadline = time.monotonic() + 5
+        while not DetectionRecord.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(DetectionRecord.objects.get().content_hash, "a" * 32)
+
+
+class DetectionLookupTestCase(TestCase):
+    """Test the /api/detections endpoints."""
+
+    def setUp(self):
+        self.client = Client()
+        self.store = DetectionStore(api.model_version, batch_size=1000, flush_interval=3600)
+        # results found in the detection cache were stored when they were computed
+        patch_api(self, store=self.store, cache=None)
+
+    def _upload(self, content, name="document.pdf"):
+        upload = named_file(content, name)
+        return json.loads(self.client.post("/api/upload", {"file": upload}).content)
+
+    def test_lookup_by_hash(self):
+        """Test that an uploaded file can be looked up by the hash of its windows."""
+        detection = self._upload(PDF)
+        self.store.flush()
+        content_hash = window_digest(ByteWindows.from_bytes(PDF, api.window_size))
+
+        response = self.client.get(f"/api/detections/{content_hash}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {**detection, "content_hash": content_hash})
+
+    def test_batch_uploads_are_stored(self):
+        """Test that every file of a batch is recorded."""
+        files = []
+        for index in range(3):
+            upload = named_file(PDF.replace(b"%PDF-1.7", f"%PDF-1.{index}".encode()), f"{index}.pdf")
+            files.append(upload)
+        self.client.post("/api/upload/batch", {"files": files})
+        self.store.flush()
+
+        response = self.client.get("/api/detections?label=pdf")
+        self.assertEqual(len(json.loads(response.content)), 3)
+
+    def test_unknown_hash(self):
+        """Test that an unknown hash answers 404."""
+        self.assertEqual(self.client.get(f"/api/detections/{'0' * 32}").status_code, 404)
+
+    def test_store_disabled(self):
+        """Test that lookups answer 404 when the store is disabled."""
+        with mock.patch.object(api, "store", None):
+            response = self.client.get(f"/api/detections/{'0' * 32}")
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("disabled", json.loads(response.content)["detail"])
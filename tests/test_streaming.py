@@ -0,0 +1,103 @@
+"""
+Tests for streamed (NDJSON and Server-Sent Events) detection responses.
+"""
+import asyncio
+import json
+from unittest import mock
+
+from django.test import AsyncClient, Client, TestCase
+
+from example import api
+from tests.helpers import HTML, PDF, named_file
+
+
+def uploads(*contents):
+    files = []
+    for index, content in enumerate(contents):
+        upload = named_file(content, f"dir/{index}.bin")
+        files.append(upload)
+    return files
+
+
+def ndjson(response):
+    return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+
+class UploadStreamTestCase(TestCase):
+    """Test the /api/upload/stream endpoint."""
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_ndjson_matches_batch_upload(self):
+        """Test that every file gets the result /api/upload/batch gives, in upload order."""
+        expected = json.loads(self.client.post("/api/upload/batch", {"files": uploads(PDF, HTML, b"")}).content)
+
+        with mock.patch.object(api, "stream_batch_size", 2):
+            response = self.client.post("/api/upload/stream", {"files": uploads(PDF, HTML, b""), "note": "ignored"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(ndjson(response), expected)
+        self.assertEqual([item["name"] for item in expected], ["0.bin", "1.bin", "2.bin"])
+
+    def test_results_are_sent_per_batch(self):
+        """Test that a batch is sent before the next one is identified."""
+        with (
+            mock.patch.object(api, "stream_batch_size", 2),
+            mock.patch.object(api, "identify_seekables", wraps=api.identify_seekables) as identify,
+        ):
+            response = self.client.post("/api/upload/stream", {"files": uploads(PDF, HTML, PDF, HTML, b"")})
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            self.assertEqual(identify.call_count, 1)
+            self.assertEqual(len(list(chunks)), 4)
+            self.assertEqual([len(call.args[0]) for call in identify.call_args_list], [2, 2, 1])
+
+    def test_batch_size_limit_does_not_apply(self):
+        """Test that a stream may hold more files than MAX_BATCH_SIZE."""
+        with mock.patch.object(api, "max_batch_size", 1):
+            response = self.client.post("/api/upload/stream", {"files": uploads(PDF, HTML, PDF)})
+        self.assertEqual(len(ndjson(response)), 3)
+
+    def test_sse(self):
+        """Test that ?stream=sse sends one event per file."""
+        response = self.client.post("/api/upload/stream?stream=sse&compact=true", {"files": uploads(PDF, HTML)})
+        labels = json.loads(self.client.get("/api/labels").content)["labels"]
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = b"".join(response.streaming_content).decode().split("\n\n")
+        self.assertEqual(events[-1], "")
+        self.assertEqual(events[0].splitlines()[0], "id: 0")
+        self.assertEqual([labels[int(event.split("data: ")[1])] for event in events[:-1]], ["pdf", "html"])
+
+    def test_not_multipart(self):
+        """Test that a body that is not multipart/form-data is rejected before streaming."""
+        response = self.client.post("/api/upload/stream", data=PDF, content_type="application/octet-stream")
+        self.assertEqual(response.status_code, 400)
+
+    def test_error_ends_the_stream(self):
+        """Test that a failure after the first results is reported as the last line."""
+        results = api.identify_seekables(
+            [api.ByteWindows.from_bytes(PDF, api.window_size), api.ByteWindows.from_bytes(HTML, api.window_size)]
+        )
+        with (
+            mock.patch.object(api, "stream_batch_size", 2),
+            mock.patch.object(api, "identify_seekables", side_effect=[results, RuntimeError("model crashed")]),
+        ):
+            response = self.client.post("/api/upload/stream", {"files": uploads(PDF, HTML, PDF)})
+            with self.assertLogs("example.streaming", "ERROR"):
+                lines = ndjson(response)
+
+        self.assertEqual([line.get("label") for line in lines[:2]], ["pdf", "html"])
+        self.assertEqual(lines[2], {"detail": "RuntimeError: model crashed"})
+
+    def test_asgi_streams_asynchronously(self):
+        """Test that ASGI requests get an asynchronous iterator instead of a collected list."""
+
+        async def scenario():
+            response = await AsyncClient().post("/api/upload/stream", {"files": uploads(PDF, HTML)})
+            self.assertTrue(response.is_async)
+            return [json.loads(line) async for chunk in response.streaming_content for line in chunk.splitlines()]
+
+        self.assertEqual([item["label"] for item in asyncio.run(scenario())], ["pdf", "html"])
@@ -0,0 +1,117 @@
+"""
+Tests for tiered detection from growing prefixes.
+"""
+import io
+import json
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from example import api
+from example.tiers import FileSource, TieredDetector
+from example.windows import ByteWindows
+from tests.helpers import PDF, PYTHON, named_file, patch_api
+
+
+def source(content: bytes) -> FileSource:
+    return FileSource(io.BytesIO(content), len(content), api.window_size)
+
+
+def detector(min_score: float, sizes=(100, 1024)) -> TieredDetector:
+    return TieredDetector(api.probe_seekables, api.identify_seekables, list(sizes), min_score, api.window_size)
+
+
+def tier(stats, name):
+    return next(item for item in stats["tiers"] if item["tier"] == name)
+
+
+class TieredDetectorTestCase(TestCase):
+    """Test when each tier answers and what it reads."""
+
+    def setUp(self):
+        patch_api(self, cache=None)
+
+    def test_confident_prefix_is_kept(self):
+        """Test that a confident first tier answers without reading the windows."""
+        tiered = detector(0.9)
+        files = [source(PYTHON)]
+
+        [result] = tiered.detect(files)
+
+        self.assertEqual(str(result.output.label), "python")
+        self.assertEqual(files[0].bytes_read, 100)
+        self.assertEqual(tier(tiered.stats(), "100"), {"tier": "100", "probed": 1, "accepted": 1, "hit_rate": 1.0})
+        self.assertEqual(tier(tiered.stats(), "windows")["probed"], 0)
+        self.assertEqual(tiered.stats()["bytes_read_per_file"], 100)
+
+    def test_low_scores_fall_through_to_windows(self):
+        """Test that without a confident prefix the result is the one of the full windows."""
+        tiered = detector(1.01)
+        files = [source(PDF), source(PYTHON)]
+
+        results = tiered.detect(files)
+
+        expected = api.identify_seekables([ByteWindows.from_bytes(content, api.window_size) for content in (PDF, PYTHON)])
+        self.assertEqual([result.output.label for result in results], [result.output.label for result in expected])
+        self.assertEqual([result.score for result in results], [result.score for result in expected])
+        stats = tiered.stats()
+        self.assertEqual([(item["probed"], item["accepted"]) for item in stats["tiers"]], [(2, 0), (2, 0), (2, 2)])
+        self.assertEqual(stats["files"], 2)
+
+    def test_short_files_are_complete_in_a_tier(self):
+        """Test that a file no longer than a tier is identified whole and not counted by that tier."""
+        tiered = detector(1.01)
+        files = [source(b"#!/bin/sh\necho hello\n"), source(PDF)]
+
+        short, long = tiered.detect(files)
+
+        self.assertEqual(files[0].bytes_read, len(b"#!/bin/sh\necho hello\n"))
+        stats = tiered.stats()
+        self.assertEqual(tier(stats, "100"), {"tier": "100", "probed": 1, "accepted": 0, "hit_rate": 0.0})
+        self.assertEqual((stats["whole_files"], stats["files"]), (1, 2))
+        self.assertEqual(str(long.output.label), "pdf")
+
+    def test_captured_windows_are_not_read_again(self):
+        """Test that a source with windows from the upload handler reads nothing from its stream."""
+        stream = mock.Mock()
+        files = [FileSource(stream, len(PDF), api.window_size, ByteWindows.from_bytes(PDF, api.window_size))]
+        detector(1.01).detect(files)
+        self.assertEqual((files[0].bytes_read, stream.read.call_count), (0, 0))
+
+
+class TieredUploadTestCase(TestCase):
+    """Test UPLOAD_DETECTION=tiered on the upload endpoints."""
+
+    def setUp(self):
+        self.client = Client()
+        patch_api(self, cache=None, upload_detection="tiered", tiered_detector=detector(0.9))
+
+    def _files(self):
+        files = []
+        for name, content in (("a.pdf", PDF), ("main.py", PYTHON), ("empty", b"")):
+            upload = named_file(content, name)
+            files.append(upload)
+        return files
+
+    def test_batch_upload(self):
+        """Test that tiered batch uploads keep the order and the labels of windows detection."""
+        tiered = json.loads(self.client.post("/api/upload/batch", {"files": self._files()}).content)
+        with mock.patch.object(api, "upload_detection", "windows"):
+            windows = json.loads(self.client.post("/api/upload/batch", {"files": self._files()}).content)
+
+        self.assertEqual([item["label"] for item in tiered], [item["label"] for item in windows])
+        self.assertEqual([item["name"] for item in tiered], ["a.pdf", "main.py", "empty"])
+
+    def test_single_upload_and_stats(self):
+        """Test that /api/tiers/stats reports the tier that answered."""
+        upload = named_file(PDF, "a.pdf")
+        self.assertEqual(json.loads(self.client.post("/api/upload", {"file": upload}).content)["label"], "pdf")
+
+        stats = json.loads(self.client.get("/api/tiers/stats").content)
+        self.assertTrue(stats["enabled"])
+        self.assertEqual(sum(item["accepted"] for item in stats["tiers"]), 1)
+
+    def test_stats_disabled(self):
+        """Test that /api/tiers/stats is disabled in the other detection modes."""
+        with mock.patch.object(api, "upload_detection", "windows"):
+            self.assertEqual(json.loads(self.client.get("/api/tiers/stats").content), {"enabled": False})
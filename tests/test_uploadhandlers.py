@@ -0,0 +1,84 @@
+"""
+Tests for the streaming window-capture upload handler.
+"""
+import io
+import json
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+
+from example.uploadhandlers import WindowCaptureUploadHandler, WindowedUploadedFile
+
+
+class WindowCaptureUploadHandlerTestCase(TestCase):
+    """Test WindowCaptureUploadHandler in isolation."""
+
+    def _feed(self, handler, content, chunk_size):
+        handler.new_file("file", "data.bin", "application/octet-stream", len(content))
+        passed = []
+        for start in range(0, len(content), chunk_size):
+            passed.append(handler.receive_data_chunk(content[start : start + chunk_size], start))
+        return passed, handler.file_complete(len(content))
+
+    def test_captures_head_and_tail_windows(self):
+        """Test that head and tail windows are captured across chunk boundaries."""
+        content = bytes(range(256)) * 40
+        handler = WindowCaptureUploadHandler(window_size=1000)
+        passed, file_obj = self._feed(handler, content, 333)
+        self.assertIsNone(file_obj)
+        self.assertEqual(b"".join(passed), content)
+        self.assertEqual(bytes(handler.accumulator.head), content[:1000])
+        self.assertEqual(bytes(handler.accumulator.tail), content[-1000:])
+
+    def test_detect_only_discards_payload(self):
+        """Test that detect-only mode swallows chunks and returns a windowed file."""
+        content = b"x" * 5000 + b"end of file"
+        handler = WindowCaptureUploadHandler(window_size=1000, detect_only=True)
+        passed, file_obj = self._feed(handler, content, 700)
+        self.assertTrue(all(chunk is None for chunk in passed))
+        self.assertIsInstance(file_obj, WindowedUploadedFile)
+        self.assertEqual(file_obj.size, len(content))
+        self.assertEqual(file_obj.windows.head, content[:1000])
+        self.assertEqual(file_obj.windows.tail, content[-1000:])
+
+
+@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+class StreamingUploadTestCase(TestCase):
+    """Test the upload endpoints with the streaming upload handler installed."""
+
+    html_content = b"<!DOCTYPE html><html><body>" + b"<p>paragraph</p>\n" * 2000 + b"</body></html>"
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = Client()
+
+    def _upload(self, mode, path='/api/upload', field='file', contents=(html_content,)):
+        files = []
+        for index, content in enumerate(contents):
+            test_file = io.BytesIO(content)
+            test_file.name = f'file{index}.html'
+            files.append(test_file)
+        with mock.patch('example.api.upload_handler', mode):
+            response = self.client.post(path, {field: files if len(files) > 1 else files[0]})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())
+
+    def test_window_modes_match_default_handlers(self):
+        """Test that every handler mode returns the same detection."""
+        expected = self._upload('default')
+        self.assertEqual(self._upload('windows'), expected)
+        self.assertEqual(self._upload('detect-only'), expected)
+        self.assertEqual(expected['size'], len(self.html_content))
+
+    def test_detect_only_does_not_spool_to_disk(self):
+        """Test that detect-only mode never creates a temporary upload file."""
+        with mock.patch('django.core.files.uploadedfile.tempfile.NamedTemporaryFile') as temp_file:
+            self._upload('detect-only')
+        temp_file.assert_not_called()
+
+    def test_batch_upload_with_detect_only(self):
+        """Test that the batch endpoint uses windows captured for each file."""
+        contents = (self.html_content, b'{"name": "test", "value": 123, "array": [1, 2, 3]}', b"")
+        expected = self._upload('default', '/api/upload/batch', 'files', contents)
+        self.assertEqual(self._upload('detect-only', '/api/upload/batch', 'files', contents), expected)
+        self.assertEqual([item['size'] for item in expected], [len(content) for content in contents])
@@ -0,0 +1,119 @@
+"""
+Tests for head+tail window reads used by the detection path.
+"""
+import io
+import json
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from example.api import identify_seekable, m, window_size
+from example.windows import ByteWindows, StreamTooLarge, read_stream_windows, read_windows
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO that records how many bytes were read from it."""
+
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class ByteWindowsTestCase(TestCase):
+    """Test ByteWindows and read_windows."""
+
+    def test_small_input_is_read_whole(self):
+        """Test that inputs smaller than the window are read once."""
+        stream = CountingStream(b"small content")
+        windows = read_windows(stream, window_size)
+        self.assertEqual(windows.size, 13)
+        self.assertEqual(windows.head, b"small content")
+        self.assertIs(windows.head, windows.tail)
+        self.assertEqual(stream.bytes_read, 13)
+
+    def test_large_input_reads_only_windows(self):
+        """Test that only head and tail windows are read from a large input."""
+        content = b"H" * window_size + b"M" * (10 * window_size) + b"T" * window_size
+        stream = CountingStream(content)
+        windows = read_windows(stream, window_size)
+        self.assertEqual(windows.size, len(content))
+        self.assertEqual(windows.head, b"H" * window_size)
+        self.assertEqual(windows.tail, b"T" * window_size)
+        self.assertEqual(stream.bytes_read, 2 * window_size)
+
+    def test_read_at_within_and_outside_windows(self):
+        """Test that read_at serves both windows and refuses the middle."""
+        content = bytes(range(256)) * 100
+        windows = ByteWindows.from_bytes(content, 1000)
+        self.assertEqual(windows.read_at(10, 20), content[10:30])
+        self.assertEqual(windows.read_at(len(content) - 500, 500), content[-500:])
+        self.assertEqual(windows.read_at(5, 0), b"")
+        with self.assertRaises(ValueError):
+            windows.read_at(5000, 10)
+
+    def test_windows_match_full_content_detection(self):
+        """Test that detection on windows matches detection on the full bytes."""
+        samples = [
+            b"",
+            b"tiny",
+            b'{"name": "test", "value": 123, "array": [1, 2, 3]}',
+            b"<html><body>" + b"<p>paragraph</p>\n" * 2000 + b"</body></html>",
+            b"%PDF-1.7\n" + bytes(range(256)) * 64 + b"\n%%EOF\n",
+        ]
+        for content in samples:
+            with self.subTest(size=len(content)):
+                windows = read_windows(io.BytesIO(content), window_size)
+                result = identify_seekable(windows)
+                self.assertEqual(result.output.label, m.identify_bytes(content).output.label)
+
+
+class WindowedUploadTestCase(TestCase):
+    """Test the upload endpoint with head+tail window detection."""
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = Client()
+
+    def test_upload_sees_end_of_file(self):
+        """Test that the tail window contributes to the upload detection."""
+        test_content = b"%PDF-1.7\n" + b"\x00" * (4 * window_size) + b"trailer\n<< /Root 1 0 R >>\n%%EOF\n"
+        test_file = io.BytesIO(test_content)
+        test_file.name = 'document.pdf'
+
+        response = self.client.post('/api/upload', {'file': test_file})
+
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content.decode())
+        self.assertEqual(response_data['size'], len(test_content))
+        self.assertEqual(response_data['label'], str(m.identify_bytes(test_content).output.label))
+
+    def test_chunk_detection_mode(self):
+        """Test that UPLOAD_DETECTION=chunk keeps the first-chunk behaviour."""
+        test_file = io.BytesIO(b"This is a plain text document with multiple lines.\nSecond line here.\n")
+        test_file.name = 'document.txt'
+        with mock.patch('example.api.upload_detection', 'chunk'):
+            response = self.client.post('/api/upload', {'file': test_file})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode())['group'], 'text')
+
+
+class StreamWindowsTestCase(TestCase):
+    """Test read_stream_windows on streams that can only be read once."""
+
+    def test_stream_windows_match_seekable_windows(self):
+        """Test that a sequential read yields the same windows as seeking."""
+        for content in (b"", b"tiny", bytes(range(256)) * 100, b"x" * window_size, b"y" * (window_size + 1)):
+            with self.subTest(size=len(content)):
+                expected = read_windows(io.BytesIO(content), window_size)
+                windows = read_stream_windows(io.BytesIO(content), window_size, chunk_size=1000)
+                self.assertEqual((windows.head, windows.tail, windows.size), (expected.head, expected.tail, expected.size))
+
+    def test_stream_longer_than_maximum(self):
+        """Test that reading stops once the maximum size is exceeded."""
+        stream = CountingStream(b"z" * 10000)
+        with self.assertRaises(StreamTooLarge):
+            read_stream_windows(stream, window_size, max_size=2000, chunk_size=1000)
+        self.assertEqual(stream.bytes_read, 3000)